@@ -0,0 +1,386 @@
+"""
+Load generator running scripted scenarios against an application, reporting
+the latency percentiles, throughput and errors of each route:
+
+    python benchmarks/load.py --concurrency 1 4 16 --duration 10
+    python benchmarks/load.py --rate 50 100 200 --scenario journey
+    python benchmarks/load.py --url http://127.0.0.1:8000 --concurrency 8 32 64
+
+By default `tests/application.py` (or the application given by `--app`) is
+served in process over ASGI, sharing the event loop and the CPU with the load
+generator, which measures what one worker can serve. With `--url` or `--uds`
+requests are sent to a running server instead, e.g. gunicorn with a number of
+uvicorn workers, to size the workers:
+
+    gunicorn tests.application:app -k uvicorn.workers.UvicornWorker -w 4
+
+Each `--concurrency` is a closed-loop step, in which as many clients run
+scenarios one after another for `--duration` seconds. Each `--rate` is an
+open-loop step, in which scenarios start at that rate per second with Poisson
+arrivals whether or not earlier ones have finished, so latencies aren't
+understated when the application falls behind.
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.suite import (  # noqa: E402
+    OPPORTUNITY_SEARCH,
+    ORDER_PAYLOAD,
+    PRODUCT,
+)
+from stapi_fastapi.models.opportunity import (  # noqa: E402
+    FINAL_OPPORTUNITY_SEARCH_STATUS_CODES,
+)
+from stapi_fastapi.models.order import FINAL_ORDER_STATUS_CODES  # noqa: E402
+
+
+class ScenarioFailed(Exception):
+    pass
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+@dataclass
+class Step:
+    label: str
+    elapsed: float = 0.0
+    completed: int = 0
+    failed: int = 0
+    dropped: int = 0
+    routes: dict[str, RouteStats] = field(default_factory=dict)
+
+
+class Session:
+    """
+    Requests of the scenarios of a step, recording their latencies by route.
+    Responses with an error status, or failing to be received, fail the
+    scenario.
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient, step: Step, polls: int, poll_interval: float
+    ) -> None:
+        self.client = client
+        self.step = step
+        self.polls = polls
+        self.poll_interval = poll_interval
+
+    async def request(
+        self,
+        route: str,
+        method: str,
+        path: str,
+        body: Any = None,
+        params: dict[str, Any] | None = None,
+    ) -> Any:
+        stats = self.step.routes.setdefault(route, RouteStats())
+        started = time.perf_counter()
+        try:
+            res = await self.client.request(method, path, json=body, params=params)
+        except httpx.HTTPError as e:
+            stats.latencies.append(time.perf_counter() - started)
+            stats.errors += 1
+            raise ScenarioFailed(f"{route}: {e!r}") from e
+        stats.latencies.append(time.perf_counter() - started)
+        if res.status_code >= 400:
+            stats.errors += 1
+            raise ScenarioFailed(f"{route}: {res.status_code}")
+        return res.json()
+
+    async def poll(self, route: str, path: str, done: Callable[[Any], bool]) -> None:
+        """
+        Get `path` until `done` with the response, or `polls` times.
+        """
+        for _ in range(self.polls):
+            if done(await self.request(route, "GET", path)):
+                return
+            await asyncio.sleep(self.poll_interval)
+
+
+type Scenario = Callable[[Session], Awaitable[None]]
+"""
+Requests of a client, made with a session.
+"""
+
+
+async def browse(session: Session) -> None:
+    await session.request("list-products", "GET", "/products")
+    await session.request("get-product", "GET", PRODUCT)
+    await session.request("get-constraints", "GET", f"{PRODUCT}/constraints")
+    await session.request("get-order-parameters", "GET", f"{PRODUCT}/order-parameters")
+
+
+async def search(session: Session) -> None:
+    search_record = await session.request(
+        "search-opportunities", "POST", f"{PRODUCT}/opportunities", OPPORTUNITY_SEARCH
+    )
+    await session.poll(
+        "get-opportunity-search-record",
+        f"/searches/opportunities/{search_record['id']}",
+        lambda x: x["status"]["status_code"] in FINAL_OPPORTUNITY_SEARCH_STATUS_CODES,
+    )
+
+
+async def order(session: Session) -> None:
+    created = await session.request(
+        "create-order", "POST", f"{PRODUCT}/orders", ORDER_PAYLOAD
+    )
+    await session.poll(
+        "list-order-statuses",
+        f"/orders/{created['id']}/statuses",
+        lambda x: any(
+            status["status_code"] in FINAL_ORDER_STATUS_CODES
+            for status in x["statuses"]
+        ),
+    )
+    await session.request("get-order", "GET", f"/orders/{created['id']}")
+
+
+async def journey(session: Session) -> None:
+    await browse(session)
+    await search(session)
+    await order(session)
+
+
+async def list_orders(session: Session) -> None:
+    await session.request("list-orders", "GET", "/orders", params={"limit": 10})
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "browse": browse,
+    "search": search,
+    "order": order,
+    "journey": journey,
+    "list-orders": list_orders,
+}
+
+
+async def run_scenario(session: Session, scenario: Scenario) -> None:
+    try:
+        await scenario(session)
+    except ScenarioFailed:
+        session.step.failed += 1
+    else:
+        session.step.completed += 1
+
+
+async def closed_loop(
+    session: Session, scenarios: list[Scenario], concurrency: int, duration: float
+) -> None:
+    deadline = time.perf_counter() + duration
+
+    async def client(offset: int) -> None:
+        for i in itertools.count(offset):
+            if time.perf_counter() >= deadline:
+                return
+            await run_scenario(session, scenarios[i % len(scenarios)])
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+
+
+async def open_loop(
+    session: Session,
+    scenarios: list[Scenario],
+    rate: float,
+    duration: float,
+    max_in_flight: int,
+    rng: random.Random,
+) -> None:
+    started = time.perf_counter()
+    tasks: set[asyncio.Task] = set()
+    arrival = 0.0
+    for i in itertools.count():
+        arrival += rng.expovariate(rate)
+        if arrival >= duration:
+            break
+        await asyncio.sleep(max(started + arrival - time.perf_counter(), 0))
+        # scenarios beyond the limit are dropped rather than queued, as clients
+        # timing out would
+        if len(tasks) >= max_in_flight:
+            session.step.dropped += 1
+            continue
+        task = asyncio.create_task(run_scenario(session, scenarios[i % len(scenarios)]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+
+def load_app(name: str) -> Any:
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr or "app")
+
+
+@asynccontextmanager
+async def asgi_client(app: Any) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    A client of `app` in process, with the state of its lifespan, which
+    httpx doesn't run.
+    """
+    async with app.router.lifespan_context(app) as state:
+
+        async def app_with_state(scope, receive, send):
+            scope["state"] = dict(state or {})
+            await app(scope, receive, send)
+
+        transport = httpx.ASGITransport(app_with_state, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as client:
+            yield client
+
+
+def socket_client(
+    url: str, uds: str | None, connections: int, timeout: float
+) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=connections, max_keepalive_connections=connections
+    )
+    return httpx.AsyncClient(
+        base_url=url,
+        transport=httpx.AsyncHTTPTransport(uds=uds, limits=limits),
+        timeout=timeout,
+    )
+
+
+async def run(args: argparse.Namespace) -> list[Step]:
+    scenarios = [SCENARIOS[x] for x in args.scenario]
+    rng = random.Random(args.seed)
+    steps = [(f"concurrency {x}", x, None) for x in args.concurrency] + [
+        (f"rate {x:g}/s", None, x) for x in args.rate
+    ]
+    results = []
+    for label, concurrency, rate in steps:
+        if args.url or args.uds:
+            connections = concurrency or args.max_in_flight
+            client = socket_client(
+                args.url or "http://localhost", args.uds, connections, args.timeout
+            )
+            context: Any = client
+        else:
+            context = asgi_client(load_app(args.app))
+
+        step = Step(label)
+        async with context as client:
+            session = Session(client, step, args.polls, args.poll_interval)
+            started = time.perf_counter()
+            if concurrency is not None:
+                await closed_loop(session, scenarios, concurrency, args.duration)
+            else:
+                await open_loop(
+                    session, scenarios, rate, args.duration, args.max_in_flight, rng
+                )
+            step.elapsed = time.perf_counter() - started
+        results.append(step)
+        report(step)
+    return results
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    """
+    The nearest-rank percentile of sorted latencies.
+    """
+    if not latencies:
+        return math.nan
+    return latencies[max(math.ceil(p / 100 * len(latencies)) - 1, 0)]
+
+
+def summary(step: Step) -> dict[str, Any]:
+    routes = {}
+    for route, stats in sorted(step.routes.items()):
+        latencies = sorted(stats.latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": stats.errors,
+            "error_rate": stats.errors / len(latencies) if latencies else 0.0,
+            "throughput": len(latencies) / step.elapsed,
+            **{f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+        }
+    return {
+        "step": step.label,
+        "elapsed": step.elapsed,
+        "scenarios_completed": step.completed,
+        "scenarios_failed": step.failed,
+        "scenarios_dropped": step.dropped,
+        "routes": routes,
+    }
+
+
+def report(step: Step) -> None:
+    result = summary(step)
+    print(
+        f"\n{step.label}: {step.completed} scenarios completed, {step.failed} "
+        f"failed, {step.dropped} dropped in {step.elapsed:.1f} s"
+    )
+    print(
+        f"{'route':<32} {'requests':>9} {'req/s':>8} {'errors':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for route, x in result["routes"].items():
+        print(
+            f"{route:<32} {x['requests']:>9} {x['throughput']:>8.1f} "
+            f"{x['error_rate']:>7.1%} {x['p50'] * 1e3:>8.2f} "
+            f"{x['p95'] * 1e3:>8.2f} {x['p99'] * 1e3:>8.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scenario",
+        nargs="+",
+        choices=SCENARIOS,
+        default=["journey"],
+        help="scenarios run in turn",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[])
+    parser.add_argument("--rate", type=float, nargs="*", default=[])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--polls", type=int, default=3, help="most times a status is polled"
+    )
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=1000,
+        help="most scenarios running at once in open-loop steps",
+    )
+    parser.add_argument("--app", default="tests.application:app")
+    parser.add_argument("--url", help="URL of a running server")
+    parser.add_argument("--uds", help="Unix socket of a running server")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args()
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1]
+
+    steps = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps([summary(x) for x in steps], indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
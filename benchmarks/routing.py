@@ -0,0 +1,124 @@
+"""
+Time to match requests to product routes with a route per product endpoint, as
+products are registered by default, and with products dispatched by id:
+
+    python benchmarks/routing.py 10 100 1000
+
+Only the matching of routes is timed, the same way Starlette matches requests,
+so building the routes of every product isn't needed: the routes of products
+other than the requested one are stand-ins with the same paths.
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+from typing import Any
+
+from starlette.routing import BaseRoute, Match, Route
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from stapi_fastapi.models.product import Product  # noqa: E402
+from stapi_fastapi.routers import RootRouter  # noqa: E402
+from stapi_fastapi.routers.product_dispatch import route_path  # noqa: E402
+from stapi_fastapi.routers.product_router import PRODUCT_ROUTE_PATHS  # noqa: E402
+from tests.backends import (  # noqa: E402
+    mock_create_order,
+    mock_get_order,
+    mock_get_order_statuses,
+    mock_get_orders,
+    mock_search_opportunities,
+)
+from tests.shared import (  # noqa: E402
+    MyOpportunityProperties,
+    MyOrderParameters,
+    MyProductConstraints,
+)
+
+
+async def endpoint(scope: Any, receive: Any, send: Any) -> None:
+    pass
+
+
+def match(routes: list[BaseRoute], scope: dict[str, Any]) -> dict[str, Any]:
+    for route in routes:
+        result, child_scope = route.matches(scope)
+        if result == Match.FULL:
+            return {**scope, **child_scope}
+    raise LookupError(scope["path"])
+
+
+def root_router(products: int, dispatch: bool) -> RootRouter:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        lazy_products=dispatch,
+    )
+    if dispatch:
+        for i in range(products):
+            root_router.add_product(
+                Product(
+                    id=f"product-{i}",
+                    license="CC-BY-4.0",
+                    create_order=mock_create_order,
+                    search_opportunities=mock_search_opportunities,
+                    constraints=MyProductConstraints,
+                    opportunity_properties=MyOpportunityProperties,
+                    order_parameters=MyOrderParameters,
+                )
+            )
+    else:
+        # the routes every product adds, in the order they're added
+        for i in range(products):
+            for path in PRODUCT_ROUTE_PATHS.values():
+                root_router.routes.append(
+                    Route(f"/products/product-{i}{path}", endpoint, methods=["POST"])
+                )
+    return root_router
+
+
+def scope(path: str) -> dict[str, Any]:
+    return {"type": "http", "method": "POST", "path": path, "root_path": ""}
+
+
+def dispatch_match(router: RootRouter, request: dict[str, Any]) -> dict[str, Any]:
+    matched = match(router.routes, request)
+    path_params = matched["path_params"]
+    product_router = router.product_routers[path_params["product_id"]]
+    path = route_path(matched)
+    prefix = path[: len(path) - len(path_params["path"])]
+    return match(product_router.routes, {**matched, "root_path": prefix})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("products", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'products':>8} {'mode':>8} {'first us':>8} {'last us':>8}")
+    for products in args.products:
+        static = root_router(products, dispatch=False)
+        dispatched = root_router(products, dispatch=True)
+        for i in (0, products - 1):
+            dispatched.product_routers[f"product-{i}"].add_routes()
+
+        results: dict[str, list[float]] = {"static": [], "dispatch": []}
+        for i in (0, products - 1):
+            request = scope(f"/products/product-{i}/opportunities")
+            for mode, run in (
+                ("static", lambda: match(static.routes, request)),
+                ("dispatch", lambda: dispatch_match(dispatched, request)),
+            ):
+                seconds = min(timeit.repeat(run, number=args.number, repeat=5))
+                results[mode].append(seconds / args.number * 1e6)
+
+        for mode, (first, last) in results.items():
+            print(f"{products:>8} {mode:>8} {first:>8.2f} {last:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
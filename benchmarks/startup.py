@@ -0,0 +1,102 @@
+"""
+Startup time and peak memory of an application with a catalog of many products,
+with products registered eagerly and lazily:
+
+    python benchmarks/startup.py 10 100 1000
+
+Each measurement runs in its own process so peak RSS isn't shared between them.
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def start(products: int, lazy: bool) -> None:
+    sys.path.insert(0, str(ROOT))
+    from fastapi import FastAPI
+
+    from stapi_fastapi.models.product import Product
+    from stapi_fastapi.routers import RootRouter
+    from tests.backends import (
+        mock_create_order,
+        mock_get_order,
+        mock_get_order_statuses,
+        mock_get_orders,
+        mock_search_opportunities,
+    )
+    from tests.shared import (
+        MyOpportunityProperties,
+        MyOrderParameters,
+        MyProductConstraints,
+    )
+
+    started = time.perf_counter()
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        lazy_products=lazy,
+    )
+    for i in range(products):
+        root_router.add_product(
+            Product(
+                id=f"product-{i}",
+                license="CC-BY-4.0",
+                create_order=mock_create_order,
+                search_opportunities=mock_search_opportunities,
+                constraints=MyProductConstraints,
+                opportunity_properties=MyOpportunityProperties,
+                order_parameters=MyOrderParameters,
+            )
+        )
+    app = FastAPI()
+    app.include_router(root_router)
+    elapsed = time.perf_counter() - started
+
+    # ru_maxrss is in KiB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed:.3f} {rss:.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("products", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="seconds per measurement"
+    )
+    parser.add_argument("--start", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.start is not None:
+        start(args.products[0], args.start == "lazy")
+        return
+
+    print(f"{'products':>8} {'mode':>5} {'seconds':>8} {'peak MiB':>8}")
+    for products in args.products:
+        for mode in ("eager", "lazy"):
+            try:
+                result = subprocess.run(
+                    [sys.executable, __file__, str(products), "--start", mode],
+                    capture_output=True,
+                    text=True,
+                    timeout=args.timeout,
+                )
+            except subprocess.TimeoutExpired:
+                print(f"{products:>8} {mode:>5} {'timeout':>8}")
+                continue
+            if result.returncode != 0:
+                # e.g. killed when running out of memory
+                print(f"{products:>8} {mode:>5} {'failed':>8} ({result.returncode})")
+                continue
+            seconds, rss = result.stdout.split()
+            print(f"{products:>8} {mode:>5} {seconds:>8} {rss:>8}")
+
+
+if __name__ == "__main__":
+    main()
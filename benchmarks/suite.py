@@ -0,0 +1,540 @@
+"""
+Benchmarks of models, serialization and every route of `tests/application.py`,
+compared to the baselines in `benchmarks/baselines.json`:
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py -k asgi --threshold 0.1
+    python benchmarks/suite.py --save
+
+Each benchmark is timed over repeats of at least `--min-time` seconds, and the
+fastest repeat is reported as the time per call, which is the least sensitive
+to noise. Routes are benchmarked end to end through the ASGI interface of the
+application, in process, so the time includes routing, validation, the mock
+backends and serialization but no networking. The exit status is 1 if any
+benchmark is slower than its baseline by more than `--threshold`.
+
+Baselines depend on the machine they are measured on, and should be saved again
+with `--save` on the machine comparing to them.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import AbstractAsyncContextManager
+from datetime import UTC, datetime, timedelta
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from pydantic import TypeAdapter
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from geojson_pydantic import Point  # noqa: E402
+from geojson_pydantic.types import Position2D  # noqa: E402
+
+from stapi_fastapi.models.opportunity import (  # noqa: E402
+    Opportunity,
+    OpportunityCollection,
+)
+from stapi_fastapi.models.order import (  # noqa: E402
+    Order,
+    OrderCollection,
+    OrderPayload,
+    OrderProperties,
+    OrderSearchParameters,
+    OrderStatus,
+    OrderStatusCode,
+)
+from stapi_fastapi.models.shared import Link  # noqa: E402
+from stapi_fastapi.types.datetime_interval import DatetimeInterval  # noqa: E402
+from stapi_fastapi.types.filter import CQL2Filter  # noqa: E402
+from tests.shared import (  # noqa: E402
+    MyOpportunityProperties,
+    MyOrderParameters,
+    OffNadirRange,
+)
+
+BASELINES = Path(__file__).resolve().parent / "baselines.json"
+SIZES = (1, 10, 100)
+
+type Benchmark = Callable[[], Any]
+type AsyncBenchmark = Callable[[], Awaitable[Any]]
+
+benchmarks: dict[str, Callable[[], Benchmark]] = {}
+async_benchmarks: dict[str, Callable[["ASGIClient"], AsyncBenchmark]] = {}
+
+
+def benchmark(name: str):
+    """
+    Register a function returning the callable to time, after any setup.
+    """
+
+    def register(setup: Callable[[], Benchmark]) -> Callable[[], Benchmark]:
+        benchmarks[name] = setup
+        return setup
+
+    return register
+
+
+def asgi_benchmark(name: str):
+    """
+    Register a function returning the coroutine function to time, after any
+    setup with the running application.
+    """
+
+    def register(
+        setup: Callable[["ASGIClient"], AsyncBenchmark],
+    ) -> Callable[["ASGIClient"], AsyncBenchmark]:
+        async_benchmarks[name] = setup
+        return setup
+
+    return register
+
+
+# models
+
+
+INTERVAL = "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z"
+FILTER = {
+    "op": "and",
+    "args": [
+        {"op": ">", "args": [{"property": "off_nadir"}, 10]},
+        {"op": "<", "args": [{"property": "off_nadir"}, 20]},
+    ],
+}
+ORDER_PAYLOAD = {
+    "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+    "datetime": INTERVAL,
+    "filter": FILTER,
+    "order_parameters": {"s3_path": "s3://my-bucket"},
+}
+OPPORTUNITY_SEARCH = {
+    "geometry": {"type": "Point", "coordinates": [0, 0]},
+    "datetime": INTERVAL,
+    "filter": FILTER,
+    "limit": 10,
+}
+
+
+def order() -> Order:
+    now = datetime.now(UTC)
+    payload = OrderPayload[MyOrderParameters].model_validate(ORDER_PAYLOAD)
+    return Order(
+        id=str(uuid4()),
+        geometry=payload.geometry,
+        properties=OrderProperties(
+            product_id="test-spotlight",
+            created=now,
+            status=OrderStatus(timestamp=now, status_code=OrderStatusCode.received),
+            search_parameters=OrderSearchParameters(
+                geometry=payload.geometry,
+                datetime=payload.datetime,
+                filter=payload.filter,
+            ),
+            order_parameters=payload.order_parameters.model_dump(),
+            opportunity_properties={"datetime": INTERVAL, "off_nadir": 10},
+        ),
+        links=[
+            Link(
+                href=f"https://example.com/orders/{i}",
+                rel="self",
+                type="application/json",
+            )
+            for i in range(3)
+        ],
+    )
+
+
+def opportunity() -> Opportunity:
+    start = datetime.now(UTC)
+    return Opportunity(
+        id=str(uuid4()),
+        geometry=Point(type="Point", coordinates=Position2D(longitude=0, latitude=0)),
+        properties=MyOpportunityProperties(
+            product_id="test-spotlight",
+            datetime=(start, start + timedelta(days=5)),
+            off_nadir=OffNadirRange(minimum=20, maximum=22),
+            vehicle_id=[1],
+            platform="platform_id",
+        ),
+    )
+
+
+@benchmark("models.datetime_interval.parse")
+def parse_datetime_interval() -> Benchmark:
+    adapter: TypeAdapter = TypeAdapter(DatetimeInterval)
+    return lambda: adapter.validate_python(INTERVAL)
+
+
+@benchmark("models.cql2_filter.validate")
+def validate_cql2_filter() -> Benchmark:
+    adapter: TypeAdapter = TypeAdapter(CQL2Filter)
+    return lambda: adapter.validate_python(FILTER)
+
+
+@benchmark("models.order_payload.validate_json")
+def validate_order_payload() -> Benchmark:
+    model = OrderPayload[MyOrderParameters]
+    body = json.dumps(ORDER_PAYLOAD)
+    return lambda: model.model_validate_json(body)
+
+
+@benchmark("models.opportunity.validate")
+def validate_opportunity() -> Benchmark:
+    model = Opportunity[Point, MyOpportunityProperties]
+    data = opportunity().model_dump(mode="json")
+    return lambda: model.model_validate(data)
+
+
+@benchmark("models.link.construct")
+def construct_link() -> Benchmark:
+    return lambda: Link(
+        href="https://example.com/products/test-spotlight/orders",
+        rel="create-order",
+        type="application/json",
+        method="POST",
+    )
+
+
+def register_serialization(size: int) -> None:
+    @benchmark(f"models.order_collection.serialize[{size}]")
+    def serialize_orders() -> Benchmark:
+        collection = OrderCollection(features=[order() for _ in range(size)])
+        return collection.model_dump_json
+
+    @benchmark(f"models.opportunity_collection.serialize[{size}]")
+    def serialize_opportunities() -> Benchmark:
+        collection = OpportunityCollection(
+            features=[opportunity() for _ in range(size)]
+        )
+        return collection.model_dump_json
+
+
+for size in SIZES:
+    register_serialization(size)
+
+
+# routes
+
+
+class ASGIClient:
+    """
+    Sends requests to an ASGI application in process, with the state of its
+    lifespan.
+    """
+
+    def __init__(self, app: Any, state: dict[str, Any]) -> None:
+        self.app = app
+        self.state = state
+
+    async def request(
+        self, method: str, path: str, body: Any = None, query: str = ""
+    ) -> tuple[int, bytes]:
+        content = json.dumps(body).encode() if body is not None else b""
+        headers = [(b"host", b"testserver")]
+        if body is not None:
+            headers.append((b"content-type", b"application/json"))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+            "state": self.state.copy(),
+        }
+        received = False
+        disconnected = asyncio.Event()
+
+        async def receive() -> dict[str, Any]:
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": content, "more_body": False}
+            # streaming responses listen for the client disconnecting
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        status = 0
+        chunks: list[bytes] = []
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        disconnected.set()
+        return status, b"".join(chunks)
+
+    async def json(self, method: str, path: str, body: Any = None) -> Any:
+        status, content = await self.request(method, path, body)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path}: {status} {content!r}")
+        return json.loads(content)
+
+
+def route(name: str, method: str, path: str, body: Any = None, query: str = "") -> None:
+    @asgi_benchmark(f"asgi.{name}")
+    def setup(client: ASGIClient) -> AsyncBenchmark:
+        return lambda: client.request(method, path, body, query)
+
+
+PRODUCT = "/products/test-spotlight"
+
+route("root", "GET", "/")
+route("conformance", "GET", "/conformance")
+route("list-products", "GET", "/products")
+route("get-product", "GET", PRODUCT)
+route("get-constraints", "GET", f"{PRODUCT}/constraints")
+route("get-order-parameters", "GET", f"{PRODUCT}/order-parameters")
+route("create-order", "POST", f"{PRODUCT}/orders", ORDER_PAYLOAD)
+route("create-orders-bulk[10]", "POST", f"{PRODUCT}/orders:bulk", [ORDER_PAYLOAD] * 10)
+route("search-opportunities", "POST", f"{PRODUCT}/opportunities", OPPORTUNITY_SEARCH)
+route("openapi", "GET", "/openapi.json")
+# the event routes stream until the client disconnects, so aren't benchmarked
+
+
+async def an_order_id(client: ASGIClient) -> str:
+    return (await client.json("POST", f"{PRODUCT}/orders", ORDER_PAYLOAD))["id"]
+
+
+@asgi_benchmark("asgi.list-orders[10]")
+def list_orders(client: ASGIClient) -> AsyncBenchmark:
+    loop = asyncio.get_event_loop()
+    for _ in range(10):
+        loop.run_until_complete(an_order_id(client))
+    return lambda: client.request("GET", "/orders", query="limit=10")
+
+
+@asgi_benchmark("asgi.get-order")
+def get_order(client: ASGIClient) -> AsyncBenchmark:
+    order_id = asyncio.get_event_loop().run_until_complete(an_order_id(client))
+    return lambda: client.request("GET", f"/orders/{order_id}")
+
+
+@asgi_benchmark("asgi.list-order-statuses")
+def list_order_statuses(client: ASGIClient) -> AsyncBenchmark:
+    order_id = asyncio.get_event_loop().run_until_complete(an_order_id(client))
+    return lambda: client.request("GET", f"/orders/{order_id}/statuses")
+
+
+@asgi_benchmark("asgi.get-orders-batch[10]")
+def get_orders_batch(client: ASGIClient) -> AsyncBenchmark:
+    loop = asyncio.get_event_loop()
+    ids = [loop.run_until_complete(an_order_id(client)) for _ in range(10)]
+    return lambda: client.request("POST", "/orders:batchGet", {"ids": ids})
+
+
+@asgi_benchmark("asgi.get-opportunity-search-record")
+def get_opportunity_search_record(client: ASGIClient) -> AsyncBenchmark:
+    search_record = asyncio.get_event_loop().run_until_complete(
+        client.json("POST", f"{PRODUCT}/opportunities", OPPORTUNITY_SEARCH)
+    )
+    path = f"/searches/opportunities/{search_record['id']}"
+    return lambda: client.request("GET", path)
+
+
+@asgi_benchmark("asgi.list-opportunity-search-records[10]")
+def list_opportunity_search_records(client: ASGIClient) -> AsyncBenchmark:
+    loop = asyncio.get_event_loop()
+    for _ in range(10):
+        loop.run_until_complete(
+            client.json("POST", f"{PRODUCT}/opportunities", OPPORTUNITY_SEARCH)
+        )
+    return lambda: client.request("GET", "/searches/opportunities", query="limit=10")
+
+
+@asgi_benchmark("asgi.get-opportunity-collection")
+def get_opportunity_collection(client: ASGIClient) -> AsyncBenchmark:
+    collection = OpportunityCollection(
+        id=str(uuid4()), features=[opportunity() for _ in range(10)]
+    )
+    client.state["_opportunities_db"].put_opportunity_collection(collection)
+    path = f"{PRODUCT}/opportunities/{collection.id}"
+    return lambda: client.request("GET", path)
+
+
+# running
+
+
+def timed(fn: Benchmark, min_time: float, repeat: int) -> float:
+    """
+    Seconds per call of `fn`, the fastest of `repeat` repeats of at least
+    `min_time` seconds.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+async def timed_async(fn: AsyncBenchmark, min_time: float, repeat: int) -> float:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def selected(names: Iterator[str] | list[str], patterns: list[str]) -> list[str]:
+    return [
+        name
+        for name in names
+        if not patterns or any(fnmatch(name, f"*{x}*") for x in patterns)
+    ]
+
+
+def run(patterns: list[str], min_time: float, repeat: int) -> dict[str, float]:
+    results: dict[str, float] = {}
+    for name in selected(list(benchmarks), patterns):
+        results[name] = timed(benchmarks[name](), min_time, repeat)
+        print(f"{name:<50} {format_time(results[name]):>10}", file=sys.stderr)
+
+    names = selected(list(async_benchmarks), patterns)
+    if not names:
+        return results
+
+    from tests.application import app
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        for name in names:
+            # the state of a new lifespan for each benchmark, so orders created
+            # by one don't slow down listing them in another
+            lifespan: AbstractAsyncContextManager = app.router.lifespan_context(app)
+            state = loop.run_until_complete(lifespan.__aenter__())
+            try:
+                client = ASGIClient(app, dict(state or {}))
+                fn = async_benchmarks[name](client)
+                status, content = loop.run_until_complete(fn())
+                if status >= 400:
+                    raise RuntimeError(f"{name}: {status} {content!r}")
+                results[name] = loop.run_until_complete(
+                    timed_async(fn, min_time, repeat)
+                )
+            finally:
+                loop.run_until_complete(lifespan.__aexit__(None, None, None))
+            print(f"{name:<50} {format_time(results[name]):>10}", file=sys.stderr)
+    finally:
+        loop.close()
+    return results
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def report(
+    results: dict[str, float], baselines: dict[str, float], threshold: float
+) -> list[str]:
+    """
+    Print the results against the baselines, returning the names of the
+    benchmarks slower than their baselines by more than `threshold`.
+    """
+    regressions = []
+    print(f"{'benchmark':<50} {'baseline':>10} {'current':>10} {'change':>8}  status")
+    for name, seconds in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            print(f"{name:<50} {'-':>10} {format_time(seconds):>10} {'':>8}  new")
+            continue
+        change = seconds / baseline - 1
+        if change > threshold:
+            status = "REGRESSED"
+            regressions.append(name)
+        elif change < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        print(
+            f"{name:<50} {format_time(baseline):>10} {format_time(seconds):>10} "
+            f"{change:>+8.1%}  {status}"
+        )
+    if regressions:
+        print(
+            f"\n{len(regressions)} benchmark(s) slower than the baseline by more "
+            f"than {threshold:.0%}: {', '.join(regressions)}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-k", dest="patterns", action="append", default=[], help="name substring"
+    )
+    parser.add_argument("--min-time", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--baselines", type=Path, default=BASELINES)
+    parser.add_argument(
+        "--save", action="store_true", help="save the results as the baselines"
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(selected([*benchmarks, *async_benchmarks], args.patterns)))
+        return
+
+    results = run(args.patterns, args.min_time, args.repeat)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    baselines = (
+        json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    )
+    if args.save:
+        baselines.update(results)
+        args.baselines.write_text(
+            json.dumps(dict(sorted(baselines.items())), indent=2) + "\n"
+        )
+        return
+    if report(results, baselines, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
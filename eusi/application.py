@@ -1,34 +1,84 @@
+import hashlib
 import os
 import sys
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from pydantic_settings import BaseSettings
 import uvicorn
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from stapi_fastapi.admission import AdmissionControl, Limiter, RouteClass
 from stapi_fastapi.models.conformance import CORE,ASYNC_OPPORTUNITIES
+from stapi_fastapi.idempotency import SQLiteIdempotencyStore
+from stapi_fastapi.metrics import Metrics, MetricsMiddleware
+from stapi_fastapi.openapi import OpenAPICache
+from stapi_fastapi.profiling import ProfilingMiddleware
 from stapi_fastapi.routers.root_router import RootRouter
+from stapi_fastapi.server_timing import ServerTimingMiddleware
+from stapi_fastapi.status_poller import StatusPoller
+from stapi_fastapi.tracing import JSONLinesExporter, Tracer, TracingMiddleware
+from stapi_fastapi.watchdog import LoopWatchdog, LoopWatchdogMiddleware
+from stapi_fastapi.webhooks import WebhookDispatcher, WebhookOutbox
 
 from eusi.shared import maxar_product
 from eusi.client import TARAClient
 from eusi.backends import (
     get_order,
     get_orders,
+    get_orders_by_ids,
     get_order_statuses,
     get_opportunity_search_record,
     get_opportunity_search_records
 )
+def event_tenant(request: Request) -> str | None:
+    # TARA identifies callers by their token only, so the status changes of orders
+    # and searches are streamed to the token they were created with
+    authorization = request.headers.get('Authorization')
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+# metrics of all gunicorn workers are aggregated through METRICS_DIR
+metrics = Metrics(os.environ.get('METRICS_DIR'))
+
 root_router = RootRouter(
     get_orders=get_orders,
     get_order=get_order,
     get_order_statuses=get_order_statuses,
     get_opportunity_search_records=get_opportunity_search_records,
     get_opportunity_search_record=get_opportunity_search_record,
-    conformances=[CORE,ASYNC_OPPORTUNITIES]
+    conformances=[CORE,ASYNC_OPPORTUNITIES],
+    get_orders_by_ids=get_orders_by_ids,
+    idempotency_store=SQLiteIdempotencyStore(
+        os.environ.get('IDEMPOTENCY_DB', 'idempotency.db')
+    ),
+    webhooks=WebhookDispatcher(
+        WebhookOutbox(os.environ.get('WEBHOOK_OUTBOX_DB', 'webhooks.db'))
+    ),
+    # TARA doesn't push status changes, orders and searches created through the
+    # API are polled until final so webhooks and event streams see their changes
+    status_poller=StatusPoller(float(os.environ.get('STATUS_POLL_INTERVAL', '30'))),
+    event_tenant=event_tenant,
+    search_wait_budget=float(os.environ.get('SEARCH_WAIT_BUDGET', '10')),
+    admission=AdmissionControl({
+        RouteClass.read: Limiter(32, queue_size=64, max_wait=10),
+        RouteClass.search: Limiter(8, queue_size=16, max_wait=10),
+        RouteClass.create: Limiter(8, queue_size=16, max_wait=10),
+    }),
+    backend_timeouts={
+        'get_orders': 30,
+        'get_order': 15,
+        'get_orders_by_ids': 30,
+        'get_order_statuses': 15,
+        'get_opportunity_search_records': 30,
+        'get_opportunity_search_record': 15,
+    },
+    pagination_secret=os.environ.get('PAGINATION_SECRET'),
+    metrics=metrics,
 )
 
 @asynccontextmanager
@@ -50,6 +100,39 @@ class ProdSettings(BaseSettings):
 settings = ProdSettings()
 app: FastAPI = FastAPI(lifespan=lifespan,root_path=settings.root)
 app.include_router(root_router, prefix="")
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+# spans of requests, backend and TARA calls are appended to TRACES_FILE
+if os.environ.get('TRACES_FILE'):
+    app.add_middleware(
+        TracingMiddleware, tracer=Tracer(JSONLinesExporter(os.environ['TRACES_FILE']))
+    )
+# Server-Timing headers break the latency of responses down for devtools and
+# synthetic monitors
+if os.environ.get('SERVER_TIMING'):
+    app.add_middleware(ServerTimingMiddleware)
+# requests with the X-Profile-Token header set to PROFILE_TOKEN are profiled into
+# PROFILE_DIR; without PROFILE_TOKEN requests aren't even checked for the header
+if os.environ.get('PROFILE_TOKEN'):
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=os.environ['PROFILE_TOKEN'],
+        directory=os.environ.get('PROFILE_DIR', 'profiles'),
+    )
+# callbacks blocking the event loop for more than LOOP_WATCHDOG seconds, e.g.
+# synchronous TARA calls in async backends, are logged with their stack, and the
+# lag of the loop is exported with the metrics
+if os.environ.get('LOOP_WATCHDOG'):
+    app.add_middleware(
+        LoopWatchdogMiddleware,
+        watchdog=LoopWatchdog(float(os.environ['LOOP_WATCHDOG']), metrics=metrics),
+    )
+
+# a document generated at build time with `OpenAPICache.write` spares each worker
+# from generating it
+openapi_cache = OpenAPICache(app, root_router)
+if os.environ.get('OPENAPI_DOCUMENT'):
+    openapi_cache.load(os.environ['OPENAPI_DOCUMENT'])
+openapi_cache.install()
 
 if __name__ == "__main__":
     uvicorn.run(app=app,port=settings.port,host=settings.host)
\ No newline at end of file
@@ -1,4 +1,6 @@
 
+import asyncio
+
 from fastapi import Request
 from returns.maybe import Maybe, Nothing, Some
 from returns.result import Failure, ResultE, Success
@@ -14,6 +16,7 @@ from stapi_fastapi.models.order import (
     OrderStatusCode,
 )
 
+TARA_CONCURRENCY = 8
 
 
 async def get_order(order_id: str, request: Request) -> ResultE[Maybe[Order]]:
@@ -27,6 +30,34 @@ async def get_order(order_id: str, request: Request) -> ResultE[Maybe[Order]]:
     except Exception as e:
         return Failure(e)
 
+async def get_orders_by_ids(
+    order_ids: list[str], request: Request
+) -> ResultE[dict[str, ResultE[Maybe[Order]]]]:
+    """
+    Fetch several orders from TARA concurrently. The TARA client is blocking, so
+    each call runs in a worker thread with at most TARA_CONCURRENCY in flight.
+    """
+    tara = request.state._TARA
+    authtoken = request.headers['Authorization']
+    semaphore = asyncio.Semaphore(TARA_CONCURRENCY)
+
+    async def fetch(order_id: str) -> ResultE[Maybe[Order]]:
+        async with semaphore:
+            try:
+                return Success(
+                    Maybe.from_optional(
+                        await asyncio.to_thread(tara.get_order, authtoken, order_id)
+                    )
+                )
+            except Exception as e:
+                return Failure(e)
+
+    try:
+        results = await asyncio.gather(*(fetch(order_id) for order_id in order_ids))
+        return Success(dict(zip(order_ids, results)))
+    except Exception as e:
+        return Failure(e)
+
 async def get_orders(
     next: str | None, limit: int, request: Request
 ) -> ResultE[tuple[list[Order], Maybe[str]]]:
@@ -15,6 +15,7 @@ from stapi_fastapi.models.order import (
 )
 
 from stapi_fastapi.models.opportunity import OpportunityPayload
+from stapi_fastapi.tracing import span
 
 from eusi.shared import (
     tara_feasibility_response_to_search_record,
@@ -41,6 +42,16 @@ class TARAClient:
     def __init__(self, tara_api_url: str) -> None:
         self.tara_api_url = tara_api_url
 
+    def request(self, operation: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request to TARA, traced as a span of the current request if any.
+        """
+        with span(
+            "upstream", service="tara", operation=operation, method=method, url=url
+        ) as upstream_span:
+            response = httpx.request(method, url, **kwargs)
+            upstream_span.set("status_code", response.status_code)
+            return response
 
     def get_order(self, authtoken: str, order_id: str) -> Order:
         headers = {"Authorization": authtoken}
@@ -49,7 +60,9 @@ class TARAClient:
         except Exception:
             raise ValueError("order_id must be a valid UUID")
         order_url = f'{self.tara_api_url}/api/v1/internal/suborders/{order_id}'
-        response = httpx.get(
+        response = self.request(
+            'get_order',
+            'GET',
             url=order_url,
             headers=headers,
         )
@@ -62,7 +75,9 @@ class TARAClient:
     def get_orders(self, authtoken: str, limit: int) -> list[Order]:
         headers = {"Authorization": authtoken}
         orders_url = f'{self.tara_api_url}/api/v1/internal/suborders'
-        response = httpx.get(
+        response = self.request(
+            'get_orders',
+            'GET',
             url=orders_url,
             headers=headers,
         )
@@ -76,7 +91,9 @@ class TARAClient:
     def get_order_statuses(self, authtoken: str, order_id: str, limit: int) -> list[OrderStatus]:
         headers = {"Authorization": authtoken}
         order_url = f'{self.tara_api_url}/api/v1/internal/suborders/{order_id}'
-        response = httpx.get(
+        response = self.request(
+            'get_order_statuses',
+            'GET',
             url=order_url,
             headers=headers,
         )
@@ -89,7 +106,9 @@ class TARAClient:
         headers = {"Authorization": authtoken}
         feasibility_url = f'{self.tara_api_url}/api/v1/feasibility'
         payload: FeasibilityRequest = opportunity_request_to_feasibility(search)
-        response = httpx.post(
+        response = self.request(
+            'get_opportunity_from_feasibility',
+            'POST',
             url=feasibility_url,
             json=json.loads(payload.model_dump_json()),
             headers=headers,
@@ -102,7 +121,9 @@ class TARAClient:
     def get_feasibility_result(self, authtoken: str, feasibility_id: UUID):
         headers = {"Authorization": authtoken}
         feasibility_url = f'{self.tara_api_url}/api/v1/feasibility/{feasibility_id}'
-        response = httpx.get(
+        response = self.request(
+            'get_feasibility_result',
+            'GET',
             url=feasibility_url,
             headers=headers,
         )
@@ -117,7 +138,9 @@ class TARAClient:
     def get_feasibility_results(self, authtoken: str, limit: int):
         headers = {"Authorization": authtoken}
         feasibility_url = f'{self.tara_api_url}/api/v1/feasibility/'
-        response = httpx.get(
+        response = self.request(
+            'get_feasibility_results',
+            'GET',
             url=feasibility_url,
             headers=headers,
         )
@@ -136,7 +159,9 @@ class TARAClient:
         
         payload = order_request_to_tara_quote_request(order)
         print(payload)
-        response = httpx.post(
+        response = self.request(
+            'create_order',
+            'POST',
             url=quote_url,
             json=json.loads(payload.model_dump_json()),
             headers=headers
@@ -148,7 +173,9 @@ class TARAClient:
             orderId=str(quote_response.orderInformation.orderId)
         )
         print(order_accept)
-        response = httpx.put(
+        response = self.request(
+            'create_order',
+            'PUT',
             url=accept_url,
             timeout=None,
             json=json.loads(order_accept.model_dump_json()),
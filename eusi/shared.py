@@ -105,7 +105,8 @@ maxar_product = Product(
     get_opportunity_collection=get_opportunity_search_record,
     constraints=MaxarConstraints,
     opportunity_properties=MaxarOpportunityProperties,
-    order_parameters=MaxarOrderParameters
+    order_parameters=MaxarOrderParameters,
+    search_cache_ttl=300,
 )
 
 
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from enum import StrEnum
+
+from fastapi import status
+from pydantic import BaseModel
+
+from stapi_fastapi.exceptions import StapiException
+
+
+class RouteClass(StrEnum):
+    read = "read"
+    search = "search"
+    create = "create"
+
+
+# route class of every backend callable, by the name the routers invoke it with
+BACKEND_ROUTE_CLASSES: dict[str, RouteClass] = {
+    "get_orders": RouteClass.read,
+    "get_order": RouteClass.read,
+    "get_orders_by_ids": RouteClass.read,
+    "get_order_statuses": RouteClass.read,
+    "get_opportunity_search_records": RouteClass.read,
+    "get_opportunity_search_record": RouteClass.read,
+    "get_opportunity_collection": RouteClass.read,
+    "search_opportunities": RouteClass.search,
+    "search_opportunities_async": RouteClass.search,
+    "create_order": RouteClass.create,
+}
+
+
+class OverloadedException(StapiException):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "Too many concurrent requests, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class LimiterStats(BaseModel):
+    concurrency: int
+    queue_size: int
+    in_flight: int
+    queued: int
+    admitted: int
+    shed: int
+    wait_seconds_total: float
+
+
+class Limiter:
+    """
+    Admits at most `concurrency` backend calls at once.
+
+    Calls beyond that wait in a queue of at most `queue_size` calls, for at most
+    `max_wait` seconds if given. Calls that find the queue full or wait too long are
+    shed with a 503 response asking the client to retry after `retry_after` seconds,
+    which is cheap compared to letting requests pile up behind a slow backend.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        queue_size: int = 0,
+        max_wait: float | None = None,
+        retry_after: int = 1,
+    ) -> None:
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.wait_seconds_total = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self._acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _acquire(self) -> None:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+
+        if self.queued >= self.queue_size:
+            self.shed += 1
+            raise OverloadedException(self.retry_after)
+
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self.shed += 1
+            raise OverloadedException(self.retry_after) from None
+        finally:
+            self.queued -= 1
+            self.wait_seconds_total += time.monotonic() - start
+
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            concurrency=self.concurrency,
+            queue_size=self.queue_size,
+            in_flight=self.in_flight,
+            queued=self.queued,
+            admitted=self.admitted,
+            shed=self.shed,
+            wait_seconds_total=self.wait_seconds_total,
+        )
+
+
+class AdmissionControl:
+    """
+    Limits concurrent backend calls with a `Limiter` per route class (`"read"`,
+    `"search"` or `"create"`) or per backend callable name (e.g. `"get_orders"`).
+    A call uses the limiter of its backend callable if there is one, otherwise the
+    one of its route class, and is not limited if neither is configured.
+    """
+
+    def __init__(self, limits: Mapping[str, Limiter]) -> None:
+        self.limits = dict(limits)
+
+    def limiter(self, name: str) -> Limiter | None:
+        if (limiter := self.limits.get(name)) is not None:
+            return limiter
+        route_class = BACKEND_ROUTE_CLASSES.get(name)
+        return self.limits.get(route_class) if route_class is not None else None
+
+    def stats(self) -> dict[str, LimiterStats]:
+        return {key: limiter.stats() for key, limiter in self.limits.items()}
@@ -9,6 +9,7 @@ from .root_backend import (
     GetOpportunitySearchRecords,
     GetOrder,
     GetOrders,
+    GetOrdersByIds,
     GetOrderStatuses,
 )
 
@@ -19,6 +20,7 @@ __all__ = [
     "GetOpportunitySearchRecords",
     "GetOrder",
     "GetOrders",
+    "GetOrdersByIds",
     "GetOrderStatuses",
     "SearchOpportunities",
     "SearchOpportunitiesAsync",
@@ -45,6 +45,30 @@ Returns:
     - Returning returns.result.Failure[Exception] will result in a 500.
 """
 
+GetOrdersByIds = Callable[
+    [list[str], Request],
+    Coroutine[Any, Any, ResultE[dict[str, ResultE[Maybe[Order]]]]],
+]
+"""
+Type alias for an async function that gets details for several orders at once.
+
+Backends that can fetch orders in bulk (or concurrently from an upstream service)
+should implement this; otherwise the root router fans out over `GetOrder`.
+
+Args:
+    order_ids (list[str]): The order IDs, without duplicates.
+    request (Request): FastAPI's Request object.
+
+Returns:
+    A dict mapping each order ID to the outcome for that order, using the same
+    conventions as `GetOrder`. IDs missing from the dict are treated as not found.
+
+    - Should return returns.result.Success[dict[str, returns.result.Success[returns.maybe.Some[Order]]]] for found orders.
+    - Should return returns.result.Success[dict[str, returns.result.Success[returns.maybe.Nothing]]] for orders that are not found or if access is denied.
+    - Per-order returns.result.Failure[Exception] values are reported as errors for that order only.
+    - Returning returns.result.Failure[Exception] will result in a 500.
+"""
+
 
 T = TypeVar("T", bound=OrderStatus)
 
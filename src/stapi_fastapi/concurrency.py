@@ -0,0 +1,60 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterable
+from typing import Any
+
+from returns.result import Failure, ResultE
+
+
+async def gather_bounded[T, R](
+    items: Iterable[T],
+    fn: Callable[[T], Coroutine[Any, Any, ResultE[R]]],
+    concurrency: int,
+) -> list[ResultE[R]]:
+    """
+    Run `fn` for every item with at most `concurrency` calls in flight, returning the
+    results in the order of `items`.
+
+    Backend callables are expected to return `Failure` rather than raise, but an
+    exception escaping one call is captured as a `Failure` for that item so it cannot
+    abort the remaining calls.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(item: T) -> ResultE[R]:
+        async with semaphore:
+            try:
+                return await fn(item)
+            except Exception as e:
+                return Failure(e)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+async def as_completed_bounded[T, R](
+    items: Iterable[T],
+    fn: Callable[[T], Coroutine[Any, Any, ResultE[R]]],
+    concurrency: int,
+) -> AsyncIterator[tuple[int, ResultE[R]]]:
+    """
+    Run `fn` for every item with at most `concurrency` calls in flight, yielding
+    `(index, result)` pairs as soon as each call finishes.
+
+    Calls still pending when the consumer stops iterating (e.g. because the client
+    disconnected from a streaming response) are cancelled.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(index: int, item: T) -> tuple[int, ResultE[R]]:
+        async with semaphore:
+            try:
+                return index, await fn(item)
+            except Exception as e:
+                return index, Failure(e)
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
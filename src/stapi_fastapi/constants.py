@@ -1,2 +1,5 @@
 TYPE_JSON = "application/json"
 TYPE_GEOJSON = "application/geo+json"
+TYPE_NDJSON = "application/x-ndjson"
+TYPE_EVENT_STREAM = "text/event-stream"
+TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
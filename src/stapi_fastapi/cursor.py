@@ -0,0 +1,169 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import re
+from bisect import bisect_right
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import Any
+
+from returns.maybe import Maybe, Nothing, Some
+
+# Keyset pagination: a page position is the sort key and a unique tie-breaker (e.g.
+# the creation time and id) of the last item of the previous page, so that paging is
+# a seek rather than a scan and stays stable when items are inserted.
+
+type SortKey = tuple[Any, str]
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+class InvalidCursorError(ValueError):
+    """
+    A pagination token that was not issued by this service or can't be decoded.
+    Being a `ValueError`, it is reported like other unknown pagination tokens.
+    """
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+def _b64decode(value: str) -> bytes:
+    try:
+        return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    except (binascii.Error, ValueError):
+        raise InvalidCursorError(value) from None
+
+
+class CursorSigner:
+    """
+    Signs page positions into opaque `next` tokens, so clients can't forge or
+    tamper with positions, and checks tokens coming back from clients.
+    """
+
+    def __init__(self, secret: str | bytes) -> None:
+        self._secret = secret.encode() if isinstance(secret, str) else secret
+
+    def _signature(self, value: bytes) -> bytes:
+        return hmac.new(self._secret, value, hashlib.sha256).digest()[:16]
+
+    def sign(self, position: str) -> str:
+        value = position.encode()
+        return f"{_b64encode(value)}.{_b64encode(self._signature(value))}"
+
+    def unsign(self, token: str) -> str:
+        value, _, signature = token.partition(".")
+        decoded = _b64decode(value)
+        if not hmac.compare_digest(_b64decode(signature), self._signature(decoded)):
+            raise InvalidCursorError(token)
+        try:
+            return decoded.decode()
+        except UnicodeDecodeError:
+            raise InvalidCursorError(token) from None
+
+
+def _dump(value: Any) -> Any:
+    match value:
+        case datetime():
+            return {"datetime": value.isoformat()}
+        case tuple() | list():
+            return [_dump(x) for x in value]
+    return value
+
+
+def _load(value: Any) -> Any:
+    match value:
+        case {"datetime": str(x)}:
+            return datetime.fromisoformat(x)
+        case list():
+            return tuple(_load(x) for x in value)
+    return value
+
+
+def encode_cursor(sort_key: Any, tie_breaker: str) -> str:
+    """
+    The position after an item with `sort_key` (JSON-serializable values, datetimes
+    or tuples of them) and the unique `tie_breaker`.
+    """
+    return json.dumps([_dump(sort_key), tie_breaker], separators=(",", ":"))
+
+
+def decode_cursor(position: str) -> SortKey:
+    try:
+        sort_key, tie_breaker = json.loads(position)
+    except (TypeError, ValueError):
+        raise InvalidCursorError(position) from None
+    if not isinstance(tie_breaker, str):
+        raise InvalidCursorError(position)
+    return _load(sort_key), tie_breaker
+
+
+def keyset_page[T](
+    items: Sequence[T],
+    key: Callable[[T], SortKey],
+    next: str | None,
+    limit: int,
+) -> tuple[list[T], Maybe[str]]:
+    """
+    The page of `items`, sorted by `key`, following the position `next`, and the
+    position of the page after it if any. Finding the page is a binary search, so
+    `items` must be sorted by `key`.
+    """
+    start = bisect_right(items, decode_cursor(next), key=key) if next else 0
+    page = list(items[start : start + limit])
+    if page and start + limit < len(items):
+        return page, Some(encode_cursor(*key(page[-1])))
+    return page, Nothing
+
+
+def keyset_clause(
+    sort_column: str,
+    tie_breaker_column: str,
+    next: str | None,
+    limit: int,
+    descending: bool = False,
+) -> tuple[str, str, dict[str, Any]]:
+    """
+    SQL for the page following the position `next` of rows sorted by
+    `sort_column` and `tie_breaker_column`: a condition for the `WHERE` clause, the
+    `ORDER BY ... LIMIT ...` clause and their named parameters. One row more than
+    `limit` is selected so `keyset_rows` can tell whether there is a next page.
+    The column names are inserted into the SQL and must not come from clients.
+    """
+    for column in (sort_column, tie_breaker_column):
+        if not _IDENTIFIER.match(column):
+            raise ValueError(f"Invalid column name {column!r}")
+
+    direction = "DESC" if descending else "ASC"
+    order_by = (
+        f"ORDER BY {sort_column} {direction}, {tie_breaker_column} {direction} "
+        "LIMIT :keyset_limit"
+    )
+    params: dict[str, Any] = {"keyset_limit": limit + 1}
+    if not next:
+        return "1 = 1", order_by, params
+
+    sort_key, tie_breaker = decode_cursor(next)
+    operator = "<" if descending else ">"
+    condition = (
+        f"({sort_column}, {tie_breaker_column}) {operator} "
+        "(:keyset_sort_key, :keyset_tie_breaker)"
+    )
+    params |= {"keyset_sort_key": sort_key, "keyset_tie_breaker": tie_breaker}
+    return condition, order_by, params
+
+
+def keyset_rows[T](
+    rows: Sequence[T], key: Callable[[T], SortKey], limit: int
+) -> tuple[list[T], Maybe[str]]:
+    """
+    The page of rows selected with `keyset_clause` and the position of the page
+    after it if any.
+    """
+    page = list(rows[:limit])
+    if page and len(rows) > limit:
+        return page, Some(encode_cursor(*key(page[-1])))
+    return page, Nothing
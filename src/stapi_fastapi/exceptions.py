@@ -15,3 +15,17 @@ class ConstraintsException(StapiException):
 class NotFoundException(StapiException):
     def __init__(self, detail: Optional[Any] = None) -> None:
         super().__init__(status.HTTP_404_NOT_FOUND, detail)
+
+
+class BackendTimeoutException(StapiException):
+    code = "backend_timeout"
+
+    def __init__(self, backend: str, timeout: float) -> None:
+        # the code tells a timed out backend call apart from a gateway timeout
+        super().__init__(
+            status.HTTP_504_GATEWAY_TIMEOUT,
+            {
+                "code": self.code,
+                "message": f"Backend '{backend}' did not respond within {timeout:g}s",
+            },
+        )
@@ -0,0 +1,152 @@
+from collections.abc import Callable, Iterable
+from typing import Any, NamedTuple
+
+from fastapi import HTTPException, Query, Request, status
+from pydantic import BaseModel
+
+from stapi_fastapi.geometry import reduce_geometry
+from stapi_fastapi.responses import GeoJSONResponse
+
+# members of every feature whatever the fields requested, identifying it and linking
+# to its full representation
+FEATURE_MEMBERS = ("type", "id", "links")
+
+
+class Fieldset:
+    """
+    The members of features requested with the `fields` query parameter, as dotted
+    paths such as `properties.status`. A path includes everything below it.
+
+    The fieldset of a request is also available to backends as
+    `request.state.fields` (`None` if all fields are requested), so they may skip
+    fetching what won't be returned.
+    """
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        self.paths = frozenset(paths)
+        self._include: dict[str, Any] = {}
+        for path in sorted(self.paths, key=len):
+            node = self._include
+            *parents, leaf = path.split(".")
+            for name in parents:
+                if node.get(name) is True:
+                    break
+                node = node.setdefault(name, {})
+            else:
+                node[leaf] = True
+
+    def includes(self, path: str) -> bool:
+        """
+        Whether the member at the dotted `path` is part of the response, entirely
+        or in part.
+        """
+        return (
+            any(
+                path == x or path.startswith(f"{x}.") or x.startswith(f"{path}.")
+                for x in self.paths
+            )
+            or path.split(".", 1)[0] in FEATURE_MEMBERS
+        )
+
+    def feature(self) -> dict[str, Any]:
+        """
+        `include` argument of `model_dump` projecting a feature.
+        """
+        return self._include | {x: True for x in FEATURE_MEMBERS}
+
+    def collection(self) -> dict[str, Any]:
+        """
+        `include` argument of `model_dump` projecting the features of a feature
+        collection, leaving the members of the collection itself untouched.
+        """
+        return {
+            "type": True,
+            "id": True,
+            "links": True,
+            "features": {"__all__": self.feature()},
+        }
+
+
+def get_fields(
+    request: Request,
+    fields: str | None = Query(
+        None,
+        description=(
+            "Comma separated members of the returned features, as dotted paths like "
+            "`properties.status`. `type`, `id` and `links` are always returned."
+        ),
+    ),
+) -> Fieldset | None:
+    fieldset = None
+    if fields is not None:
+        paths = [x.strip() for x in fields.split(",") if x.strip()]
+        if any(not all(x.split(".")) for x in paths):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid fields: {fields}",
+            )
+        fieldset = Fieldset(paths)
+    request.state.fields = fieldset
+    return fieldset
+
+
+class GeometryOutput(NamedTuple):
+    """
+    How feature geometries are reduced for output: rounded to `precision` decimals
+    and simplified with a tolerance of `simplify` degrees, each if not `None`.
+    """
+
+    precision: int | None = None
+    simplify: float | None = None
+
+    @property
+    def reduces(self) -> bool:
+        return self.precision is not None or self.simplify is not None
+
+    def or_defaults(self, defaults: "GeometryOutput") -> "GeometryOutput":
+        return GeometryOutput(
+            self.precision if self.precision is not None else defaults.precision,
+            self.simplify if self.simplify is not None else defaults.simplify,
+        )
+
+    def apply(self, geometry: dict[str, Any]) -> dict[str, Any]:
+        return reduce_geometry(geometry, self.simplify, self.precision)
+
+
+def get_geometry_output(
+    precision: int | None = Query(
+        None,
+        ge=0,
+        le=15,
+        description="Round the coordinates of returned geometries to this many decimals.",
+    ),
+    simplify: float | None = Query(
+        None,
+        gt=0,
+        description=(
+            "Simplify returned geometries, moving no vertex by more than this many "
+            "degrees."
+        ),
+    ),
+) -> GeometryOutput:
+    return GeometryOutput(precision, simplify)
+
+
+def project(
+    model: BaseModel,
+    include: dict[str, Any] | None,
+    geometry_output: Callable[[dict[str, Any]], GeometryOutput] | None = None,
+    **kwargs: Any,
+) -> GeoJSONResponse:
+    """
+    Response with the members of `model` in `include`, or all of them if `None`.
+    The other members are not serialized at all. The geometry of a feature, or of
+    each feature of a collection, is reduced as `geometry_output` returns for the
+    serialized feature.
+    """
+    content = model.model_dump(mode="json", include=include, by_alias=True)
+    if geometry_output is not None:
+        for feature in content.get("features", [content]):
+            if isinstance(geometry := feature.get("geometry"), dict):
+                feature["geometry"] = geometry_output(feature).apply(geometry)
+    return GeoJSONResponse(content=content, **kwargs)
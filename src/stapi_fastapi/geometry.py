@@ -0,0 +1,309 @@
+from collections.abc import Iterator, Sequence
+from functools import lru_cache
+from itertools import pairwise
+from typing import Any
+
+# Planar predicates on GeoJSON geometry dicts, in longitude/latitude degrees. They
+# are meant for comparing search areas, which rarely cross the antimeridian.
+
+type Position = tuple[float, float]
+type BBox = tuple[float, float, float, float]
+type Ring = list[Position]
+
+
+def _position(coordinates: Any) -> Position:
+    return (float(coordinates[0]), float(coordinates[1]))
+
+
+def _ring(coordinates: Any) -> Ring:
+    return [_position(x) for x in coordinates]
+
+
+def _parts(geometry: dict[str, Any]) -> Iterator[tuple[str, Any]]:
+    # single part geometries of `geometry`, as (type, coordinates) pairs
+    match geometry:
+        case {"type": "GeometryCollection", "geometries": geometries}:
+            for g in geometries:
+                yield from _parts(g)
+        case {"type": "MultiPoint" | "MultiLineString" | "MultiPolygon" as kind}:
+            for coordinates in geometry["coordinates"]:
+                yield kind.removeprefix("Multi"), coordinates
+        case {"type": kind, "coordinates": coordinates}:
+            yield kind, coordinates
+
+
+def positions(geometry: dict[str, Any]) -> list[Position]:
+    """
+    All vertices of `geometry`.
+    """
+    result: list[Position] = []
+    for kind, coordinates in _parts(geometry):
+        match kind:
+            case "Point":
+                result.append(_position(coordinates))
+            case "LineString":
+                result.extend(_ring(coordinates))
+            case "Polygon":
+                result.extend(p for ring in coordinates for p in _ring(ring))
+    return result
+
+
+def segments(geometry: dict[str, Any]) -> list[tuple[Position, Position]]:
+    """
+    All edges of the lines and polygon rings of `geometry`.
+    """
+    result: list[tuple[Position, Position]] = []
+    for kind, coordinates in _parts(geometry):
+        match kind:
+            case "LineString":
+                result.extend(pairwise(_ring(coordinates)))
+            case "Polygon":
+                for ring in coordinates:
+                    result.extend(pairwise(_ring(ring)))
+    return result
+
+
+def polygons(geometry: dict[str, Any]) -> list[list[Ring]]:
+    """
+    The polygons of `geometry`, each as its exterior ring followed by its holes.
+    """
+    return [
+        [_ring(ring) for ring in coordinates]
+        for kind, coordinates in _parts(geometry)
+        if kind == "Polygon" and coordinates
+    ]
+
+
+def bbox(geometry: dict[str, Any]) -> BBox | None:
+    """
+    Bounding box of `geometry` as `(west, south, east, north)`, `None` if empty.
+    """
+    if not (vertices := positions(geometry)):
+        return None
+    xs, ys = zip(*vertices)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def bbox_contains(outer: BBox, inner: BBox) -> bool:
+    return (
+        outer[0] <= inner[0]
+        and outer[1] <= inner[1]
+        and inner[2] <= outer[2]
+        and inner[3] <= outer[3]
+    )
+
+
+def bbox_intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _orientation(a: Position, b: Position, c: Position) -> float:
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def _on_segment(p: Position, a: Position, b: Position) -> bool:
+    return (
+        _orientation(a, b, p) == 0
+        and min(a[0], b[0]) <= p[0] <= max(a[0], b[0])
+        and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+    )
+
+
+def _crosses(a: Position, b: Position, c: Position, d: Position) -> bool:
+    # whether segments ab and cd cross at a point interior to both
+    d1, d2 = _orientation(c, d, a), _orientation(c, d, b)
+    d3, d4 = _orientation(a, b, c), _orientation(a, b, d)
+    return d1 * d2 < 0 and d3 * d4 < 0
+
+
+def _in_ring(p: Position, ring: Ring) -> bool:
+    # even-odd rule, points on the boundary count as inside
+    inside = False
+    for a, b in pairwise(ring):
+        if _on_segment(p, a, b):
+            return True
+        if (a[1] > p[1]) != (b[1] > p[1]):
+            x = a[0] + (p[1] - a[1]) * (b[0] - a[0]) / (b[1] - a[1])
+            if p[0] < x:
+                inside = not inside
+    return inside
+
+
+def _in_polygon(p: Position, polygon: list[Ring]) -> bool:
+    exterior, *holes = polygon
+    return _in_ring(p, exterior) and not any(
+        _in_ring(p, hole) and not any(_on_segment(p, a, b) for a, b in pairwise(hole))
+        for hole in holes
+    )
+
+
+def _in_polygons(p: Position, areas: list[list[Ring]]) -> bool:
+    return any(_in_polygon(p, polygon) for polygon in areas)
+
+
+def contains(outer: dict[str, Any], inner: dict[str, Any]) -> bool:
+    """
+    Whether the polygons of `outer` cover `inner`, boundaries included.
+    """
+    areas = polygons(outer)
+    outer_bbox, inner_bbox = bbox(outer), bbox(inner)
+    if not areas or outer_bbox is None or inner_bbox is None:
+        return False
+    if not bbox_contains(outer_bbox, inner_bbox):
+        return False
+
+    inner_segments = segments(inner)
+    inner_areas = polygons(inner)
+    # vertices and edge midpoints inside, no edge leaving through a boundary, and
+    # no hole of `outer` within `inner`
+    return (
+        all(_in_polygons(p, areas) for p in positions(inner))
+        and all(
+            _in_polygons(((a[0] + b[0]) / 2, (a[1] + b[1]) / 2), areas)
+            for a, b in inner_segments
+        )
+        and not any(_crosses(*s, *t) for s in inner_segments for t in segments(outer))
+        and not any(
+            _in_polygons(p, inner_areas)
+            and not any(_on_segment(p, *s) for s in inner_segments)
+            for polygon in areas
+            for hole in polygon[1:]
+            for p in hole
+        )
+    )
+
+
+def intersects(a: dict[str, Any], b: dict[str, Any]) -> bool:
+    """
+    Whether `a` and `b` share any point.
+    """
+    a_bbox, b_bbox = bbox(a), bbox(b)
+    if a_bbox is None or b_bbox is None or not bbox_intersects(a_bbox, b_bbox):
+        return False
+
+    a_positions, b_positions = positions(a), positions(b)
+    a_segments, b_segments = segments(a), segments(b)
+    return (
+        bool(set(a_positions) & set(b_positions))
+        or any(_in_polygons(p, polygons(b)) for p in a_positions)
+        or any(_in_polygons(p, polygons(a)) for p in b_positions)
+        or any(_on_segment(p, *s) for p in a_positions for s in b_segments)
+        or any(_on_segment(p, *s) for p in b_positions for s in a_segments)
+        or any(_crosses(*s, *t) for s in a_segments for t in b_segments)
+    )
+
+
+def _simplify_line(line: Sequence[Any], tolerance: float) -> list[Any]:
+    # Douglas-Peucker, iterative so long lines don't exhaust the stack
+    if len(line) < 3:
+        return list(line)
+    keep = [False] * len(line)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(line) - 1)]
+    squared_tolerance = tolerance * tolerance
+    while stack:
+        first, last = stack.pop()
+        x0, y0 = line[first][0], line[first][1]
+        dx, dy = line[last][0] - x0, line[last][1] - y0
+        norm = dx * dx + dy * dy
+        index, max_distance = first, 0.0
+        for i in range(first + 1, last):
+            x, y = line[i][0] - x0, line[i][1] - y0
+            t = min(max((x * dx + y * dy) / norm, 0), 1) if norm else 0
+            distance = (x - t * dx) ** 2 + (y - t * dy) ** 2
+            if distance > max_distance:
+                index, max_distance = i, distance
+        if max_distance > squared_tolerance:
+            keep[index] = True
+            stack.extend(((first, index), (index, last)))
+    return [p for p, kept in zip(line, keep) if kept]
+
+
+def _quantize_line(line: Sequence[Any], decimals: int) -> list[Any]:
+    # rounding may make neighbouring vertices equal, which are dropped
+    result: list[Any] = []
+    for position in line:
+        rounded = [round(x, decimals) for x in position]
+        if not result or rounded != result[-1]:
+            result.append(rounded)
+    return result
+
+
+def _shape_line(
+    line: Sequence[Any], tolerance: float | None, decimals: int | None, ring: bool
+) -> list[Any]:
+    shaped = list(line)
+    if tolerance is not None:
+        shaped = _simplify_line(shaped, tolerance)
+    if decimals is not None:
+        shaped = _quantize_line(shaped, decimals)
+    # rings keep at least 4 positions and lines 2, or aren't reduced at all
+    if len(shaped) < (4 if ring else 2):
+        return [list(x) for x in line]
+    return shaped
+
+
+def _shape_coordinates(
+    kind: str, coordinates: Any, tolerance: float | None, decimals: int | None
+) -> Any:
+    match kind:
+        case "Point":
+            if decimals is None:
+                return list(coordinates)
+            return [round(x, decimals) for x in coordinates]
+        case "MultiPoint":
+            return [
+                _shape_coordinates("Point", x, tolerance, decimals) for x in coordinates
+            ]
+        case "LineString":
+            return _shape_line(coordinates, tolerance, decimals, ring=False)
+        case "MultiLineString" | "Polygon":
+            ring = kind == "Polygon"
+            return [_shape_line(x, tolerance, decimals, ring) for x in coordinates]
+        case "MultiPolygon":
+            return [
+                _shape_coordinates("Polygon", x, tolerance, decimals)
+                for x in coordinates
+            ]
+    return coordinates
+
+
+def _freeze(coordinates: Any) -> Any:
+    if isinstance(coordinates, list | tuple):
+        return tuple(_freeze(x) for x in coordinates)
+    return coordinates
+
+
+@lru_cache(maxsize=4096)
+def _shape_cached(
+    kind: str, coordinates: Any, tolerance: float | None, decimals: int | None
+) -> Any:
+    # frozen so the cached coordinates can be shared between responses
+    return _freeze(_shape_coordinates(kind, coordinates, tolerance, decimals))
+
+
+def reduce_geometry(
+    geometry: dict[str, Any], tolerance: float | None, decimals: int | None
+) -> dict[str, Any]:
+    """
+    `geometry` simplified with the Douglas-Peucker algorithm so no vertex moves more
+    than `tolerance` (in degrees), and with its coordinates rounded to `decimals`.
+    Results are cached per geometry, as the same geometries tend to be returned
+    over and over again, and their coordinates are nested tuples.
+    """
+    if tolerance is None and decimals is None:
+        return geometry
+    match geometry:
+        case {"type": "GeometryCollection", "geometries": geometries}:
+            return geometry | {
+                "geometries": [
+                    reduce_geometry(x, tolerance, decimals) for x in geometries
+                ]
+            }
+        case {"type": str(kind), "coordinates": coordinates}:
+            return geometry | {
+                "coordinates": _shape_cached(
+                    kind, _freeze(coordinates), tolerance, decimals
+                )
+            }
+    return geometry
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from fastapi import status
+from pydantic import BaseModel
+
+from stapi_fastapi.exceptions import StapiException
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotentResponse(BaseModel):
+    fingerprint: str
+    status_code: int
+    headers: dict[str, str]
+    body: bytes
+
+
+class IdempotencyKeyReusedException(StapiException):
+    def __init__(self) -> None:
+        super().__init__(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            f"{IDEMPOTENCY_KEY_HEADER} was already used with a different payload",
+        )
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Stable hash of the JSON-serializable `parts`, used to detect a key being reused
+    for a different request.
+    """
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore(ABC):
+    """
+    Storage for responses produced by requests carrying an `Idempotency-Key`.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> IdempotentResponse | None: ...
+
+    @abstractmethod
+    async def put(self, key: str, response: IdempotentResponse, ttl: float) -> None: ...
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """
+    Process-local store. Responses are only replayed by the worker that stored them.
+    """
+
+    def __init__(self, purge_interval: int = 1000) -> None:
+        self._responses: dict[str, tuple[float, IdempotentResponse]] = {}
+        self._purge_interval = purge_interval
+        self._puts = 0
+
+    async def get(self, key: str) -> IdempotentResponse | None:
+        match self._responses.get(key):
+            case (expires_at, response) if expires_at > time.monotonic():
+                return response
+            case (_, _):
+                del self._responses[key]
+        return None
+
+    async def put(self, key: str, response: IdempotentResponse, ttl: float) -> None:
+        now = time.monotonic()
+        self._responses[key] = (now + ttl, response)
+        self._puts += 1
+        if self._puts % self._purge_interval == 0:
+            self._responses = {k: v for k, v in self._responses.items() if v[0] > now}
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """
+    Store backed by a SQLite database file, so responses are shared by every worker
+    process on a host and survive restarts.
+    """
+
+    def __init__(self, path: str, purge_interval: int = 1000) -> None:
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._purge_interval = purge_interval
+        self._puts = 0
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS idempotent_responses ("
+                " key TEXT PRIMARY KEY,"
+                " fingerprint TEXT NOT NULL,"
+                " status_code INTEGER NOT NULL,"
+                " headers TEXT NOT NULL,"
+                " body BLOB NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    async def get(self, key: str) -> IdempotentResponse | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, response: IdempotentResponse, ttl: float) -> None:
+        await asyncio.to_thread(self._put, key, response, ttl)
+
+    def _get(self, key: str) -> IdempotentResponse | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fingerprint, status_code, headers, body"
+                " FROM idempotent_responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return IdempotentResponse(
+            fingerprint=row[0],
+            status_code=row[1],
+            headers=json.loads(row[2]),
+            body=row[3],
+        )
+
+    def _put(self, key: str, response: IdempotentResponse, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO idempotent_responses"
+                " (key, fingerprint, status_code, headers, body, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    response.fingerprint,
+                    response.status_code,
+                    json.dumps(response.headers),
+                    response.body,
+                    now + ttl,
+                ),
+            )
+            self._puts += 1
+            if self._puts % self._purge_interval == 0:
+                self._connection.execute(
+                    "DELETE FROM idempotent_responses WHERE expires_at <= ?", (now,)
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class Idempotency:
+    """
+    Runs an operation at most once per idempotency key.
+
+    The first request for a key executes the operation and stores its response. A
+    duplicate arriving while that execution is in flight waits for it and shares its
+    outcome; a duplicate arriving later has the stored response replayed. Failed
+    executions are not stored, so a retry after an error runs the operation again.
+    """
+
+    def __init__(self, store: IdempotencyStore, ttl: float = 24 * 60 * 60) -> None:
+        self.store = store
+        self.ttl = ttl
+        self._in_flight: dict[str, tuple[str, asyncio.Future[IdempotentResponse]]] = {}
+
+    async def execute(
+        self,
+        key: str,
+        request_fingerprint: str,
+        operation: Callable[[], Awaitable[IdempotentResponse]],
+    ) -> tuple[IdempotentResponse, bool]:
+        """
+        Returns the response for `key` and whether it was replayed rather than
+        produced by running `operation`.
+        """
+        # checked and registered before awaiting the store, so a duplicate can't
+        # look the key up before the response of the first request is stored
+        if (in_flight := self._in_flight.get(key)) is not None:
+            in_flight_fingerprint, future = in_flight
+            if in_flight_fingerprint != request_fingerprint:
+                raise IdempotencyKeyReusedException()
+            if (response := await self._wait_for(future)) is not None:
+                return response, True
+            # the execution we were waiting on was abandoned, take over from it
+            return await self.execute(key, request_fingerprint, operation)
+
+        return await self._run(key, request_fingerprint, operation)
+
+    async def _run(
+        self,
+        key: str,
+        request_fingerprint: str,
+        operation: Callable[[], Awaitable[IdempotentResponse]],
+    ) -> tuple[IdempotentResponse, bool]:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (request_fingerprint, future)
+        try:
+            if (response := await self.store.get(key)) is not None:
+                if response.fingerprint != request_fingerprint:
+                    raise IdempotencyKeyReusedException()
+                replayed = True
+            else:
+                response = await operation()
+                await self.store.put(key, response, self.ttl)
+                replayed = False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved in case nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            return response, replayed
+        finally:
+            del self._in_flight[key]
+
+    async def _wait_for(
+        self, future: asyncio.Future[IdempotentResponse]
+    ) -> IdempotentResponse | None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if not future.cancelled() or (task and task.cancelling()):
+                raise
+        return None
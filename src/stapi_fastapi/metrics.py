@@ -0,0 +1,425 @@
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Sequence
+from copy import copy
+from pathlib import Path
+from typing import Any, Self
+
+from returns.maybe import Maybe
+from returns.result import Failure, Success
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from stapi_fastapi.timing import request_timing
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+type LabelValues = tuple[str, ...]
+
+
+class Metric:
+    """
+    Series of values by label values, e.g. `("get_orders", "success")` for the
+    labels `("backend", "outcome")`. `kind` is the Prometheus metric type.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.series: dict[LabelValues, list[float]] = {}
+
+    def _series(self, label_values: LabelValues) -> list[float]:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0.0] * self.width
+        return series
+
+    @property
+    def width(self) -> int:
+        return 1
+
+    def empty(self) -> Self:
+        empty = copy(self)
+        empty.series = {}
+        return empty
+
+    def merge(self, series: dict[LabelValues, list[float]]) -> None:
+        for label_values, values in series.items():
+            merged = self._series(label_values)
+            for i, value in enumerate(values):
+                merged[i] += value
+
+    def samples(self) -> Iterable[tuple[str, LabelValues, LabelValues, float]]:
+        """
+        Name suffix, label names, label values and value of every sample.
+        """
+        for label_values, (value,) in self.series.items():
+            yield "", self.labels, label_values, value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._series(label_values)[0] += amount
+
+    def set(self, value: float, *label_values: str) -> None:
+        """
+        Set a count kept elsewhere, e.g. by the admission control.
+        """
+        self._series(label_values)[0] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._series(label_values)[0] = value
+
+
+class Histogram(Metric):
+    """
+    Counts of observations by upper bound of `buckets`. Counts are kept per bucket
+    rather than cumulatively, so an observation is one binary search and one
+    increment.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    @property
+    def width(self) -> int:
+        # a count per bucket, the count above the last bucket, and the sum
+        return len(self.buckets) + 2
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series(label_values)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[tuple[str, LabelValues, LabelValues, float]]:
+        labels = (*self.labels, "le")
+        for label_values, values in self.series.items():
+            count = 0.0
+            for bound, value in zip((*self.buckets, "+Inf"), values[:-1]):
+                count += value
+                bucket = bound if isinstance(bound, str) else format(bound, "g")
+                yield "_bucket", labels, (*label_values, bucket), count
+            yield "_sum", self.labels, label_values, values[-1]
+            yield "_count", self.labels, label_values, count
+
+
+def _running(pid: int) -> bool:
+    if os.name == "nt":
+        # signals can't be sent to check processes on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running as another user
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metrics:
+    """
+    Request, serialization and backend metrics of an application, exposed in the
+    Prometheus text format.
+
+    Metrics are kept in memory by every process. With a `directory`, each process
+    also writes a snapshot of its metrics there every `flush_interval` seconds
+    while `MetricsMiddleware` runs, and the metrics exposed by any process are
+    those of all processes that wrote snapshots, e.g. all gunicorn workers
+    sharing the directory. The counters and histograms of processes that exited
+    are still summed, so totals don't go back when a worker is replaced, but
+    their gauges are not. The directory should be emptied before the workers
+    start.
+
+    `collectors` are called before metrics are exposed or written, to set
+    metrics kept elsewhere, such as the statistics of the admission control.
+    """
+
+    def __init__(
+        self, directory: str | Path | None = None, flush_interval: float = 1
+    ) -> None:
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.collectors: list[Callable[[], None]] = []
+
+        self.request_duration = Histogram(
+            "stapi_request_duration_seconds",
+            "Time handling requests, by route name",
+            ("route",),
+        )
+        self.serialization_duration = Histogram(
+            "stapi_serialization_duration_seconds",
+            "Time between endpoints returning and responses starting, by route name",
+            ("route",),
+        )
+        self.response_size = Histogram(
+            "stapi_response_size_bytes",
+            "Size of response bodies, by route name",
+            ("route",),
+            SIZE_BUCKETS,
+        )
+        self.backend_duration = Histogram(
+            "stapi_backend_duration_seconds",
+            "Time of backend calls, by backend callable and outcome",
+            ("backend", "outcome"),
+        )
+        self.backend_timeouts = Counter(
+            "stapi_backend_timeouts_total",
+            "Backend calls cancelled after their timeout, by backend callable",
+            ("backend",),
+        )
+        self.admission_in_flight = Gauge(
+            "stapi_admission_in_flight",
+            "Backend calls admitted and not done, by limiter",
+            ("limiter",),
+        )
+        self.admission_queued = Gauge(
+            "stapi_admission_queued",
+            "Backend calls waiting to be admitted, by limiter",
+            ("limiter",),
+        )
+        self.admission_admitted = Counter(
+            "stapi_admission_admitted_total",
+            "Backend calls admitted, by limiter",
+            ("limiter",),
+        )
+        self.admission_shed = Counter(
+            "stapi_admission_shed_total",
+            "Backend calls shed, by limiter",
+            ("limiter",),
+        )
+        self.admission_wait = Counter(
+            "stapi_admission_wait_seconds_total",
+            "Time backend calls waited to be admitted, by limiter",
+            ("limiter",),
+        )
+        self.metrics: list[Metric] = [
+            self.request_duration,
+            self.serialization_duration,
+            self.response_size,
+            self.backend_duration,
+            self.backend_timeouts,
+            self.admission_in_flight,
+            self.admission_queued,
+            self.admission_admitted,
+            self.admission_shed,
+            self.admission_wait,
+        ]
+
+    def add[M: Metric](self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def _path(self, pid: int) -> Path:
+        assert self.directory is not None
+        return self.directory / f"metrics-{pid}.json"
+
+    def snapshot(self) -> dict[str, list[Any]]:
+        """
+        A copy of the series of every metric, which can be serialized in another
+        thread while the metrics are updated.
+        """
+        for collect in self.collectors:
+            collect()
+        return {
+            # copying the items is atomic, unlike iterating over them
+            metric.name: [[list(k), list(v)] for k, v in list(metric.series.items())]
+            for metric in self.metrics
+        }
+
+    def _write(self, snapshot: dict[str, list[Any]]) -> None:
+        path = self._path(os.getpid())
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(snapshot, separators=(",", ":")))
+        temporary.replace(path)
+
+    def flush(self) -> None:
+        """
+        Write the snapshot of this process, if there is a directory.
+        """
+        if self.directory is not None:
+            self._write(self.snapshot())
+
+    async def flush_periodically(self) -> None:
+        """
+        Write the snapshot of this process every `flush_interval` seconds, in a
+        worker thread so requests don't wait for the file to be written.
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    def _aggregate(self) -> list[Metric]:
+        # snapshots, and whether their process is running
+        snapshots = [(self.snapshot(), True)]
+        if self.directory is not None:
+            own = self._path(os.getpid())
+            for path in self.directory.glob("metrics-*.json"):
+                if path != own:
+                    try:
+                        snapshot = json.loads(path.read_text())
+                    except (OSError, ValueError):
+                        # removed or replaced meanwhile
+                        continue
+                    pid = path.stem.removeprefix("metrics-")
+                    snapshots.append((snapshot, pid.isdigit() and _running(int(pid))))
+
+        aggregated = []
+        for metric in self.metrics:
+            total = metric.empty()
+            for snapshot, running in snapshots:
+                if isinstance(metric, Gauge) and not running:
+                    continue
+                series = snapshot.get(metric.name, [])
+                total.merge({tuple(k): v for k, v in series})
+            aggregated.append(total)
+        return aggregated
+
+    def exposition(self) -> str:
+        """
+        The metrics of all processes in the Prometheus text format.
+        """
+        lines = []
+        for metric in self._aggregate():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, label_values, value in metric.samples():
+                pairs = ",".join(
+                    f'{k}="{_escape(v)}"' for k, v in zip(labels, label_values)
+                )
+                sample = f"{metric.name}{suffix}"
+                if pairs:
+                    sample += f"{{{pairs}}}"
+                lines.append(f"{sample} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def backend_outcome(result: Any) -> str:
+    """
+    Outcome label of the result of a backend callable.
+    """
+    match result:
+        case Failure():
+            return "failure"
+        case Success(Maybe.empty):
+            return "empty"
+    return "success"
+
+
+def route_label(scope: Scope) -> str:
+    """
+    The name of the route of a request without the router and product names
+    prefixed, i.e. one of `route_names`, so products don't multiply series.
+    """
+    route = scope.get("route")
+    name = getattr(route, "name", None)
+    return name.rpartition(":")[2] if name else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the duration, serialization time and response size
+    of requests into `metrics`, and writing the snapshots of `metrics` with a
+    directory periodically from the startup of the application to its shutdown.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: Metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan" and self.metrics.directory is not None:
+            await self.lifespan(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timing = request_timing(scope)
+        size = 0
+
+        async def send_measured(message: Message) -> None:
+            nonlocal size
+            if message["type"] == "http.response.start":
+                if timing.endpoint_returned is not None:
+                    self.metrics.serialization_duration.observe(
+                        time.perf_counter() - timing.endpoint_returned,
+                        route_label(scope),
+                    )
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            route = route_label(scope)
+            self.metrics.request_duration.observe(time.perf_counter() - started, route)
+            self.metrics.response_size.observe(size, route)
+
+    async def lifespan(self, scope: Scope, receive: Receive, send: Send) -> None:
+        flusher: asyncio.Task | None = None
+
+        async def send_flushing(message: Message) -> None:
+            nonlocal flusher
+            match message["type"]:
+                case "lifespan.startup.complete":
+                    flusher = asyncio.create_task(self.metrics.flush_periodically())
+                case "lifespan.shutdown.complete":
+                    if flusher is not None:
+                        flusher.cancel()
+                    self.metrics.flush()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_flushing)
+        finally:
+            if flusher is not None:
+                flusher.cancel()
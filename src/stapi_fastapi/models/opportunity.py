@@ -57,6 +57,15 @@ class OpportunitySearchStatusCode(StrEnum):
     completed = "completed"
 
 
+FINAL_OPPORTUNITY_SEARCH_STATUS_CODES = frozenset(
+    {
+        OpportunitySearchStatusCode.failed,
+        OpportunitySearchStatusCode.canceled,
+        OpportunitySearchStatusCode.completed,
+    }
+)
+
+
 class OpportunitySearchStatus(BaseModel):
     timestamp: AwareDatetime
     status_code: OpportunitySearchStatusCode
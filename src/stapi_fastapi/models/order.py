@@ -14,7 +14,7 @@ from pydantic import (
 )
 
 from stapi_fastapi.models.opportunity import OpportunityProperties
-from stapi_fastapi.models.shared import Link
+from stapi_fastapi.models.shared import BatchError, Link
 from stapi_fastapi.types.datetime_interval import DatetimeInterval
 from stapi_fastapi.types.filter import CQL2Filter
 
@@ -44,6 +44,16 @@ class OrderStatusCode(StrEnum):
     user_canceled = "user_canceled"
 
 
+FINAL_ORDER_STATUS_CODES = frozenset(
+    {
+        OrderStatusCode.rejected,
+        OrderStatusCode.completed,
+        OrderStatusCode.canceled,
+        OrderStatusCode.user_canceled,
+    }
+)
+
+
 class OrderStatus(BaseModel):
     timestamp: AwareDatetime
     status_code: OrderStatusCode
@@ -120,6 +130,27 @@ class OrderCollection(_GeoJsonBase):
         return self.features[index]
 
 
+class OrdersBatchRequest(BaseModel):
+    ids: list[StrictStr] = Field(min_length=1)
+
+
+class OrdersBatch(BaseModel):
+    orders: dict[str, Order] = Field(default_factory=dict)
+    errors: dict[str, BatchError] = Field(default_factory=dict)
+
+
+class OrderStatusesBatch(BaseModel):
+    statuses: dict[str, OrderStatuses] = Field(default_factory=dict)
+    errors: dict[str, BatchError] = Field(default_factory=dict)
+
+
+class BulkOrderResult(BaseModel):
+    index: int
+    status: int
+    order: Order | None = None
+    error: BatchError | None = None
+
+
 class OrderPayload(BaseModel, Generic[ORP]):
     datetime: DatetimeInterval
     geometry: Geometry
@@ -59,6 +59,10 @@ class Product(BaseModel):
     _search_opportunities: SearchOpportunities | None
     _search_opportunities_async: SearchOpportunitiesAsync | None
     _get_opportunity_collection: GetOpportunityCollection | None
+    _timeouts: dict[str, float]
+    _search_cache_ttl: float | None
+    _geometry_precision: int | None
+    _geometry_tolerance: float | None
 
     def __init__(
         self,
@@ -70,6 +74,10 @@ class Product(BaseModel):
         search_opportunities: SearchOpportunities | None = None,
         search_opportunities_async: SearchOpportunitiesAsync | None = None,
         get_opportunity_collection: GetOpportunityCollection | None = None,
+        timeouts: dict[str, float] | None = None,
+        search_cache_ttl: float | None = None,
+        geometry_precision: int | None = None,
+        geometry_tolerance: float | None = None,
         **kwargs,
     ) -> None:
         super().__init__(*args, **kwargs)
@@ -87,6 +95,43 @@ class Product(BaseModel):
         self._search_opportunities = search_opportunities
         self._search_opportunities_async = search_opportunities_async
         self._get_opportunity_collection = get_opportunity_collection
+        self._timeouts = timeouts or {}
+        self._search_cache_ttl = search_cache_ttl
+        self._geometry_precision = geometry_precision
+        self._geometry_tolerance = geometry_tolerance
+
+    @property
+    def timeouts(self) -> dict[str, float]:
+        """
+        Timeouts in seconds of this product's backend callables by name (e.g.
+        `"create_order"`), overriding those of the root router.
+        """
+        return self._timeouts
+
+    @property
+    def search_cache_ttl(self) -> float | None:
+        """
+        Seconds for which results of an opportunity search are reused for identical
+        searches; `None` disables caching for this product.
+        """
+        return self._search_cache_ttl
+
+    @property
+    def geometry_precision(self) -> int | None:
+        """
+        Decimals to which coordinates of this product's order and opportunity
+        geometries are rounded unless a request asks otherwise; `None` keeps them.
+        """
+        return self._geometry_precision
+
+    @property
+    def geometry_tolerance(self) -> float | None:
+        """
+        Tolerance in degrees with which this product's order and opportunity
+        geometries are simplified unless a request asks otherwise; `None` keeps
+        every vertex.
+        """
+        return self._geometry_tolerance
 
     @property
     def create_order(self) -> CreateOrder:
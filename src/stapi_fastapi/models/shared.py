@@ -1,5 +1,6 @@
-from typing import Any
+from typing import Any, Self
 
+from fastapi import HTTPException
 from pydantic import (
     AnyUrl,
     BaseModel,
@@ -30,3 +31,15 @@ class Link(BaseModel):
     @model_serializer(mode="wrap", when_used="json")
     def serialize(self, handler: SerializerFunctionWrapHandler) -> dict[str, Any]:
         return {k: v for k, v in handler(self).items() if v is not None}
+
+
+class BatchError(BaseModel):
+    status: int
+    detail: str
+
+    @classmethod
+    def from_exception(cls, e: HTTPException) -> Self:
+        match e.detail:
+            case {"message": str(message)}:
+                return cls(status=e.status_code, detail=message)
+        return cls(status=e.status_code, detail=str(e.detail))
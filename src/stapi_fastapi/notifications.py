@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from pydantic import BaseModel
+
+from stapi_fastapi.models.opportunity import OpportunitySearchStatus
+from stapi_fastapi.models.order import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUS_EVENT = "order-status"
+OPPORTUNITY_SEARCH_STATUS_EVENT = "opportunity-search-status"
+
+
+def order_topic(order_id: str) -> str:
+    return f"orders/{order_id}"
+
+
+def opportunity_search_record_topic(search_record_id: str) -> str:
+    return f"searches/opportunities/{search_record_id}"
+
+
+class StatusEvent(BaseModel):
+    id: int
+    topic: str
+    event: str
+    tenant: str | None = None
+    data: dict[str, Any]
+
+
+def _call_in_loop(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        callback(*args)
+    else:
+        loop.call_soon_threadsafe(callback, *args)
+
+
+class Listener:
+    """
+    Wakes a waiting request when something is published to the topic it listens on.
+
+    Notifications published between two `wait` calls are not lost: the next `wait`
+    returns immediately.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._notified = asyncio.Event()
+
+    def notify(self) -> None:
+        _call_in_loop(self._loop, self._notified.set)
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Wait up to `timeout` seconds for a notification, returning whether one arrived.
+        """
+        try:
+            async with asyncio.timeout(timeout):
+                await self._notified.wait()
+        except TimeoutError:
+            return False
+        self._notified.clear()
+        return True
+
+
+class Subscription:
+    """
+    Receives the status events published to a topic, or to every topic.
+
+    A subscriber that falls more than `maxsize` events behind is marked as
+    `overflowed` and stops receiving events; it should be closed so the client
+    reconnects and resumes from the bus history.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[StatusEvent] = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event: StatusEvent) -> None:
+        _call_in_loop(self._loop, self._put, event)
+
+    def _put(self, event: StatusEvent) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> StatusEvent | None:
+        try:
+            async with asyncio.timeout(timeout):
+                return await self._queue.get()
+        except TimeoutError:
+            return None
+
+
+class NotificationBus:
+    """
+    In-process publish/subscribe bus for status changes of orders and opportunity
+    searches.
+
+    Backends, pollers or other background tasks call `publish_order_status` or
+    `publish_opportunity_search_status` when they detect a new status, or just
+    `publish` with the topic returned by `order_topic` or
+    `opportunity_search_record_topic` to wake long-polling requests. Publishing may
+    happen from any thread.
+
+    Status events are numbered and the last `history_size` events of each of the
+    `max_topics` most recently active topics are kept, so event streams can resume
+    after a reconnect. Event IDs and history are local to the process.
+    """
+
+    def __init__(
+        self,
+        history_size: int = 100,
+        max_topics: int = 10_000,
+        subscriber_queue_size: int = 1_000,
+    ) -> None:
+        self.history_size = history_size
+        self.max_topics = max_topics
+        self.subscriber_queue_size = subscriber_queue_size
+        self._listeners: dict[str, set[Listener]] = {}
+        # subscriptions to every topic are stored under the `None` key
+        self._subscriptions: dict[str | None, set[Subscription]] = {}
+        self._history: OrderedDict[str, deque[StatusEvent]] = OrderedDict()
+        self._all_history: deque[StatusEvent] = deque(maxlen=history_size)
+        self._last_event_id = 0
+        self._handlers: list[Callable[[StatusEvent], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    def publish(self, topic: str) -> None:
+        for listener in tuple(self._listeners.get(topic, ())):
+            listener.notify()
+
+    def publish_order_status(
+        self, order_id: str, status: OrderStatus, tenant: str | None = None
+    ) -> StatusEvent | None:
+        return self.publish_event(
+            order_topic(order_id),
+            ORDER_STATUS_EVENT,
+            {"order_id": order_id, "status": status.model_dump(mode="json")},
+            tenant,
+        )
+
+    def publish_opportunity_search_status(
+        self,
+        search_record_id: str,
+        status: OpportunitySearchStatus,
+        tenant: str | None = None,
+    ) -> StatusEvent | None:
+        return self.publish_event(
+            opportunity_search_record_topic(search_record_id),
+            OPPORTUNITY_SEARCH_STATUS_EVENT,
+            {
+                "search_record_id": search_record_id,
+                "status": status.model_dump(mode="json"),
+            },
+            tenant,
+        )
+
+    def publish_event(
+        self, topic: str, event: str, data: dict[str, Any], tenant: str | None = None
+    ) -> StatusEvent | None:
+        """
+        Record and deliver a status event, then wake the topic's long-polling
+        requests. Publishing an event that is still in the topic's history is a
+        no-op, so every observer of a status may publish it, even a stale one;
+        returns `None` in that case.
+        """
+        with self._lock:
+            history = self._history.get(topic)
+            if history is None:
+                history = self._history[topic] = deque(maxlen=self.history_size)
+                if len(self._history) > self.max_topics:
+                    self._history.popitem(last=False)
+            else:
+                self._history.move_to_end(topic)
+                if any(e.event == event and e.data == data for e in history):
+                    return None
+
+            self._last_event_id += 1
+            status_event = StatusEvent(
+                id=self._last_event_id,
+                topic=topic,
+                event=event,
+                tenant=tenant,
+                data=data,
+            )
+            history.append(status_event)
+            self._all_history.append(status_event)
+
+        for handler in self._handlers:
+            try:
+                handler(status_event)
+            except Exception:
+                logger.exception("Error handling status event %s", status_event.id)
+        for key in (topic, None):
+            for subscription in tuple(self._subscriptions.get(key, ())):
+                subscription.put(status_event)
+        self.publish(topic)
+        return status_event
+
+    def add_handler(self, handler: Callable[[StatusEvent], None]) -> None:
+        """
+        Call `handler` with every new status event, in the publishing thread and
+        before the event is delivered to subscribers.
+        """
+        self._handlers.append(handler)
+
+    def events_since(self, topic: str | None, last_event_id: int) -> list[StatusEvent]:
+        """
+        Buffered events of `topic` (or of every topic) newer than `last_event_id`.
+        """
+        with self._lock:
+            history = (
+                self._all_history if topic is None else self._history.get(topic, ())
+            )
+            return [event for event in history if event.id > last_event_id]
+
+    @contextmanager
+    def listen(self, topic: str) -> Iterator[Listener]:
+        listener = Listener()
+        self._listeners.setdefault(topic, set()).add(listener)
+        try:
+            yield listener
+        finally:
+            listeners = self._listeners.get(topic, set())
+            listeners.discard(listener)
+            if not listeners:
+                self._listeners.pop(topic, None)
+
+    @contextmanager
+    def subscribe(self, topic: str | None) -> Iterator[Subscription]:
+        """
+        Subscribe to the status events of `topic`, or of every topic if `None`.
+        """
+        subscription = Subscription(self.subscriber_queue_size)
+        self._subscriptions.setdefault(topic, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscriptions = self._subscriptions.get(topic, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(topic, None)
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from copy import copy
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from fastapi import FastAPI, Request, Response, status
+from fastapi.openapi.utils import get_openapi
+from fastapi.routing import APIRoute
+from starlette.routing import BaseRoute, Route
+
+from stapi_fastapi.constants import TYPE_JSON
+from stapi_fastapi.routers.route_names import LIST_PRODUCTS
+
+if TYPE_CHECKING:
+    from stapi_fastapi.routers import RootRouter
+
+
+class OpenAPIDocument(NamedTuple):
+    """
+    A serialized OpenAPI document, compressed and with an ETag, ready to be sent.
+    """
+
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+    @classmethod
+    def from_schema(cls, schema: dict[str, Any]) -> OpenAPIDocument:
+        body = json.dumps(
+            schema, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+        return cls(
+            body=body,
+            gzipped=gzip.compress(body, compresslevel=9, mtime=0),
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        )
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("If-None-Match", "")
+        if self.etag in if_none_match or if_none_match.strip() == "*":
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            return Response(
+                self.gzipped,
+                media_type=TYPE_JSON,
+                headers=headers | {"Content-Encoding": "gzip"},
+            )
+        return Response(self.body, media_type=TYPE_JSON, headers=headers)
+
+
+class OpenAPICache:
+    """
+    The OpenAPI document of an application with a root router, generated once
+    rather than by every worker on every request, and served as pre-serialized,
+    pre-compressed bytes with an ETag.
+
+    The paths and schemas of each product are generated separately and merged
+    into the document, so adding a product to the root router only generates
+    the part of the product. The product routes of lazily registered products
+    are generated for the document too, adding them to their routers.
+
+    Once installed, the document is generated at the startup of the
+    application, before it serves requests. It can also be generated at build
+    time with `write` and loaded at startup with `load`, sparing the workers its
+    generation entirely.
+    """
+
+    def __init__(self, app: FastAPI, root_router: RootRouter) -> None:
+        self.app = app
+        self.root_router = root_router
+        self._schema: dict[str, Any] | None = None
+        self._document: OpenAPIDocument | None = None
+
+    def install(self) -> None:
+        """
+        Serve the document at the application's `openapi_url`, in place of the
+        one FastAPI generates, generating it at startup, and keep it up to date as
+        products are added.
+        """
+        if self.app.openapi_url is None:
+            raise ValueError("The application has no `openapi_url`")
+
+        for i, route in enumerate(self.app.router.routes):
+            if isinstance(route, Route) and route.path == self.app.openapi_url:
+                self.app.router.routes[i] = Route(
+                    route.path,
+                    self.get_openapi,
+                    methods=["GET"],
+                    name=route.name,
+                    include_in_schema=False,
+                )
+        self.app.openapi = self.schema  # type: ignore[method-assign]
+        self.root_router.openapi_cache = self
+
+        lifespan = self.app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan_with_document(app: Any) -> AsyncIterator[Any]:
+            async with lifespan(app) as state:
+                # after the application's own startup, which may add products
+                self.document()
+                yield state
+
+        self.app.router.lifespan_context = lifespan_with_document
+
+    def schema(self) -> dict[str, Any]:
+        if self._schema is None:
+            schema = self._base_schema()
+            for product_id in self.root_router.product_ids:
+                if self._merge(schema, self._product_schema(product_id)):
+                    # e.g. models of different products with the same name, which
+                    # are only told apart when generated together
+                    schema = self._full_schema()
+                    break
+            self._schema = schema
+        return self._schema
+
+    def document(self) -> OpenAPIDocument:
+        if self._document is None:
+            self._document = OpenAPIDocument.from_schema(self.schema())
+        return self._document
+
+    # The document is replaced rather than changed when products are added or
+    # removed, so it is never served half updated.
+
+    def add_product(self, product_id: str, replace: bool = False) -> None:
+        """
+        Add the paths and schemas of a product added to the root router, in place
+        of those of the product it replaces if `replace`.
+        """
+        if self._schema is None:
+            return
+        schema = self._copy(self._schema)
+        if replace:
+            self._remove_paths(schema, product_id)
+        if self._merge(schema, self._product_schema(product_id)):
+            # the names of the schemas of models depend on all routes, so start
+            # over
+            self._schema, self._document = None, None
+            return
+        if replace:
+            self._prune(schema)
+        self._schema, self._document = schema, None
+
+    def remove_product(self, product_id: str) -> None:
+        """
+        Remove the paths of a product removed from the root router, and the
+        schemas only they referenced.
+        """
+        if self._schema is None:
+            return
+        schema = self._copy(self._schema)
+        self._remove_paths(schema, product_id)
+        self._prune(schema)
+        self._schema, self._document = schema, None
+
+    def write(self, path: str | Path) -> None:
+        Path(path).write_bytes(self.document().body)
+
+    def load(self, path: str | Path) -> None:
+        """
+        Use the document written by `write`, which must match the application.
+        """
+        self._schema = json.loads(Path(path).read_bytes())
+        self._document = None
+
+    async def get_openapi(self, request: Request) -> Response:
+        root_path = request.scope.get("root_path", "").rstrip("/")
+        if root_path and self.app.root_path_in_servers:
+            servers = self.app.servers
+            if all(server.get("url") != root_path for server in servers):
+                servers.insert(0, {"url": root_path})
+                if self._schema is not None:
+                    self._schema["servers"] = servers
+                    self._document = None
+        return self.document().response(request)
+
+    def _is_product_route(self, route: BaseRoute) -> bool:
+        # product routes copied into the application are named
+        # `{root name}:{product id}:{route name}`
+        name = getattr(route, "name", None) or ""
+        prefix, _, rest = name.partition(":")
+        return (
+            prefix == self.root_router.name
+            and rest.rpartition(":")[0] in self.root_router.product_routers
+        )
+
+    def _base_schema(self) -> dict[str, Any]:
+        """
+        The document without product paths. It is generated along with the routes
+        of a product, so the schemas shared with products are named as if it was
+        generated with all of them.
+        """
+        routes = self._base_routes()
+        methods: dict[str, set[str]] = {}
+        for route in routes:
+            if isinstance(route, APIRoute):
+                methods.setdefault(route.path_format, set()).update(
+                    x.lower() for x in route.methods
+                )
+        product_routes = next(
+            (
+                self._product_routes(product_id)
+                for product_id in self.root_router.product_ids
+            ),
+            [],
+        )
+        schema = self._generate([*routes, *product_routes])
+        # product paths are relative, and may share paths with the others
+        schema["paths"] = {
+            path: {k: v for k, v in item.items() if k in methods[path]}
+            for path, item in schema["paths"].items()
+            if path in methods
+        }
+        return schema
+
+    def _full_schema(self) -> dict[str, Any]:
+        """
+        The document generated at once from the routes of the application and of
+        every product, as FastAPI would.
+        """
+        routes = self._base_routes()
+        for product_id in self.root_router.product_ids:
+            routes.extend(self._prefixed_product_routes(product_id))
+        return self._generate(routes)
+
+    def _base_routes(self) -> list[BaseRoute]:
+        return [x for x in self.app.routes if not self._is_product_route(x)]
+
+    def _generate(self, routes: list[BaseRoute]) -> dict[str, Any]:
+        app = self.app
+        return get_openapi(
+            title=app.title,
+            version=app.version,
+            openapi_version=app.openapi_version,
+            summary=app.summary,
+            description=app.description,
+            terms_of_service=app.terms_of_service,
+            contact=app.contact,
+            license_info=app.license_info,
+            routes=routes,
+            webhooks=app.webhooks.routes,
+            tags=app.openapi_tags,
+            servers=app.servers,
+            separate_input_output_schemas=app.separate_input_output_schemas,
+        )
+
+    @cached_property
+    def _products_path(self) -> str:
+        name = f"{self.root_router.name}:{LIST_PRODUCTS}"
+        return next(
+            route.path
+            for route in self.app.routes
+            if isinstance(route, APIRoute) and route.name == name
+        )
+
+    def _product_routes(self, product_id: str) -> list[BaseRoute]:
+        product_router = self.root_router.product_routers[product_id]
+        if not product_router.has_routes:
+            product_router.add_routes()
+        return product_router.routes
+
+    def _prefixed_product_routes(self, product_id: str) -> list[BaseRoute]:
+        """
+        The routes of a product with the paths the application serves them at.
+        """
+        prefix = f"{self._products_path}/{product_id}"
+        product_prefix = self.root_router.product_routers[product_id].prefix
+        routes: list[BaseRoute] = []
+        for route in self._product_routes(product_id):
+            if isinstance(route, APIRoute):
+                route = copy(route)
+                route.path_format = prefix + route.path_format.removeprefix(
+                    product_prefix
+                )
+            routes.append(route)
+        return routes
+
+    def _product_schema(self, product_id: str) -> dict[str, Any]:
+        return get_openapi(
+            title=self.app.title,
+            version=self.app.version,
+            routes=self._prefixed_product_routes(product_id),
+            separate_input_output_schemas=self.app.separate_input_output_schemas,
+        )
+
+    @staticmethod
+    def _copy(schema: dict[str, Any]) -> dict[str, Any]:
+        copy = schema | {"paths": dict(schema.get("paths", {}))}
+        if (components := schema.get("components")) is not None:
+            copy["components"] = components | {
+                "schemas": dict(components.get("schemas", {}))
+            }
+        return copy
+
+    def _remove_paths(self, schema: dict[str, Any], product_id: str) -> None:
+        prefix = f"{self._products_path}/{product_id}"
+        schema["paths"] = {
+            path: item
+            for path, item in schema["paths"].items()
+            if path != prefix and not path.startswith(f"{prefix}/")
+        }
+
+    @staticmethod
+    def _merge(schema: dict[str, Any], product_schema: dict[str, Any]) -> list[str]:
+        """
+        Merge the paths and schemas of a product into `schema`, returning the
+        names of schemas differing from those already in it.
+        """
+        schema.setdefault("paths", {}).update(product_schema["paths"])
+
+        conflicts = []
+        definitions = product_schema.get("components", {}).get("schemas", {})
+        if definitions:
+            components = schema.setdefault("components", {})
+            schemas = components.setdefault("schemas", {})
+            for name, definition in definitions.items():
+                if schemas.setdefault(name, definition) != definition:
+                    conflicts.append(name)
+            components["schemas"] = dict(sorted(schemas.items()))
+        return conflicts
+
+    @staticmethod
+    def _prune(schema: dict[str, Any]) -> None:
+        """
+        Remove the schemas of `schema` no longer referenced by its paths or
+        webhooks, directly or through other schemas.
+        """
+        schemas = schema.get("components", {}).get("schemas")
+        if not schemas:
+            return
+        referenced: set[str] = set()
+        pending: list[Any] = [schema.get("paths"), schema.get("webhooks")]
+        while pending:
+            match pending.pop():
+                case dict() as value:
+                    ref = value.get("$ref")
+                    if isinstance(ref, str):
+                        name = ref.rpartition("/")[2]
+                        if name in schemas and name not in referenced:
+                            referenced.add(name)
+                            pending.append(schemas[name])
+                    pending.extend(value.values())
+                case list() as value:
+                    pending.extend(value)
+        schema["components"]["schemas"] = {
+            name: definition
+            for name, definition in schemas.items()
+            if name in referenced
+        }
@@ -0,0 +1,324 @@
+import asyncio
+import hmac
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from enum import StrEnum
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_MODE_HEADER = "X-Profile-Mode"
+PROFILE_FORMAT_HEADER = "X-Profile-Format"
+PROFILE_FILE_HEADER = "X-Profile-File"
+
+type Stack = tuple[str, ...]
+type Stacks = dict[Stack, float]
+"""
+Seconds spent in each stack of frames, outermost first.
+"""
+
+
+class ProfileMode(StrEnum):
+    sampling = "sampling"
+    deterministic = "deterministic"
+
+
+class ProfileFormat(StrEnum):
+    collapsed = "collapsed"
+    speedscope = "speedscope"
+
+
+def frame_name(filename: str, line: int, name: str) -> str:
+    return f"{name} ({filename}:{line})"
+
+
+class Sampler:
+    """
+    Samples the stack of the thread running `task` every `interval` seconds,
+    while `task` is the task running, so the samples are those of one request
+    rather than of every request served by the event loop concurrently. Time
+    waiting for I/O, and spent in worker threads or other tasks, isn't sampled.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float) -> None:
+        self.task = task
+        self.loop = task.get_loop()
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks: Stacks = defaultdict(float)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stapi-profile-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Stacks:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        sampled = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, sampled = now - sampled, now
+            if asyncio.current_task(self.loop) is not self.task:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._stack(frame)] += elapsed
+
+    @staticmethod
+    def _stack(frame: FrameType | None) -> Stack:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                frame_name(code.co_filename, code.co_firstlineno, code.co_qualname)
+            )
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+
+class StackProfiler:
+    """
+    Deterministic profiler of the calling thread, recording the time spent in
+    every stack of calls. It runs in place of the sampler when sampling isn't
+    possible or precise timings of short calls are needed, but makes the code
+    profiled several times slower.
+
+    It uses `sys.setprofile` rather than cProfile, which only records the
+    callers of functions rather than whole stacks, and on Python 3.12 records
+    the calls of all threads into the same call graph.
+    """
+
+    def __init__(self) -> None:
+        self.stacks: Stacks = defaultdict(float)
+        # the frames called, and the frames calling built-in functions, which
+        # are told apart by whether the call is built-in
+        self._calls: list[tuple[FrameType, bool]] = []
+        self._names: list[str] = []
+        self._last = 0.0
+
+    def start(self) -> None:
+        self._last = time.perf_counter()
+        sys.setprofile(self._profile)
+
+    def stop(self) -> Stacks:
+        sys.setprofile(None)
+        return self.stacks
+
+    def _profile(self, frame: FrameType, event: str, arg: Any) -> None:
+        if self._names:
+            self.stacks[tuple(self._names)] += time.perf_counter() - self._last
+        match event:
+            case "call":
+                code = frame.f_code
+                self._push(
+                    frame,
+                    False,
+                    frame_name(code.co_filename, code.co_firstlineno, code.co_qualname),
+                )
+            case "c_call":
+                self._push(
+                    frame,
+                    True,
+                    f"<built-in {getattr(arg, '__qualname__', arg)}> "
+                    f"({getattr(arg, '__module__', None) or '~'})",
+                )
+            # frames running before the profiler started return without having
+            # been called, and are left out
+            case "return":
+                self._pop(frame, False)
+            case "c_return" | "c_exception":
+                self._pop(frame, True)
+        self._last = time.perf_counter()
+
+    def _push(self, frame: FrameType, builtin: bool, name: str) -> None:
+        self._calls.append((frame, builtin))
+        self._names.append(name)
+
+    def _pop(self, frame: FrameType, builtin: bool) -> None:
+        if self._calls and self._calls[-1] == (frame, builtin):
+            self._calls.pop()
+            self._names.pop()
+
+
+def collapsed(stacks: Stacks) -> str:
+    """
+    Stacks in the collapsed format of flamegraph.pl and speedscope, weighted in
+    microseconds.
+    """
+    return "".join(
+        f"{';'.join(stack)} {round(seconds * 1e6)}\n"
+        for stack, seconds in stacks.items()
+        if round(seconds * 1e6) > 0
+    )
+
+
+def speedscope(stacks: Stacks, name: str) -> dict[str, Any]:
+    """
+    Stacks as a sampled profile of the speedscope file format, weighted in
+    seconds.
+    """
+    frames: dict[str, int] = {}
+    samples = [[frames.setdefault(x, len(frames)) for x in stack] for stack in stacks]
+    weights = list(stacks.values())
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": x} for x in frames]},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+        "name": name,
+        "exporter": "stapi-fastapi",
+    }
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling single requests on demand, for requests slow only
+    with production data. A request is profiled when its `X-Profile-Token`
+    header is `token`; a request with another token is refused.
+
+    Requests are profiled with a `Sampler` by default, or with a `StackProfiler`
+    when their `X-Profile-Mode` header is "deterministic" or sampling isn't
+    supported by the interpreter. The `StackProfiler` profiles the thread of the
+    event loop, so the requests served concurrently are profiled too. Profiles
+    are written to `directory` in the speedscope format, or as collapsed stacks
+    for flamegraph.pl when the `X-Profile-Format` header is "collapsed", and
+    their file name is returned in the `X-Profile-File` header.
+
+    Only one request is profiled at a time; requests asking to be profiled
+    meanwhile are served without being profiled. Requests not asking to be
+    profiled are only checked for the header.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        token: str,
+        directory: str | Path,
+        interval: float = 0.001,
+    ) -> None:
+        if not token:
+            raise ValueError("A profiling token is required")
+        self.app = app
+        self.token = token.encode()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self._profiling = False
+        self._count = itertools.count(1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not any(
+            key == b"x-profile-token" for key, _ in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if not hmac.compare_digest(headers[PROFILE_TOKEN_HEADER].encode(), self.token):
+            response = JSONResponse(
+                {"detail": "Invalid profiling token"},
+                status_code=status.HTTP_403_FORBIDDEN,
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            mode = ProfileMode(headers.get(PROFILE_MODE_HEADER, ProfileMode.sampling))
+            profile_format = ProfileFormat(
+                headers.get(PROFILE_FORMAT_HEADER, ProfileFormat.speedscope)
+            )
+        except ValueError as e:
+            response = JSONResponse(
+                {"detail": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+            )
+            await response(scope, receive, send)
+            return
+        if self._profiling:
+            await self.app(scope, receive, send)
+            return
+
+        self._profiling = True
+        try:
+            await self.profile(scope, receive, send, mode, profile_format)
+        finally:
+            self._profiling = False
+
+    async def profile(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        mode: ProfileMode,
+        profile_format: ProfileFormat,
+    ) -> None:
+        filename = "-".join(
+            (
+                "profile",
+                time.strftime("%Y%m%dT%H%M%S"),
+                str(os.getpid()),
+                str(next(self._count)),
+            )
+        )
+        if profile_format is ProfileFormat.collapsed:
+            filename += ".txt"
+        else:
+            filename += ".speedscope.json"
+
+        async def send_profiled(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (PROFILE_FILE_HEADER.lower().encode(), filename.encode()),
+                    ],
+                }
+            await send(message)
+
+        task = asyncio.current_task()
+        if mode is ProfileMode.sampling and task and hasattr(sys, "_current_frames"):
+            sampler = Sampler(task, self.interval)
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_profiled)
+            finally:
+                stacks = sampler.stop()
+        else:
+            profiler = StackProfiler()
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_profiled)
+            finally:
+                stacks = profiler.stop()
+
+        title = f"{scope['method']} {scope['path']}"
+        if profile_format is ProfileFormat.collapsed:
+            content = collapsed(stacks)
+        else:
+            content = json.dumps(speedscope(stacks, title))
+        await asyncio.to_thread((self.directory / filename).write_text, content)
@@ -1,7 +1,27 @@
-from fastapi.responses import JSONResponse
+import json
+from typing import Any
 
-from stapi_fastapi.constants import TYPE_GEOJSON
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from stapi_fastapi.constants import TYPE_EVENT_STREAM, TYPE_GEOJSON
 
 
 class GeoJSONResponse(JSONResponse):
     media_type = TYPE_GEOJSON
+
+
+class EventSourceResponse(StreamingResponse):
+    media_type = TYPE_EVENT_STREAM
+
+    # the status code is in the signature for FastAPI to document it
+    def __init__(self, content: Any, status_code: int = 200, *args, **kwargs) -> None:
+        super().__init__(content, status_code, *args, **kwargs)
+        # keep proxies from buffering or caching the stream
+        self.headers.setdefault("Cache-Control", "no-cache")
+        self.headers.setdefault("X-Accel-Buffering", "no")
+
+
+def server_sent_event(id: int, event: str, data: Any) -> str:
+    return (
+        f"id: {id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+    )
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from starlette.types import Receive, Scope, Send
+
+from stapi_fastapi.exceptions import NotFoundException
+
+if TYPE_CHECKING:
+    from stapi_fastapi.routers import RootRouter
+
+
+def route_path(scope: Scope) -> str:
+    """
+    The path of a request relative to the root path of the application, as
+    Starlette matches routes against it.
+    """
+    path: str = scope["path"]
+    root_path: str = scope.get("root_path", "")
+    if not root_path or not path.startswith(root_path):
+        return path
+    if path == root_path:
+        return ""
+    if path[len(root_path)] == "/":
+        return path[len(root_path) :]
+    return path
+
+
+class ProductDispatch:
+    """
+    ASGI app of the `/products/{product_id}{path}` route of a root router
+    dispatching to products, passing requests on to the router of the product
+    found in a dict, rather than matching them against the routes of every
+    product. The routes of lazily registered products are added on their first
+    request, so products that are never requested cost no more than their entry
+    in the product index.
+
+    This is a class rather than a function so Starlette calls it as an ASGI app,
+    also once the route is copied by `include_router`.
+    """
+
+    def __init__(self, root_router: RootRouter) -> None:
+        self.root_router = root_router
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path_params = scope["path_params"]
+        product_router = self.root_router.product_routers.get(path_params["product_id"])
+        if product_router is None:
+            raise NotFoundException(
+                detail=f"Product '{path_params['product_id']}' not found"
+            )
+        if not product_router.has_routes:
+            product_router.add_routes()
+
+        # Product routes are relative to the product, which is mounted like a
+        # `Mount` does, keeping the root path of the application for URLs.
+        path = route_path(scope)
+        root_path = scope.get("root_path", "")
+        product_scope = {
+            **scope,
+            "app_root_path": scope.get("app_root_path", root_path),
+            "root_path": root_path + path[: len(path) - len(path_params["path"])],
+        }
+        try:
+            await product_router(product_scope, receive, send)
+        finally:
+            # the route of the product handling the request, e.g. for metrics
+            if "route" in product_scope:
+                scope["route"] = product_scope["route"]
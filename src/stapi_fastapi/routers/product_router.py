@@ -2,10 +2,12 @@ from __future__ import annotations
 
 import logging
 import traceback
-from typing import TYPE_CHECKING
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TYPE_CHECKING, Annotated, Any
 
 from fastapi import (
     APIRouter,
+    Body,
     Depends,
     Header,
     HTTPException,
@@ -13,38 +15,77 @@ from fastapi import (
     Response,
     status,
 )
-from fastapi.responses import JSONResponse
+from fastapi.datastructures import URL
+from fastapi.responses import JSONResponse, StreamingResponse
 from geojson_pydantic.geometries import Geometry
-from returns.maybe import Maybe, Some
-from returns.result import Failure, Success
-
-from stapi_fastapi.constants import TYPE_JSON
-from stapi_fastapi.exceptions import ConstraintsException, NotFoundException
+from pydantic import HttpUrl
+from returns.maybe import Maybe, Nothing, Some
+from returns.pipeline import is_successful
+from returns.result import Failure, ResultE, Success
+
+from stapi_fastapi.concurrency import as_completed_bounded
+from stapi_fastapi.constants import TYPE_GEOJSON, TYPE_JSON, TYPE_NDJSON
+from stapi_fastapi.exceptions import (
+    ConstraintsException,
+    NotFoundException,
+    StapiException,
+)
+from stapi_fastapi.fields import (
+    Fieldset,
+    GeometryOutput,
+    get_fields,
+    get_geometry_output,
+    project,
+)
+from stapi_fastapi.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    IDEMPOTENT_REPLAYED_HEADER,
+    IdempotentResponse,
+    fingerprint,
+)
 from stapi_fastapi.models.opportunity import (
+    Opportunity,
     OpportunityCollection,
     OpportunityPayload,
     OpportunitySearchRecord,
+    OpportunitySearchStatusCode,
     Prefer,
 )
-from stapi_fastapi.models.order import Order, OrderPayload
+from stapi_fastapi.models.order import BulkOrderResult, Order, OrderPayload
 from stapi_fastapi.models.product import Product
-from stapi_fastapi.models.shared import Link
+from stapi_fastapi.models.shared import BatchError, Link
+from stapi_fastapi.notifications import opportunity_search_record_topic, order_topic
 from stapi_fastapi.responses import GeoJSONResponse
 from stapi_fastapi.routers.route_names import (
     CREATE_ORDER,
+    CREATE_ORDERS_BULK,
     GET_CONSTRAINTS,
     GET_OPPORTUNITY_COLLECTION,
     GET_ORDER_PARAMETERS,
     GET_PRODUCT,
     SEARCH_OPPORTUNITIES,
 )
+from stapi_fastapi.search_cache import opportunities_within, search_key
+from stapi_fastapi.tracing import span
 from stapi_fastapi.types.json_schema_model import JsonSchemaModel
+from stapi_fastapi.webhooks import CALLBACK_URL_HEADER
 
 if TYPE_CHECKING:
     from stapi_fastapi.routers import RootRouter
 
 logger = logging.getLogger(__name__)
 
+# paths of the product routes, relative to the product's `/products/{product_id}`
+PRODUCT_ROUTE_PATHS = {
+    GET_PRODUCT: "",
+    GET_CONSTRAINTS: "/constraints",
+    GET_ORDER_PARAMETERS: "/order-parameters",
+    CREATE_ORDER: "/orders",
+    CREATE_ORDERS_BULK: "/orders:bulk",
+    SEARCH_OPPORTUNITIES: "/opportunities",
+    GET_OPPORTUNITY_COLLECTION: "/opportunities/{opportunity_collection_id}",
+}
+
 
 def get_prefer(prefer: str | None = Header(None)) -> str | None:
     if prefer is None:
@@ -59,6 +100,16 @@ def get_prefer(prefer: str | None = Header(None)) -> str | None:
     return Prefer(prefer)
 
 
+def get_callback_url(
+    callback_url: HttpUrl | None = Header(
+        None,
+        alias=CALLBACK_URL_HEADER,
+        description="URL to POST status changes of the created resource to",
+    ),
+) -> str | None:
+    return str(callback_url) if callback_url is not None else None
+
+
 class ProductRouter(APIRouter):
     def __init__(
         self,
@@ -67,6 +118,7 @@ class ProductRouter(APIRouter):
         *args,
         **kwargs,
     ) -> None:
+        kwargs.setdefault("route_class", root_router.route_class)
         super().__init__(*args, **kwargs)
 
         if (
@@ -80,9 +132,25 @@ class ProductRouter(APIRouter):
 
         self.product = product
         self.root_router = root_router
+        self.geometry_defaults = GeometryOutput(
+            product.geometry_precision, product.geometry_tolerance
+        )
+        self.has_routes = False
+
+        # routes of lazily registered products are added on their first request
+        if not root_router.lazy_products:
+            self.add_routes()
+
+    def add_routes(self) -> None:
+        """
+        Add the routes of the product. The route and request models are
+        parametrized for the product here, which dominates the cost of registering
+        a product.
+        """
+        self.has_routes = True
 
         self.add_api_route(
-            path="",
+            path=PRODUCT_ROUTE_PATHS[GET_PRODUCT],
             endpoint=self.get_product,
             name=f"{self.root_router.name}:{self.product.id}:{GET_PRODUCT}",
             methods=["GET"],
@@ -91,7 +159,7 @@ class ProductRouter(APIRouter):
         )
 
         self.add_api_route(
-            path="/constraints",
+            path=PRODUCT_ROUTE_PATHS[GET_CONSTRAINTS],
             endpoint=self.get_product_constraints,
             name=f"{self.root_router.name}:{self.product.id}:{GET_CONSTRAINTS}",
             methods=["GET"],
@@ -100,7 +168,7 @@ class ProductRouter(APIRouter):
         )
 
         self.add_api_route(
-            path="/order-parameters",
+            path=PRODUCT_ROUTE_PATHS[GET_ORDER_PARAMETERS],
             endpoint=self.get_product_order_parameters,
             name=f"{self.root_router.name}:{self.product.id}:{GET_ORDER_PARAMETERS}",
             methods=["GET"],
@@ -119,30 +187,65 @@ class ProductRouter(APIRouter):
             payload: OrderPayload,
             request: Request,
             response: Response,
-        ) -> Order:
-            return await self.create_order(payload, request, response)
+            idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+            callback_url: str | None = Depends(get_callback_url),
+        ) -> Order | Response:
+            if idempotency_key is not None and self.root_router.idempotency:
+                return await self.create_order_idempotent(
+                    payload, request, idempotency_key, callback_url
+                )
+            return await self.create_order(payload, request, response, callback_url)
 
         _create_order.__annotations__["payload"] = OrderPayload[
             self.product.order_parameters  # type: ignore
         ]
 
         self.add_api_route(
-            path="/orders",
+            path=PRODUCT_ROUTE_PATHS[CREATE_ORDER],
             endpoint=_create_order,
             name=f"{self.root_router.name}:{self.product.id}:{CREATE_ORDER}",
             methods=["POST"],
             response_class=GeoJSONResponse,
+            response_model=Order,
             status_code=status.HTTP_201_CREATED,
             summary="Create an order for the product",
             tags=["Products"],
         )
 
+        async def _create_orders_bulk(
+            payloads: list[OrderPayload],
+            request: Request,
+        ) -> StreamingResponse:
+            return await self.create_orders_bulk(payloads, request)
+
+        # Oversized requests are refused as the body is validated, after validating
+        # one payload more than the limit rather than all of them.
+        _create_orders_bulk.__annotations__["payloads"] = Annotated[
+            list[OrderPayload[self.product.order_parameters]],  # type: ignore
+            Body(max_length=self.root_router.bulk_max_orders),
+        ]
+
+        self.add_api_route(
+            path=PRODUCT_ROUTE_PATHS[CREATE_ORDERS_BULK],
+            endpoint=_create_orders_bulk,
+            name=f"{self.root_router.name}:{self.product.id}:{CREATE_ORDERS_BULK}",
+            methods=["POST"],
+            response_class=StreamingResponse,
+            responses={200: {"content": {TYPE_NDJSON: {}}}},
+            summary="Create several orders for the product",
+            description=(
+                "Results are streamed as newline-delimited JSON in completion order; "
+                "each line references the position of its payload in the request."
+            ),
+            tags=["Products"],
+        )
+
         if (
-            product.supports_opportunity_search
-            or root_router.supports_async_opportunity_search
+            self.product.supports_opportunity_search
+            or self.root_router.supports_async_opportunity_search
         ):
             self.add_api_route(
-                path="/opportunities",
+                path=PRODUCT_ROUTE_PATHS[SEARCH_OPPORTUNITIES],
                 endpoint=self.search_opportunities,
                 name=f"{self.root_router.name}:{self.product.id}:{SEARCH_OPPORTUNITIES}",
                 methods=["POST"],
@@ -162,23 +265,34 @@ class ProductRouter(APIRouter):
                 tags=["Products"],
             )
 
-        if root_router.supports_async_opportunity_search:
+        if self.root_router.supports_async_opportunity_search:
             self.add_api_route(
-                path="/opportunities/{opportunity_collection_id}",
+                path=PRODUCT_ROUTE_PATHS[GET_OPPORTUNITY_COLLECTION],
                 endpoint=self.get_opportunity_collection,
                 name=f"{self.root_router.name}:{self.product.id}:{GET_OPPORTUNITY_COLLECTION}",
                 methods=["GET"],
                 response_class=GeoJSONResponse,
+                response_model=OpportunityCollection,
                 summary="Get an Opportunity Collection by ID",
                 tags=["Products"],
             )
 
+    def url_for(self, request: Request, name: str, **path_params: Any) -> URL:
+        return self.root_router.generate_product_href(
+            request, self.product.id, name, **path_params
+        )
+
     def get_product(self, request: Request) -> Product:
+        with span("links"):
+            return self.product.with_links(links=self.product_links(request))
+
+    def product_links(self, request: Request) -> list[Link]:
         links = [
             Link(
                 href=str(
-                    request.url_for(
-                        f"{self.root_router.name}:{self.product.id}:{GET_PRODUCT}",
+                    self.url_for(
+                        request,
+                        GET_PRODUCT,
                     ),
                 ),
                 rel="self",
@@ -186,8 +300,9 @@ class ProductRouter(APIRouter):
             ),
             Link(
                 href=str(
-                    request.url_for(
-                        f"{self.root_router.name}:{self.product.id}:{GET_CONSTRAINTS}",
+                    self.url_for(
+                        request,
+                        GET_CONSTRAINTS,
                     ),
                 ),
                 rel="constraints",
@@ -195,8 +310,9 @@ class ProductRouter(APIRouter):
             ),
             Link(
                 href=str(
-                    request.url_for(
-                        f"{self.root_router.name}:{self.product.id}:{GET_ORDER_PARAMETERS}",
+                    self.url_for(
+                        request,
+                        GET_ORDER_PARAMETERS,
                     ),
                 ),
                 rel="order-parameters",
@@ -204,8 +320,9 @@ class ProductRouter(APIRouter):
             ),
             Link(
                 href=str(
-                    request.url_for(
-                        f"{self.root_router.name}:{self.product.id}:{CREATE_ORDER}",
+                    self.url_for(
+                        request,
+                        CREATE_ORDER,
                     ),
                 ),
                 rel="create-order",
@@ -221,8 +338,9 @@ class ProductRouter(APIRouter):
             links.append(
                 Link(
                     href=str(
-                        request.url_for(
-                            f"{self.root_router.name}:{self.product.id}:{SEARCH_OPPORTUNITIES}",
+                        self.url_for(
+                            request,
+                            SEARCH_OPPORTUNITIES,
                         ),
                     ),
                     rel="opportunities",
@@ -230,7 +348,7 @@ class ProductRouter(APIRouter):
                 ),
             )
 
-        return self.product.with_links(links=links)
+        return links
 
     async def search_opportunities(
         self,
@@ -238,6 +356,9 @@ class ProductRouter(APIRouter):
         request: Request,
         response: Response,
         prefer: Prefer | None = Depends(get_prefer),
+        callback_url: str | None = Depends(get_callback_url),
+        fields: Fieldset | None = Depends(get_fields),
+        geometry_output: GeometryOutput = Depends(get_geometry_output),
     ) -> OpportunityCollection | Response:
         """
         Explore the opportunities available for a particular set of constraints
@@ -246,11 +367,27 @@ class ProductRouter(APIRouter):
         if not self.root_router.supports_async_opportunity_search or (
             prefer is Prefer.wait and self.product.supports_opportunity_search
         ):
-            return await self.search_opportunities_sync(
-                search,
-                request,
+            return self.project_opportunities(
+                await self.search_opportunities_sync(
+                    search,
+                    request,
+                    response,
+                    prefer,
+                ),
+                fields,
+                geometry_output,
+                response,
+            )
+
+        # async, answered inline if the search completes within the wait budget
+        if prefer is Prefer.wait and self.root_router.search_wait_budget:
+            return self.project_opportunities(
+                await self.search_opportunities_wait(
+                    search, request, response, callback_url
+                ),
+                fields,
+                geometry_output,
                 response,
-                prefer,
             )
 
         # async
@@ -259,10 +396,33 @@ class ProductRouter(APIRouter):
             or prefer is Prefer.respond_async
             or (prefer is Prefer.wait and not self.product.supports_opportunity_search)
         ):
-            return await self.search_opportunities_async(search, request, prefer)
+            return await self.search_opportunities_async(
+                search, request, prefer, callback_url
+            )
 
         raise AssertionError("Expected code to be unreachable")
 
+    def project_opportunities(
+        self,
+        result: OpportunityCollection | Response,
+        fields: Fieldset | None,
+        geometry_output: GeometryOutput,
+        response: Response | None = None,
+    ) -> OpportunityCollection | Response:
+        """
+        `result` as requested with the `fields`, `precision` and `simplify` query
+        parameters, the latter two defaulting to those of the product.
+        """
+        output = geometry_output.or_defaults(self.geometry_defaults)
+        if isinstance(result, Response) or (fields is None and not output.reduces):
+            return result
+        return project(
+            result,
+            fields.collection() if fields is not None else None,
+            lambda feature: output,
+            headers=dict(response.headers) if response is not None else None,
+        )
+
     async def search_opportunities_sync(
         self,
         search: OpportunityPayload,
@@ -271,20 +431,15 @@ class ProductRouter(APIRouter):
         prefer: Prefer | None,
     ) -> OpportunityCollection:
         links: list[Link] = []
-        match await self.product.search_opportunities(
-            self,
-            search,
-            search.next,
-            search.limit,
-            request,
-        ):
+        match await self.find_opportunities(search, request):
             case Success((features, maybe_pagination_token)):
-                links.append(self.order_link(request, search))
-                match maybe_pagination_token:
-                    case Some(x):
-                        links.append(self.pagination_link(request, search, x))
-                    case Maybe.empty:
-                        pass
+                with span("links"):
+                    links.append(self.order_link(request, search))
+                    match maybe_pagination_token:
+                        case Some(x):
+                            links.append(self.pagination_link(request, search, x))
+                        case Maybe.empty:
+                            pass
             case Failure(e) if isinstance(e, ConstraintsException):
                 raise e
             case Failure(e):
@@ -304,32 +459,229 @@ class ProductRouter(APIRouter):
 
         return OpportunityCollection(features=features, links=links)
 
+    async def find_opportunities(
+        self, search: OpportunityPayload, request: Request
+    ) -> ResultE[tuple[list[Opportunity], Maybe[str]]]:
+        """
+        Search opportunities through the backend, serving identical searches made
+        within the product's `search_cache_ttl` from the cache.
+        """
+        key = self.search_cache_key(
+            "opportunities", search, request, search.next, search.limit
+        )
+        if key is not None and (cached := self.root_router.search_cache.get(key)):
+            return cached
+        if (
+            contained := await self.completed_search_opportunities(search, request)
+        ) is not None:
+            return Success((contained, Nothing))
+
+        result = await self.call_backend(
+            "search_opportunities",
+            self.product.search_opportunities,
+            self,
+            search,
+            self.root_router.pagination_position(search.next),
+            search.limit,
+            request,
+        )
+        if key is not None and self.product.search_cache_ttl and is_successful(result):
+            self.root_router.search_cache.put(
+                key, result, self.product.search_cache_ttl
+            )
+        match result:
+            case Success((opportunities, Maybe.empty)) if search.next is None:
+                # a single page is the complete result of the search
+                self.remember_completed_search(search, opportunities, request)
+        return result
+
+    def search_cache_key(
+        self, kind: str, search: OpportunityPayload, request: Request, *parts: Any
+    ) -> str | None:
+        if not self.product.search_cache_ttl:
+            return None
+        # results are scoped to the caller's credentials like idempotency keys
+        return search_key(
+            self.product.id,
+            kind,
+            request.headers.get("Authorization"),
+            *parts,
+            search=search,
+        )
+
+    def remember_completed_search(
+        self,
+        search: OpportunityPayload,
+        result: list[Opportunity] | OpportunitySearchRecord,
+        request: Request,
+    ) -> None:
+        """
+        Index the result of a completed search so that searches within its area and
+        interval are answered without searching again, for the product's
+        `search_cache_ttl`.
+        """
+        if self.product.search_cache_ttl:
+            self.root_router.completed_searches.add(
+                self.completed_search_scope(search, request),
+                search,
+                result,
+                self.product.search_cache_ttl,
+            )
+
+    async def completed_search_opportunities(
+        self, search: OpportunityPayload, request: Request
+    ) -> list[Opportunity] | None:
+        """
+        The opportunities answering `search` taken from a completed search whose area
+        and interval contain those of `search`, or `None` if there is no such search
+        or its opportunities don't fit a single page.
+        """
+        if not self.product.search_cache_ttl or search.next is not None:
+            return None
+        completed = self.root_router.completed_searches.find(
+            self.completed_search_scope(search, request), search
+        )
+        if completed is None:
+            return None
+        if isinstance(completed.result, OpportunitySearchRecord):
+            collection = await self.search_result(completed.result, request)
+            if collection is None:
+                return None
+            completed.result = list(collection.features)
+        opportunities = opportunities_within(completed.result, search)
+        return opportunities if len(opportunities) <= search.limit else None
+
+    def completed_search_scope(
+        self, search: OpportunityPayload, request: Request
+    ) -> str:
+        # only searches with the same filter by the same caller answer each other
+        return fingerprint(
+            self.product.id, request.headers.get("Authorization"), search.filter or None
+        )
+
     async def search_opportunities_async(
         self,
         search: OpportunityPayload,
         request: Request,
         prefer: Prefer | None,
+        callback_url: str | None = None,
     ) -> JSONResponse:
-        match await self.product.search_opportunities_async(self, search, request):
-            case Success(search_record):
-                search_record.links.append(
-                    self.root_router.opportunity_search_record_self_link(
-                        search_record, request
-                    )
-                )
-                headers = {}
-                headers["Location"] = str(
-                    self.root_router.generate_opportunity_search_record_href(
-                        request, search_record.id
+        search_record = await self.start_opportunity_search(
+            search, request, callback_url
+        )
+        return self.search_record_created(search_record, request, prefer)
+
+    async def search_opportunities_wait(
+        self,
+        search: OpportunityPayload,
+        request: Request,
+        response: Response,
+        callback_url: str | None,
+    ) -> OpportunityCollection | JSONResponse:
+        """
+        Emulate `Prefer: wait` for products that only search asynchronously: start
+        the search and, if it completes within the root router's
+        `search_wait_budget`, return its opportunities instead of the search record.
+        Searches within the area and interval of a completed search are answered
+        from its opportunities without starting a search.
+        """
+        if (
+            contained := await self.completed_search_opportunities(search, request)
+        ) is not None:
+            response.headers["Preference-Applied"] = "wait"
+            return OpportunityCollection(
+                features=contained, links=[self.order_link(request, search)]
+            )
+
+        search_record = await self.start_opportunity_search(
+            search, request, callback_url
+        )
+        match await self.root_router.wait_for_opportunity_search(
+            search_record.id, request, response
+        ):
+            case Success(Some(completed)) if (
+                completed.status.status_code == OpportunitySearchStatusCode.completed
+            ):
+                self.root_router.observe_opportunity_search_status(completed, request)
+                if (
+                    collection := await self.search_result(completed, request)
+                ) is not None:
+                    self.remember_completed_search(
+                        completed.opportunity_request,
+                        list(collection.features),
+                        request,
                     )
+                    response.headers["Preference-Applied"] = "wait"
+                    return collection
+        return self.search_record_created(search_record, request, Prefer.wait)
+
+    async def start_opportunity_search(
+        self,
+        search: OpportunityPayload,
+        request: Request,
+        callback_url: str | None,
+    ) -> OpportunitySearchRecord:
+        """
+        Start an asynchronous opportunity search, or reuse the record of an
+        identical search made within the product's `search_cache_ttl`.
+        """
+        await self.check_callback_url(callback_url)
+        key = self.search_cache_key("search-record", search, request)
+        search_record = await self.cached_search_record(key, request)
+        if search_record is None:
+            search_record = await self.submit_opportunity_search(search, request)
+            if key is not None and self.product.search_cache_ttl:
+                self.root_router.search_cache.put(
+                    key, search_record.id, self.product.search_cache_ttl
                 )
-                if prefer is not None:
-                    headers["Preference-Applied"] = "respond-async"
-                return JSONResponse(
-                    status_code=201,
-                    content=search_record.model_dump(mode="json"),
-                    headers=headers,
+
+        search_record.links.append(
+            self.root_router.opportunity_search_record_self_link(search_record, request)
+        )
+        await self.root_router.register_callback(
+            opportunity_search_record_topic(search_record.id), callback_url
+        )
+        self.root_router.observe_opportunity_search_status(search_record, request)
+        self.root_router.watch_opportunity_search(search_record.id, request)
+        return search_record
+
+    async def cached_search_record(
+        self, key: str | None, request: Request
+    ) -> OpportunitySearchRecord | None:
+        if (
+            key is None
+            or (search_record_id := self.root_router.search_cache.get(key)) is None
+        ):
+            return None
+        match await self.root_router.call_backend(
+            "get_opportunity_search_record",
+            self.root_router._get_opportunity_search_record,
+            search_record_id,
+            request,
+        ):
+            case Success(Some(search_record)) if (
+                search_record.status.status_code
+                not in (
+                    OpportunitySearchStatusCode.failed,
+                    OpportunitySearchStatusCode.canceled,
                 )
+            ):
+                return search_record
+        self.root_router.search_cache.delete(key)
+        return None
+
+    async def submit_opportunity_search(
+        self, search: OpportunityPayload, request: Request
+    ) -> OpportunitySearchRecord:
+        match await self.call_backend(
+            "search_opportunities_async",
+            self.product.search_opportunities_async,
+            self,
+            search,
+            request,
+        ):
+            case Success(search_record):
+                return search_record
             case Failure(e) if isinstance(e, ConstraintsException):
                 raise e
             case Failure(e):
@@ -344,6 +696,59 @@ class ProductRouter(APIRouter):
             case x:
                 raise AssertionError(f"Expected code to be unreachable: {x}")
 
+    def search_record_created(
+        self,
+        search_record: OpportunitySearchRecord,
+        request: Request,
+        prefer: Prefer | None,
+    ) -> JSONResponse:
+        headers = {}
+        headers["Location"] = str(
+            self.root_router.generate_opportunity_search_record_href(
+                request, search_record.id
+            )
+        )
+        if prefer is not None:
+            headers["Preference-Applied"] = "respond-async"
+        return JSONResponse(
+            status_code=201,
+            content=search_record.model_dump(mode="json"),
+            headers=headers,
+        )
+
+    async def search_result(
+        self, search_record: OpportunitySearchRecord, request: Request
+    ) -> OpportunityCollection | None:
+        """
+        The opportunity collection a completed search record links to, or `None` if
+        it has no such link or the collection can't be fetched.
+        """
+        link = next((x for x in search_record.links if x.rel == "opportunities"), None)
+        if link is None:
+            return None
+        opportunity_collection_id = str(link.href).rstrip("/").rsplit("/", 1)[-1]
+        match await self.call_backend(
+            "get_opportunity_collection",
+            self.product.get_opportunity_collection,
+            self,
+            opportunity_collection_id,
+            request,
+        ):
+            case Success(Some(opportunity_collection)):
+                opportunity_collection.links.append(
+                    self.opportunity_collection_self_link(
+                        opportunity_collection_id, request
+                    )
+                )
+                return opportunity_collection
+            case Failure(e):
+                logger.error(
+                    "An error occurred while fetching the opportunities of search '%s': %s",
+                    search_record.id,
+                    traceback.format_exception(e),
+                )
+        return None
+
     def get_product_constraints(self) -> JsonSchemaModel:
         """
         Return supported constraints of a specific product
@@ -356,19 +761,65 @@ class ProductRouter(APIRouter):
         """
         return self.product.order_parameters
 
+    async def call_backend[**P, R](
+        self,
+        name: str,
+        fn: Callable[P, Awaitable[R]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> R:
+        """
+        Invoke the product's backend callable `fn` through the root router, with the
+        product's timeout for `name` if it has one.
+        """
+        timeout = self.product.timeouts.get(
+            name, self.root_router.backend_timeouts.get(name)
+        )
+        return await self.root_router.invoke_backend(name, timeout, fn, *args, **kwargs)
+
+    async def check_callback_url(self, callback_url: str | None) -> None:
+        if callback_url is None:
+            return
+        webhooks = self.root_router.webhooks
+        if webhooks is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{CALLBACK_URL_HEADER} is not supported by this server",
+            )
+        if not await webhooks.callback_url_validator(callback_url):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{CALLBACK_URL_HEADER} {callback_url} is not allowed",
+            )
+
     async def create_order(
-        self, payload: OrderPayload, request: Request, response: Response
+        self,
+        payload: OrderPayload,
+        request: Request,
+        response: Response,
+        callback_url: str | None = None,
     ) -> Order:
         """
         Create a new order.
         """
-        match await self.product.create_order(
+        await self.check_callback_url(callback_url)
+        match await self.call_backend(
+            "create_order",
+            self.product.create_order,
             self,
             payload,
             request,
         ):
             case Success(order):
-                order.links.extend(self.root_router.order_links(order, request))
+                with span("links"):
+                    order.links.extend(self.root_router.order_links(order, request))
+                await self.root_router.register_callback(
+                    order_topic(order.id), callback_url
+                )
+                self.root_router.observe_order_status(
+                    order.id, order.properties.status, request
+                )
+                self.root_router.watch_order(order.id, request)
                 location = str(self.root_router.generate_order_href(request, order.id))
                 response.headers["Location"] = location
                 return order
@@ -386,11 +837,112 @@ class ProductRouter(APIRouter):
             case x:
                 raise AssertionError(f"Expected code to be unreachable {x}")
 
+    async def create_order_idempotent(
+        self,
+        payload: OrderPayload,
+        request: Request,
+        idempotency_key: str,
+        callback_url: str | None = None,
+    ) -> Response:
+        """
+        Create a new order at most once per `Idempotency-Key`, replaying the stored
+        response for retries.
+        """
+        assert self.root_router.idempotency is not None
+        # keys are scoped to the product and the caller's credentials so one client
+        # cannot replay another client's order
+        key = fingerprint(
+            self.product.id, request.headers.get("Authorization"), idempotency_key
+        )
+        payload_fingerprint = fingerprint(payload.model_dump(mode="json"))
+
+        async def operation() -> IdempotentResponse:
+            response = Response()
+            order = await self.create_order(payload, request, response, callback_url)
+            return IdempotentResponse(
+                fingerprint=payload_fingerprint,
+                status_code=status.HTTP_201_CREATED,
+                headers={"Location": response.headers["Location"]},
+                body=bytes(GeoJSONResponse(order.model_dump(mode="json")).body),
+            )
+
+        stored, replayed = await self.root_router.idempotency.execute(
+            key, payload_fingerprint, operation
+        )
+        headers = dict(stored.headers)
+        if replayed:
+            headers[IDEMPOTENT_REPLAYED_HEADER] = "true"
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            headers=headers,
+            media_type=TYPE_GEOJSON,
+        )
+
+    async def create_orders_bulk(
+        self, payloads: list[OrderPayload], request: Request
+    ) -> StreamingResponse:
+        """
+        Create an order for every payload, streaming each result as it completes.
+        The number of payloads is limited to `bulk_max_orders` by the validation
+        of the request body.
+        """
+
+        async def results() -> AsyncIterator[str]:
+            async for index, result in as_completed_bounded(
+                payloads,
+                lambda payload: self.call_backend(
+                    "create_order", self.product.create_order, self, payload, request
+                ),
+                self.root_router.batch_concurrency,
+            ):
+                yield self.bulk_order_result(index, result, request).model_dump_json()
+                yield "\n"
+
+        return StreamingResponse(results(), media_type=TYPE_NDJSON)
+
+    def bulk_order_result(
+        self, index: int, result: ResultE[Order], request: Request
+    ) -> BulkOrderResult:
+        match result:
+            case Success(order):
+                order.links.extend(self.root_router.order_links(order, request))
+                self.root_router.observe_order_status(
+                    order.id, order.properties.status, request
+                )
+                self.root_router.watch_order(order.id, request)
+                return BulkOrderResult(
+                    index=index, status=status.HTTP_201_CREATED, order=order
+                )
+            case Failure(StapiException() as e):
+                return BulkOrderResult(
+                    index=index,
+                    status=e.status_code,
+                    error=BatchError.from_exception(e),
+                )
+            case Failure(e):
+                logger.error(
+                    "An error occurred while creating order %s of a bulk request: %s",
+                    index,
+                    traceback.format_exception(e),
+                )
+            case x:
+                logger.error("Unexpected result creating order %s: %s", index, x)
+        return BulkOrderResult(
+            index=index,
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            error=BatchError(
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error creating order",
+            ),
+        )
+
     def order_link(self, request: Request, opp_req: OpportunityPayload):
         return Link(
             href=str(
-                request.url_for(
-                    f"{self.root_router.name}:{self.product.id}:{CREATE_ORDER}",
+                self.url_for(
+                    request,
+                    CREATE_ORDER,
                 ),
             ),
             rel="create-order",
@@ -403,7 +955,7 @@ class ProductRouter(APIRouter):
         self, request: Request, opp_req: OpportunityPayload, pagination_token: str
     ):
         body = opp_req.body()
-        body["next"] = pagination_token
+        body["next"] = self.root_router.pagination_token(pagination_token)
         return Link(
             href=str(request.url),
             rel="next",
@@ -413,30 +965,31 @@ class ProductRouter(APIRouter):
         )
 
     async def get_opportunity_collection(
-        self, opportunity_collection_id: str, request: Request
-    ) -> OpportunityCollection:
+        self,
+        opportunity_collection_id: str,
+        request: Request,
+        fields: Fieldset | None = Depends(get_fields),
+        geometry_output: GeometryOutput = Depends(get_geometry_output),
+    ) -> OpportunityCollection | Response:
         """
         Fetch an opportunity collection generated by an asynchronous opportunity search.
         """
-        match await self.product.get_opportunity_collection(
+        match await self.call_backend(
+            "get_opportunity_collection",
+            self.product.get_opportunity_collection,
             self,
             opportunity_collection_id,
             request,
         ):
             case Success(Some(opportunity_collection)):
                 opportunity_collection.links.append(
-                    Link(
-                        href=str(
-                            request.url_for(
-                                f"{self.root_router.name}:{self.product.id}:{GET_OPPORTUNITY_COLLECTION}",
-                                opportunity_collection_id=opportunity_collection_id,
-                            ),
-                        ),
-                        rel="self",
-                        type=TYPE_JSON,
-                    ),
+                    self.opportunity_collection_self_link(
+                        opportunity_collection_id, request
+                    )
+                )
+                return self.project_opportunities(
+                    opportunity_collection, fields, geometry_output
                 )
-                return opportunity_collection
             case Success(Maybe.empty):
                 raise NotFoundException("Opportunity Collection not found")
             case Failure(e):
@@ -451,3 +1004,18 @@ class ProductRouter(APIRouter):
                 )
             case x:
                 raise AssertionError(f"Expected code to be unreachable {x}")
+
+    def opportunity_collection_self_link(
+        self, opportunity_collection_id: str, request: Request
+    ) -> Link:
+        return Link(
+            href=str(
+                self.url_for(
+                    request,
+                    GET_OPPORTUNITY_COLLECTION,
+                    opportunity_collection_id=opportunity_collection_id,
+                ),
+            ),
+            rel="self",
+            type=TYPE_JSON,
+        )
@@ -1,53 +1,205 @@
+import asyncio
 import logging
+import threading
+import time
 import traceback
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, NamedTuple
 
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from fastapi.datastructures import URL
-from returns.maybe import Maybe, Some
-from returns.result import Failure, Success
+from returns.maybe import Maybe, Nothing, Some
+from returns.result import Failure, ResultE, Success
+from starlette.routing import Route
 
+from stapi_fastapi.admission import AdmissionControl, OverloadedException
 from stapi_fastapi.backends.root_backend import (
     GetOpportunitySearchRecord,
     GetOpportunitySearchRecords,
     GetOrder,
     GetOrders,
+    GetOrdersByIds,
     GetOrderStatuses,
 )
-from stapi_fastapi.constants import TYPE_GEOJSON, TYPE_JSON
-from stapi_fastapi.exceptions import NotFoundException
+from stapi_fastapi.concurrency import gather_bounded
+from stapi_fastapi.constants import (
+    TYPE_EVENT_STREAM,
+    TYPE_GEOJSON,
+    TYPE_JSON,
+    TYPE_PROMETHEUS,
+)
+from stapi_fastapi.cursor import CursorSigner, InvalidCursorError
+from stapi_fastapi.exceptions import (
+    BackendTimeoutException,
+    NotFoundException,
+    StapiException,
+)
+from stapi_fastapi.fields import (
+    Fieldset,
+    GeometryOutput,
+    get_fields,
+    get_geometry_output,
+    project,
+)
+from stapi_fastapi.idempotency import Idempotency, IdempotencyStore
+from stapi_fastapi.metrics import Metrics, backend_outcome
 from stapi_fastapi.models.conformance import (
     ASYNC_OPPORTUNITIES,
     CORE,
     Conformance,
 )
 from stapi_fastapi.models.opportunity import (
+    FINAL_OPPORTUNITY_SEARCH_STATUS_CODES,
     OpportunitySearchRecord,
     OpportunitySearchRecords,
+    OpportunitySearchStatusCode,
 )
 from stapi_fastapi.models.order import (
+    FINAL_ORDER_STATUS_CODES,
     Order,
     OrderCollection,
+    OrdersBatch,
+    OrdersBatchRequest,
+    OrderStatus,
     OrderStatuses,
+    OrderStatusesBatch,
 )
 from stapi_fastapi.models.product import Product, ProductsCollection
 from stapi_fastapi.models.root import RootResponse
-from stapi_fastapi.models.shared import Link
-from stapi_fastapi.responses import GeoJSONResponse
-from stapi_fastapi.routers.product_router import ProductRouter
+from stapi_fastapi.models.shared import BatchError, Link
+from stapi_fastapi.notifications import (
+    NotificationBus,
+    StatusEvent,
+    opportunity_search_record_topic,
+    order_topic,
+)
+from stapi_fastapi.openapi import OpenAPICache
+from stapi_fastapi.responses import (
+    EventSourceResponse,
+    GeoJSONResponse,
+    server_sent_event,
+)
+from stapi_fastapi.routers.product_dispatch import ProductDispatch
+from stapi_fastapi.routers.product_router import PRODUCT_ROUTE_PATHS, ProductRouter
 from stapi_fastapi.routers.route_names import (
     CONFORMANCE,
     GET_OPPORTUNITY_SEARCH_RECORD,
     GET_ORDER,
+    GET_ORDERS_BATCH,
+    LIST_EVENTS,
     LIST_OPPORTUNITY_SEARCH_RECORDS,
+    LIST_ORDER_EVENTS,
     LIST_ORDER_STATUSES,
+    LIST_ORDER_STATUSES_BATCH,
     LIST_ORDERS,
     LIST_PRODUCTS,
+    METRICS,
+    PRODUCT_ROUTES,
     ROOT,
 )
+from stapi_fastapi.search_cache import CompletedSearchIndex, SearchCache
+from stapi_fastapi.status_poller import StatusPoller
+from stapi_fastapi.timing import TimedRoute
+from stapi_fastapi.tracing import span
+from stapi_fastapi.webhooks import WebhookDispatcher
 
 logger = logging.getLogger(__name__)
 
 
+class Wait(NamedTuple):
+    seconds: float
+    # whether the wait was requested with a `Prefer: wait=N` header rather than the
+    # `wait` query parameter
+    preferred: bool
+
+
+def get_wait(
+    wait: float | None = Query(
+        None,
+        ge=0,
+        description=(
+            "Hold the request open for up to this many seconds until the status "
+            "changes. Equivalent to a `Prefer: wait=N` header."
+        ),
+    ),
+    prefer: str | None = Header(None),
+) -> Wait | None:
+    if wait is not None:
+        return Wait(wait, preferred=False)
+    if prefer is None:
+        return None
+
+    # RFC 7240: preferences are comma separated, may carry parameters after `;`, and
+    # unrecognized or malformed preferences are ignored
+    for preference in prefer.split(","):
+        name, _, value = preference.split(";", 1)[0].partition("=")
+        if name.strip().lower() != "wait":
+            continue
+        try:
+            return Wait(max(float(value.strip().strip('"')), 0), preferred=True)
+        except ValueError:
+            return None
+    return None
+
+
+def get_last_event_id(last_event_id: str | None = Header(None)) -> int | None:
+    try:
+        return int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        return None
+
+
+def order_statuses_state(result: Any) -> object:
+    match result:
+        case Success(Some((statuses, Maybe.empty))) if (
+            statuses and statuses[-1].status_code in FINAL_ORDER_STATUS_CODES
+        ):
+            return None
+        case Success(Some((statuses, maybe_pagination_token))):
+            return (
+                [(s.timestamp, s.status_code) for s in statuses],
+                maybe_pagination_token,
+            )
+    return None
+
+
+def opportunity_search_record_state(result: Any) -> object:
+    match result:
+        case Success(Some(search_record)) if (
+            search_record.status.status_code
+            not in FINAL_OPPORTUNITY_SEARCH_STATUS_CODES
+        ):
+            return (search_record.status.status_code, search_record.status.reason_code)
+    return None
+
+
+def opportunity_search_completion_state(result: Any) -> object:
+    # unlike `opportunity_search_record_state`, progress short of a final status
+    # doesn't end the wait
+    return None if opportunity_search_record_state(result) is None else True
+
+
+def backoff(initial: float, maximum: float) -> Iterator[float]:
+    """
+    Intervals doubling from `initial` up to `maximum`.
+    """
+    interval = initial
+    while True:
+        yield interval
+        interval = min(interval * 2, maximum)
+
+
 class RootRouter(APIRouter):
     def __init__(
         self,
@@ -60,9 +212,35 @@ class RootRouter(APIRouter):
         name: str = "root",
         openapi_endpoint_name: str = "openapi",
         docs_endpoint_name: str = "swagger_ui_html",
+        get_orders_by_ids: GetOrdersByIds | None = None,
+        batch_max_ids: int = 100,
+        batch_concurrency: int = 10,
+        bulk_max_orders: int = 500,
+        idempotency_store: IdempotencyStore | None = None,
+        idempotency_ttl: float = 24 * 60 * 60,
+        notification_bus: NotificationBus | None = None,
+        long_poll_max_wait: float = 30,
+        long_poll_recheck_interval: float | None = 5,
+        event_tenant: Callable[[Request], str | None] | None = None,
+        event_stream_heartbeat: float = 15,
+        event_stream_max_duration: float | None = 60 * 60,
+        webhooks: WebhookDispatcher | None = None,
+        status_poller: StatusPoller | None = None,
+        search_wait_budget: float | None = None,
+        search_wait_recheck_interval: float = 0.25,
+        search_wait_max_recheck_interval: float = 2,
+        admission: AdmissionControl | None = None,
+        backend_timeouts: dict[str, float] | None = None,
+        search_cache_size: int = 1024,
+        pagination_secret: str | bytes | None = None,
+        lazy_products: bool = False,
+        dispatch_products: bool = False,
+        metrics: Metrics | None = None,
         *args,
         **kwargs,
     ) -> None:
+        # timings of requests for the metrics and tracing middlewares
+        kwargs.setdefault("route_class", TimedRoute)
         super().__init__(*args, **kwargs)
 
         if ASYNC_OPPORTUNITIES in conformances and (
@@ -76,8 +254,40 @@ class RootRouter(APIRouter):
         self._get_orders = get_orders
         self._get_order = get_order
         self._get_order_statuses = get_order_statuses
+        self._get_orders_by_ids = get_orders_by_ids
+        self.batch_max_ids = batch_max_ids
+        self.batch_concurrency = batch_concurrency
+        self.bulk_max_orders = bulk_max_orders
+        self.idempotency = (
+            Idempotency(idempotency_store, idempotency_ttl)
+            if idempotency_store is not None
+            else None
+        )
         self.__get_opportunity_search_records = get_opportunity_search_records
         self.__get_opportunity_search_record = get_opportunity_search_record
+        self.notifications = notification_bus or NotificationBus()
+        self.long_poll_max_wait = long_poll_max_wait
+        self.long_poll_recheck_interval = long_poll_recheck_interval
+        self.event_tenant = event_tenant
+        self.event_stream_heartbeat = event_stream_heartbeat
+        self.event_stream_max_duration = event_stream_max_duration
+        self.search_wait_budget = search_wait_budget
+        self.search_wait_recheck_interval = search_wait_recheck_interval
+        self.search_wait_max_recheck_interval = search_wait_max_recheck_interval
+        self.admission = admission
+        self.backend_timeouts = backend_timeouts or {}
+        self.backend_timeout_counts: Counter[str] = Counter()
+        self.search_cache = SearchCache(search_cache_size)
+        self.completed_searches = CompletedSearchIndex(search_cache_size)
+        self.cursor_signer = (
+            CursorSigner(pagination_secret) if pagination_secret is not None else None
+        )
+        self.webhooks = webhooks
+        if webhooks is not None:
+            self.notifications.add_handler(webhooks.handle)
+        self.status_poller = status_poller
+        # run the delivery workers and the poller for the lifespan of the application
+        self.run_for_lifespan(*(x for x in (webhooks, status_poller) if x is not None))
         self.conformances = conformances
         self.name = name
         self.openapi_endpoint_name = openapi_endpoint_name
@@ -89,6 +299,24 @@ class RootRouter(APIRouter):
         # manage clobbering if multiple products with the same product_id are
         # added.
         self.product_routers: dict[str, ProductRouter] = {}
+        self._products_lock = threading.Lock()
+
+        # Products may share a single route dispatching to their routers by
+        # product id, rather than adding routes for each product matched one after
+        # the other. Lazily registered products are dispatched to, their routers
+        # adding their routes on the first request to the product.
+        self.lazy_products = lazy_products
+        self.dispatch_products = dispatch_products or lazy_products
+        self.openapi_cache: OpenAPICache | None = None
+        if self.dispatch_products:
+            self.routes.append(
+                Route(
+                    "/products/{product_id}{path:path}",
+                    ProductDispatch(self),
+                    name=f"{self.name}:{PRODUCT_ROUTES}",
+                    include_in_schema=False,
+                )
+            )
 
         self.add_api_route(
             "/",
@@ -106,6 +334,17 @@ class RootRouter(APIRouter):
             tags=["Conformance"],
         )
 
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.collectors.append(self.collect_metrics)
+            self.add_api_route(
+                "/metrics",
+                self.get_metrics,
+                methods=["GET"],
+                name=f"{self.name}:{METRICS}",
+                include_in_schema=False,
+            )
+
         self.add_api_route(
             "/products",
             self.get_products,
@@ -120,6 +359,7 @@ class RootRouter(APIRouter):
             methods=["GET"],
             name=f"{self.name}:{LIST_ORDERS}",
             response_class=GeoJSONResponse,
+            response_model=OrderCollection,
             tags=["Orders"],
         )
 
@@ -129,6 +369,7 @@ class RootRouter(APIRouter):
             methods=["GET"],
             name=f"{self.name}:{GET_ORDER}",
             response_class=GeoJSONResponse,
+            response_model=Order,
             tags=["Orders"],
         )
 
@@ -140,6 +381,50 @@ class RootRouter(APIRouter):
             tags=["Orders"],
         )
 
+        self.add_api_route(
+            "/orders/{order_id}/events",
+            self.get_order_events,
+            methods=["GET"],
+            name=f"{self.name}:{LIST_ORDER_EVENTS}",
+            response_class=EventSourceResponse,
+            responses={200: {"content": {TYPE_EVENT_STREAM: {}}}},
+            summary="Stream status changes of an Order as Server-Sent Events",
+            tags=["Orders"],
+        )
+
+        # the events of every order and search are only streamed to the tenant
+        # they were published for, so without tenants there is no global stream
+        if event_tenant is not None:
+            self.add_api_route(
+                "/events",
+                self.get_events,
+                methods=["GET"],
+                name=f"{self.name}:{LIST_EVENTS}",
+                response_class=EventSourceResponse,
+                responses={200: {"content": {TYPE_EVENT_STREAM: {}}}},
+                summary="Stream status changes of all Orders and Opportunity "
+                "Searches as Server-Sent Events",
+                tags=["Root"],
+            )
+
+        self.add_api_route(
+            "/orders:batchGet",
+            self.get_orders_batch,
+            methods=["POST"],
+            name=f"{self.name}:{GET_ORDERS_BATCH}",
+            summary="Get several Orders by ID",
+            tags=["Orders"],
+        )
+
+        self.add_api_route(
+            "/orders:batchStatuses",
+            self.get_order_statuses_batch,
+            methods=["POST"],
+            name=f"{self.name}:{LIST_ORDER_STATUSES_BATCH}",
+            summary="Get the statuses of several Orders by ID",
+            tags=["Orders"],
+        )
+
         if ASYNC_OPPORTUNITIES in conformances:
             self.add_api_route(
                 "/searches/opportunities",
@@ -215,14 +500,31 @@ class RootRouter(APIRouter):
     def get_conformance(self) -> Conformance:
         return Conformance(conforms_to=self.conformances)
 
+    def get_metrics(self) -> Response:
+        assert self.metrics is not None
+        return Response(self.metrics.exposition(), media_type=TYPE_PROMETHEUS)
+
+    def collect_metrics(self) -> None:
+        assert self.metrics is not None
+        for backend, count in self.backend_timeout_counts.items():
+            self.metrics.backend_timeouts.set(count, backend)
+        if self.admission is None:
+            return
+        for limiter, stats in self.admission.stats().items():
+            self.metrics.admission_in_flight.set(stats.in_flight, limiter)
+            self.metrics.admission_queued.set(stats.queued, limiter)
+            self.metrics.admission_admitted.set(stats.admitted, limiter)
+            self.metrics.admission_shed.set(stats.shed, limiter)
+            self.metrics.admission_wait.set(stats.wait_seconds_total, limiter)
+
     def get_products(
         self, request: Request, next: str | None = None, limit: int = 10
     ) -> ProductsCollection:
         start = 0
         limit = min(limit, 100)
         try:
-            if next:
-                start = self.product_ids.index(next)
+            if position := self.pagination_position(next):
+                start = self.product_ids.index(position)
         except ValueError:
             logger.exception("An error occurred while retrieving products")
             raise NotFoundException(
@@ -240,26 +542,44 @@ class RootRouter(APIRouter):
         if end > 0 and end < len(self.product_ids):
             links.append(self.pagination_link(request, self.product_ids[end], limit))
         return ProductsCollection(
+            # products may be removed meanwhile
             products=[
-                self.product_routers[product_id].get_product(request)
+                product_router.get_product(request)
                 for product_id in ids
+                if (product_router := self.product_routers.get(product_id))
             ],
             links=links,
         )
 
     async def get_orders(
-        self, request: Request, next: str | None = None, limit: int = 10
-    ) -> OrderCollection:
+        self,
+        request: Request,
+        next: str | None = None,
+        limit: int = 10,
+        fields: Fieldset | None = Depends(get_fields),
+        geometry_output: GeometryOutput = Depends(get_geometry_output),
+    ) -> OrderCollection | Response:
         links: list[Link] = []
-        match await self._get_orders(next, limit, request):
+        match await self.call_backend(
+            "get_orders",
+            self._get_orders,
+            self.pagination_position(next),
+            limit,
+            request,
+        ):
             case Success((orders, maybe_pagination_token)):
+                with span("links", count=len(orders)):
+                    for order in orders:
+                        order.links.extend(self.order_links(order, request))
+                    match maybe_pagination_token:
+                        case Some(x):
+                            links.append(self.pagination_link(request, x, limit))
+                        case Maybe.empty:
+                            pass
                 for order in orders:
-                    order.links.extend(self.order_links(order, request))
-                match maybe_pagination_token:
-                    case Some(x):
-                        links.append(self.pagination_link(request, x, limit))
-                    case Maybe.empty:
-                        pass
+                    self.observe_order_status(
+                        order.id, order.properties.status, request
+                    )
             case Failure(ValueError()):
                 raise NotFoundException(detail="Error finding pagination token")
             case Failure(e):
@@ -273,16 +593,29 @@ class RootRouter(APIRouter):
                 )
             case _:
                 raise AssertionError("Expected code to be unreachable")
-        return OrderCollection(features=orders, links=links)
+        return self.shape_orders(
+            OrderCollection(features=orders, links=links),
+            orders,
+            fields,
+            geometry_output,
+        )
 
-    async def get_order(self, order_id: str, request: Request) -> Order:
+    async def get_order(
+        self,
+        order_id: str,
+        request: Request,
+        fields: Fieldset | None = Depends(get_fields),
+        geometry_output: GeometryOutput = Depends(get_geometry_output),
+    ) -> Order | Response:
         """
         Get details for order with `order_id`.
         """
-        match await self._get_order(order_id, request):
+        match await self.call_backend("get_order", self._get_order, order_id, request):
             case Success(Some(order)):
-                order.links.extend(self.order_links(order, request))
-                return order
+                with span("links"):
+                    order.links.extend(self.order_links(order, request))
+                self.observe_order_status(order.id, order.properties.status, request)
+                return self.shape_orders(order, [order], fields, geometry_output)
             case Success(Maybe.empty):
                 raise NotFoundException("Order not found")
             case Failure(e):
@@ -298,20 +631,75 @@ class RootRouter(APIRouter):
             case _:
                 raise AssertionError("Expected code to be unreachable")
 
+    def shape_orders[M: (Order, OrderCollection)](
+        self,
+        model: M,
+        orders: list[Order],
+        fields: Fieldset | None,
+        geometry_output: GeometryOutput,
+    ) -> M | Response:
+        """
+        `model` as requested with the `fields`, `precision` and `simplify` query
+        parameters, the latter two defaulting to those of each order's product.
+        """
+        outputs = {
+            order.id: geometry_output.or_defaults(
+                self.geometry_defaults(order.properties.product_id)
+            )
+            for order in orders
+        }
+        if fields is None and not any(x.reduces for x in outputs.values()):
+            return model
+        include = None
+        if fields is not None:
+            include = (
+                fields.collection()
+                if isinstance(model, OrderCollection)
+                else fields.feature()
+            )
+        return project(
+            model,
+            include,
+            lambda feature: outputs.get(feature.get("id", ""), geometry_output),
+        )
+
+    def geometry_defaults(self, product_id: str) -> GeometryOutput:
+        if (product_router := self.product_routers.get(product_id)) is None:
+            return GeometryOutput()
+        return product_router.geometry_defaults
+
     async def get_order_statuses(
         self,
         order_id: str,
         request: Request,
+        response: Response,
         next: str | None = None,
         limit: int = 10,
+        wait: Wait | None = Depends(get_wait),
     ) -> OrderStatuses:
         links: list[Link] = []
-        match await self._get_order_statuses(order_id, next, limit, request):
+        position = self.pagination_position(next)
+        match await self.long_poll(
+            order_topic(order_id),
+            wait,
+            response,
+            lambda: self.call_backend(
+                "get_order_statuses",
+                self._get_order_statuses,
+                order_id,
+                position,
+                limit,
+                request,
+            ),
+            order_statuses_state,
+        ):
             case Success(Some((statuses, maybe_pagination_token))):
                 links.append(self.order_statuses_link(request, order_id))
                 match maybe_pagination_token:
                     case Some(x):
                         links.append(self.pagination_link(request, x, limit))
+                    case Maybe.empty if statuses:
+                        self.observe_order_status(order_id, statuses[-1], request)
                     case Maybe.empty:
                         pass
             case Success(Maybe.empty):
@@ -331,12 +719,509 @@ class RootRouter(APIRouter):
                 raise AssertionError("Expected code to be unreachable")
         return OrderStatuses(statuses=statuses, links=links)
 
+    async def get_orders_batch(
+        self, batch: OrdersBatchRequest, request: Request
+    ) -> OrdersBatch:
+        """
+        Get details for every order in `batch.ids`, reporting missing or failed
+        orders individually instead of failing the whole request.
+        """
+        order_ids = self.batch_ids(batch)
+        if self._get_orders_by_ids is not None:
+            match await self.call_backend(
+                "get_orders_by_ids", self._get_orders_by_ids, order_ids, request
+            ):
+                case Success(dict() as found):
+                    results = found
+                case Failure(e):
+                    logger.error(
+                        "An error occurred while retrieving orders by id: %s",
+                        traceback.format_exception(e),
+                    )
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Error finding Orders",
+                    )
+                case _:
+                    raise AssertionError("Expected code to be unreachable")
+        else:
+            fetched = await gather_bounded(
+                order_ids,
+                lambda order_id: self.call_backend(
+                    "get_order", self._get_order, order_id, request
+                ),
+                self.batch_concurrency,
+            )
+            results = dict(zip(order_ids, fetched))
+
+        batch_result = OrdersBatch()
+        for order_id in order_ids:
+            match results.get(order_id, Success(Nothing)):
+                case Success(Some(order)):
+                    with span("links"):
+                        order.links.extend(self.order_links(order, request))
+                    batch_result.orders[order_id] = order
+                case Success(Maybe.empty):
+                    batch_result.errors[order_id] = BatchError(
+                        status=status.HTTP_404_NOT_FOUND, detail="Order not found"
+                    )
+                case failure:
+                    batch_result.errors[order_id] = self.batch_item_error(
+                        order_id, failure, "Error finding Order"
+                    )
+        return batch_result
+
+    async def get_order_statuses_batch(
+        self, batch: OrdersBatchRequest, request: Request, limit: int = 10
+    ) -> OrderStatusesBatch:
+        """
+        Get the first page of statuses for every order in `batch.ids`.
+        """
+        order_ids = self.batch_ids(batch)
+        results = await gather_bounded(
+            order_ids,
+            lambda order_id: self.call_backend(
+                "get_order_statuses",
+                self._get_order_statuses,
+                order_id,
+                None,
+                limit,
+                request,
+            ),
+            self.batch_concurrency,
+        )
+
+        batch_result = OrderStatusesBatch()
+        for order_id, result in zip(order_ids, results):
+            match result:
+                case Success(Some((statuses, maybe_pagination_token))):
+                    batch_result.statuses[order_id] = self.batch_order_statuses(
+                        request, order_id, statuses, maybe_pagination_token, limit
+                    )
+                case Success(Maybe.empty):
+                    batch_result.errors[order_id] = BatchError(
+                        status=status.HTTP_404_NOT_FOUND, detail="Order not found"
+                    )
+                case failure:
+                    batch_result.errors[order_id] = self.batch_item_error(
+                        order_id, failure, "Error finding Order Statuses"
+                    )
+        return batch_result
+
+    def batch_ids(self, batch: OrdersBatchRequest) -> list[str]:
+        # dict.fromkeys drops duplicate IDs while keeping the requested order
+        order_ids = list(dict.fromkeys(batch.ids))
+        if len(order_ids) > self.batch_max_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {self.batch_max_ids} ids may be requested at once",
+            )
+        return order_ids
+
+    def batch_item_error(
+        self, order_id: str, result: ResultE, detail: str
+    ) -> BatchError:
+        match result:
+            case Failure(StapiException() as e):
+                return BatchError.from_exception(e)
+            case Failure(e):
+                logger.error(
+                    "An error occurred while retrieving order '%s': %s",
+                    order_id,
+                    traceback.format_exception(e),
+                )
+            case x:
+                logger.error("Unexpected result for order '%s': %s", order_id, x)
+        return BatchError(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=detail,
+        )
+
+    def batch_order_statuses(
+        self,
+        request: Request,
+        order_id: str,
+        statuses: list[OrderStatus],
+        maybe_pagination_token: Maybe[str],
+        limit: int,
+    ) -> OrderStatuses:
+        links = [self.order_statuses_link(request, order_id)]
+        match maybe_pagination_token:
+            case Some(x):
+                links.append(
+                    Link(
+                        href=str(
+                            self.generate_order_statuses_href(
+                                request, order_id
+                            ).include_query_params(
+                                next=self.pagination_token(x), limit=limit
+                            )
+                        ),
+                        rel="next",
+                        type=TYPE_JSON,
+                    )
+                )
+            case Maybe.empty:
+                pass
+        return OrderStatuses(statuses=statuses, links=links)
+
+    async def get_order_events(
+        self,
+        order_id: str,
+        request: Request,
+        last_event_id: int | None = Depends(get_last_event_id),
+    ) -> EventSourceResponse:
+        """
+        Stream status changes of the order with `order_id`. Without a
+        `Last-Event-ID` header the buffered history of the order is sent first.
+        With a status poller, the order is polled until its status is final, e.g.
+        when it was created by another process.
+        """
+        # checks that the order exists and is accessible, and records its status
+        await self.get_order(
+            order_id, request, fields=None, geometry_output=GeometryOutput()
+        )
+        self.watch_order(order_id, request)
+        return EventSourceResponse(
+            self.stream_events(
+                order_topic(order_id),
+                last_event_id if last_event_id is not None else 0,
+                lambda event: True,
+            )
+        )
+
+    async def get_events(
+        self,
+        request: Request,
+        last_event_id: int | None = Depends(get_last_event_id),
+    ) -> EventSourceResponse:
+        """
+        Stream status changes of every order and opportunity search of the caller's
+        tenant. Without a `Last-Event-ID` header only new changes are sent.
+        Callers without a tenant are refused.
+        """
+        tenant = self.tenant(request)
+        if tenant is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Events are only streamed to tenants",
+            )
+        return EventSourceResponse(
+            self.stream_events(
+                None,
+                last_event_id,
+                lambda event: event.tenant == tenant,
+            )
+        )
+
+    async def stream_events(
+        self,
+        topic: str | None,
+        last_event_id: int | None,
+        visible: Callable[[StatusEvent], bool],
+    ) -> AsyncIterator[str]:
+        """
+        Yield Server-Sent Events for `topic` (or every topic), replaying buffered
+        events newer than `last_event_id` before switching to live events.
+
+        Streams end after `event_stream_max_duration` seconds, or when the client
+        falls too far behind, so clients reconnect with `Last-Event-ID`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.event_stream_max_duration or float("inf"))
+        # subscribe before reading the history so no event falls in between
+        with self.notifications.subscribe(topic) as subscription:
+            if last_event_id is None:
+                last_event_id = self.notifications.last_event_id
+            for event in self.notifications.events_since(topic, last_event_id):
+                last_event_id = event.id
+                if visible(event):
+                    yield server_sent_event(event.id, event.event, event.data)
+
+            while (remaining := deadline - loop.time()) > 0:
+                live_event = await subscription.get(
+                    min(self.event_stream_heartbeat, remaining)
+                )
+                if subscription.overflowed:
+                    break
+                if live_event is None:
+                    yield ": keep-alive\n\n"
+                # events are delivered in order, skip those already replayed
+                elif live_event.id > last_event_id and visible(live_event):
+                    yield server_sent_event(
+                        live_event.id, live_event.event, live_event.data
+                    )
+
+    async def call_backend[**P, R](
+        self,
+        name: str,
+        fn: Callable[P, Awaitable[R]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> R:
+        """
+        Invoke the backend callable `fn`, registered under `name`, subject to the
+        router's admission control and timeouts.
+        """
+        return await self.invoke_backend(
+            name, self.backend_timeouts.get(name), fn, *args, **kwargs
+        )
+
+    async def invoke_backend[**P, R](
+        self,
+        name: str,
+        timeout: float | None,
+        fn: Callable[P, Awaitable[R]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> R:
+        """
+        Invoke the backend callable `fn` like `call_backend`, cancelling it after
+        `timeout` seconds.
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        with span("backend", backend=name) as backend_span:
+            try:
+                result = await self.admit(name, timeout, fn, *args, **kwargs)
+                outcome = backend_outcome(result)
+                return result
+            except BackendTimeoutException:
+                outcome = "timeout"
+                raise
+            except OverloadedException:
+                outcome = "shed"
+                raise
+            finally:
+                backend_span.set("outcome", outcome)
+                if self.metrics is not None:
+                    self.metrics.backend_duration.observe(
+                        time.perf_counter() - started, name, outcome
+                    )
+
+    async def admit[**P, R](
+        self,
+        name: str,
+        timeout: float | None,
+        fn: Callable[P, Awaitable[R]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> R:
+        if self.admission is None or (limiter := self.admission.limiter(name)) is None:
+            return await self.with_timeout(name, timeout, fn(*args, **kwargs))
+        async with limiter.slot():
+            return await self.with_timeout(name, timeout, fn(*args, **kwargs))
+
+    async def with_timeout[R](
+        self, name: str, timeout: float | None, call: Awaitable[R]
+    ) -> R:
+        deadline = asyncio.timeout(timeout)
+        try:
+            async with deadline:
+                return await call
+        except TimeoutError:
+            # only the deadline expiring is a timeout of the call itself
+            if not deadline.expired():
+                raise
+            self.backend_timeout_counts[name] += 1
+            logger.warning("Backend '%s' timed out after %ss", name, timeout)
+            raise BackendTimeoutException(name, timeout or 0) from None
+
+    async def register_callback(self, topic: str, callback_url: str | None) -> None:
+        if callback_url is not None and self.webhooks is not None:
+            await self.webhooks.outbox.register(topic, callback_url)
+
+    def tenant(self, request: Request) -> str | None:
+        return self.event_tenant(request) if self.event_tenant else None
+
+    def observe_order_status(
+        self, order_id: str, order_status: OrderStatus, request: Request
+    ) -> None:
+        self.notifications.publish_order_status(
+            order_id, order_status, self.tenant(request)
+        )
+
+    def observe_opportunity_search_status(
+        self, search_record: OpportunitySearchRecord, request: Request
+    ) -> None:
+        self.notifications.publish_opportunity_search_status(
+            search_record.id, search_record.status, self.tenant(request)
+        )
+        if (
+            search_record.status.status_code == OpportunitySearchStatusCode.completed
+            and (product_router := self.product_routers.get(search_record.product_id))
+        ):
+            product_router.remember_completed_search(
+                search_record.opportunity_request, search_record, request
+            )
+
+    def run_for_lifespan(self, *workers: WebhookDispatcher | StatusPoller) -> None:
+        """
+        Run `workers` for the lifespan of applications including the router.
+        """
+        if not workers:
+            return
+        lifespan = self.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan_with_workers(app: Any) -> AsyncIterator[Any]:
+            async with AsyncExitStack() as stack:
+                for worker in workers:
+                    await stack.enter_async_context(worker.running())
+                yield await stack.enter_async_context(lifespan(app))
+
+        self.lifespan_context = lifespan_with_workers
+
+    def watch_order(self, order_id: str, request: Request) -> None:
+        """
+        Poll the status of an order created or streamed with `request` until it
+        is final, if the router has a status poller.
+        """
+        if self.status_poller is not None:
+            self.status_poller.watch(
+                order_topic(order_id),
+                lambda: self.check_order_status(order_id, request),
+            )
+
+    async def check_order_status(self, order_id: str, request: Request) -> bool:
+        match await self.call_backend("get_order", self._get_order, order_id, request):
+            case Success(Some(order)):
+                order_status = order.properties.status
+                self.observe_order_status(order_id, order_status, request)
+                return order_status.status_code in FINAL_ORDER_STATUS_CODES
+            case Success(Maybe.empty):
+                return True
+            case Failure(e):
+                raise e
+            case _:
+                raise AssertionError("Expected code to be unreachable")
+
+    def watch_opportunity_search(self, search_record_id: str, request: Request) -> None:
+        """
+        Poll the status of an opportunity search started with `request` until it
+        is final, if the router has a status poller.
+        """
+        if self.status_poller is not None:
+            self.status_poller.watch(
+                opportunity_search_record_topic(search_record_id),
+                lambda: self.check_opportunity_search_status(search_record_id, request),
+            )
+
+    async def check_opportunity_search_status(
+        self, search_record_id: str, request: Request
+    ) -> bool:
+        match await self.call_backend(
+            "get_opportunity_search_record",
+            self._get_opportunity_search_record,
+            search_record_id,
+            request,
+        ):
+            case Success(Some(search_record)):
+                self.observe_opportunity_search_status(search_record, request)
+                return (
+                    search_record.status.status_code
+                    in FINAL_OPPORTUNITY_SEARCH_STATUS_CODES
+                )
+            case Success(Maybe.empty):
+                return True
+            case Failure(e):
+                raise e
+            case _:
+                raise AssertionError("Expected code to be unreachable")
+
     def add_product(self, product: Product, *args, **kwargs) -> None:
-        # Give the include a prefix from the product router
+        """
+        Add a product, replacing any product with the same id.
+
+        Products dispatched to (with `dispatch_products` or `lazy_products`) can
+        be added and removed on a running application, at a cost independent of
+        the number of products. Otherwise the routes of the product are added to
+        the root router, which applications copy when including it, so products
+        must be added and replaced before.
+        """
+        if not self.dispatch_products:
+            kwargs = self._included_router_kwargs(product.id, kwargs)
         product_router = ProductRouter(product, self, *args, **kwargs)
-        self.include_router(product_router, prefix=f"/products/{product.id}")
-        self.product_routers[product.id] = product_router
-        self.product_ids = [*self.product_routers.keys()]
+        with self._products_lock:
+            replace = product.id in self.product_routers
+            if not self.dispatch_products:
+                # the routes of a replaced product would be matched first
+                if replace:
+                    self._remove_product_routes(product.id)
+                self.routes.extend(product_router.routes)
+            if not replace:
+                self.product_ids.append(product.id)
+            self.product_routers[product.id] = product_router
+            if self.openapi_cache is not None:
+                self.openapi_cache.add_product(product.id, replace)
+
+    def _remove_product_routes(self, product_id: str) -> None:
+        self.routes = [
+            route
+            for route in self.routes
+            if not (getattr(route, "name", None) or "").startswith(
+                f"{self.name}:{product_id}:"
+            )
+        ]
+
+    def _included_router_kwargs(
+        self, product_id: str, kwargs: dict[str, Any]
+    ) -> dict[str, Any]:
+        """
+        Arguments of a product router building its routes as `include_router`
+        would copy them into this router, with the product's prefix and the
+        settings of both routers. The routes can then be added as they are,
+        rather than parametrizing the models of every route once more to copy
+        them.
+        """
+        return {
+            **kwargs,
+            "prefix": f"/products/{product_id}{kwargs.get('prefix', '')}",
+            "tags": [*self.tags, *(kwargs.get("tags") or [])],
+            "dependencies": [*self.dependencies, *(kwargs.get("dependencies") or [])],
+            "responses": {**self.responses, **(kwargs.get("responses") or {})},
+            "callbacks": [*self.callbacks, *(kwargs.get("callbacks") or [])],
+            "deprecated": kwargs.get("deprecated") or self.deprecated,
+            "include_in_schema": self.include_in_schema
+            and kwargs.get("include_in_schema", True),
+            "default_response_class": kwargs.get(
+                "default_response_class", self.default_response_class
+            ),
+            "generate_unique_id_function": kwargs.get(
+                "generate_unique_id_function", self.generate_unique_id_function
+            ),
+        }
+
+    def remove_product(self, product_id: str) -> None:
+        """
+        Remove a product. Requests to the product being handled complete, later
+        ones are not found.
+
+        Without `dispatch_products` or `lazy_products`, applications that already
+        included the router keep serving the routes of the product they copied,
+        while the product is no longer listed or documented. Products can then
+        only be removed before the router is included.
+        """
+        with self._products_lock:
+            if product_id not in self.product_routers:
+                raise ValueError(f"Unknown product '{product_id}'")
+            self.product_ids = [x for x in self.product_ids if x != product_id]
+            del self.product_routers[product_id]
+            if not self.dispatch_products:
+                self._remove_product_routes(product_id)
+            if self.openapi_cache is not None:
+                self.openapi_cache.remove_product(product_id)
+
+    def generate_product_href(
+        self, request: Request, product_id: str, name: str, **path_params: Any
+    ) -> URL:
+        if self.dispatch_products:
+            return request.url_for(
+                f"{self.name}:{PRODUCT_ROUTES}",
+                product_id=product_id,
+                path=PRODUCT_ROUTE_PATHS[name].format(**path_params),
+            )
+        return request.url_for(f"{self.name}:{product_id}:{name}", **path_params)
 
     def generate_order_href(self, request: Request, order_id: str) -> URL:
         return request.url_for(f"{self.name}:{GET_ORDER}", order_id=order_id)
@@ -370,10 +1255,33 @@ class RootRouter(APIRouter):
             type=TYPE_JSON,
         )
 
+    def pagination_token(self, position: str) -> str:
+        """
+        The `next` token handed to clients for a backend's page position, signed if
+        the router has a `pagination_secret`.
+        """
+        if self.cursor_signer is None:
+            return position
+        return self.cursor_signer.sign(position)
+
+    def pagination_position(self, next: str | None) -> str | None:
+        """
+        The backend's page position of a `next` token from a client, rejecting
+        tokens this router didn't sign.
+        """
+        if not next or self.cursor_signer is None:
+            return next
+        try:
+            return self.cursor_signer.unsign(next)
+        except InvalidCursorError:
+            raise NotFoundException(detail="Error finding pagination token") from None
+
     def pagination_link(self, request: Request, pagination_token: str, limit: int):
         return Link(
             href=str(
-                request.url.include_query_params(next=pagination_token, limit=limit)
+                request.url.include_query_params(
+                    next=self.pagination_token(pagination_token), limit=limit
+                )
             ),
             rel="next",
             type=TYPE_JSON,
@@ -383,17 +1291,26 @@ class RootRouter(APIRouter):
         self, request: Request, next: str | None = None, limit: int = 10
     ) -> OpportunitySearchRecords:
         links: list[Link] = []
-        match await self._get_opportunity_search_records(next, limit, request):
+        match await self.call_backend(
+            "get_opportunity_search_records",
+            self._get_opportunity_search_records,
+            self.pagination_position(next),
+            limit,
+            request,
+        ):
             case Success((records, maybe_pagination_token)):
+                with span("links", count=len(records)):
+                    for record in records:
+                        record.links.append(
+                            self.opportunity_search_record_self_link(record, request)
+                        )
+                    match maybe_pagination_token:
+                        case Some(x):
+                            links.append(self.pagination_link(request, x, limit))
+                        case Maybe.empty:
+                            pass
                 for record in records:
-                    record.links.append(
-                        self.opportunity_search_record_self_link(record, request)
-                    )
-                match maybe_pagination_token:
-                    case Some(x):
-                        links.append(self.pagination_link(request, x, limit))
-                    case Maybe.empty:
-                        pass
+                    self.observe_opportunity_search_status(record, request)
             case Failure(ValueError()):
                 raise NotFoundException(detail="Error finding pagination token")
             case Failure(e):
@@ -410,16 +1327,32 @@ class RootRouter(APIRouter):
         return OpportunitySearchRecords(search_records=records, links=links)
 
     async def get_opportunity_search_record(
-        self, search_record_id: str, request: Request
+        self,
+        search_record_id: str,
+        request: Request,
+        response: Response,
+        wait: Wait | None = Depends(get_wait),
     ) -> OpportunitySearchRecord:
         """
         Get the Opportunity Search Record with `search_record_id`.
         """
-        match await self._get_opportunity_search_record(search_record_id, request):
+        match await self.long_poll(
+            opportunity_search_record_topic(search_record_id),
+            wait,
+            response,
+            lambda: self.call_backend(
+                "get_opportunity_search_record",
+                self._get_opportunity_search_record,
+                search_record_id,
+                request,
+            ),
+            opportunity_search_record_state,
+        ):
             case Success(Some(search_record)):
                 search_record.links.append(
                     self.opportunity_search_record_self_link(search_record, request)
                 )
+                self.observe_opportunity_search_status(search_record, request)
                 return search_record
             case Success(Maybe.empty):
                 raise NotFoundException("Opportunity Search Record not found")
@@ -436,6 +1369,84 @@ class RootRouter(APIRouter):
             case _:
                 raise AssertionError("Expected code to be unreachable")
 
+    async def long_poll[R](
+        self,
+        topic: str,
+        wait: Wait | None,
+        response: Response,
+        fetch: Callable[[], Awaitable[R]],
+        state: Callable[[R], object],
+        recheck_intervals: Iterator[float] | None = None,
+    ) -> R:
+        """
+        Call `fetch` and, if a wait was requested, keep re-fetching until the `state`
+        of the result differs from the initial one or the wait expires.
+
+        Re-fetching happens when something is published to `topic` on the
+        notification bus, and additionally after each of `recheck_intervals`, by
+        default every `long_poll_recheck_interval` seconds, for backends that don't
+        publish. A `state` of `None` marks a result that won't change anymore, such
+        as an error or a final status, and is returned at once.
+        """
+        if wait is None:
+            return await fetch()
+
+        seconds = min(wait.seconds, self.long_poll_max_wait)
+        if wait.preferred:
+            response.headers["Preference-Applied"] = f"wait={seconds:g}"
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        # listen before the first fetch so a change published in between isn't missed
+        with self.notifications.listen(topic) as listener:
+            result = await fetch()
+            initial_state = state(result)
+            while initial_state is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                recheck_interval = (
+                    self.long_poll_recheck_interval
+                    if recheck_intervals is None
+                    else next(recheck_intervals)
+                )
+                if recheck_interval is not None:
+                    remaining = min(remaining, recheck_interval)
+                await listener.wait(remaining)
+                result = await fetch()
+                if state(result) != initial_state:
+                    break
+        return result
+
+    async def wait_for_opportunity_search(
+        self, search_record_id: str, request: Request, response: Response
+    ) -> ResultE[Maybe[OpportunitySearchRecord]]:
+        """
+        Fetch the Opportunity Search Record with `search_record_id`, waiting up to
+        `search_wait_budget` seconds for the search to reach a final status.
+
+        Backends rarely publish the completion of searches, and the client waits
+        for the response, so the record is re-fetched after
+        `search_wait_recheck_interval` seconds, then at intervals doubling up to
+        `search_wait_max_recheck_interval` seconds.
+        """
+        return await self.long_poll(
+            opportunity_search_record_topic(search_record_id),
+            Wait(self.search_wait_budget or 0, preferred=False),
+            response,
+            lambda: self.call_backend(
+                "get_opportunity_search_record",
+                self._get_opportunity_search_record,
+                search_record_id,
+                request,
+            ),
+            opportunity_search_completion_state,
+            backoff(
+                self.search_wait_recheck_interval,
+                self.search_wait_max_recheck_interval,
+            ),
+        )
+
     def generate_opportunity_search_record_href(
         self, request: Request, search_record_id: str
     ) -> URL:
@@ -1,6 +1,8 @@
 # Root
 ROOT = "root"
 CONFORMANCE = "conformance"
+LIST_EVENTS = "list-events"
+METRICS = "metrics"
 
 # Product
 LIST_PRODUCTS = "list-products"
@@ -8,6 +10,7 @@ LIST_PRODUCTS = "list-products"
 GET_PRODUCT = "get-product"
 GET_CONSTRAINTS = "get-constraints"
 GET_ORDER_PARAMETERS = "get-order-parameters"
+PRODUCT_ROUTES = "product-routes"
 
 # Opportunity
 LIST_OPPORTUNITY_SEARCH_RECORDS = "list-opportunity-search-records"
@@ -19,4 +22,8 @@ GET_OPPORTUNITY_COLLECTION = "get-opportunity-collection"
 LIST_ORDERS = "list-orders"
 GET_ORDER = "get-order"
 LIST_ORDER_STATUSES = "list-order-statuses"
+GET_ORDERS_BATCH = "get-orders-batch"
+LIST_ORDER_STATUSES_BATCH = "list-order-statuses-batch"
+LIST_ORDER_EVENTS = "list-order-events"
 CREATE_ORDER = "create-order"
+CREATE_ORDERS_BULK = "create-orders-bulk"
@@ -0,0 +1,247 @@
+import time
+from collections import OrderedDict, defaultdict
+from datetime import UTC, datetime
+from typing import Any
+
+from stapi_fastapi.geometry import BBox, bbox, bbox_contains, contains, intersects
+from stapi_fastapi.idempotency import fingerprint
+from stapi_fastapi.models.opportunity import (
+    Opportunity,
+    OpportunityPayload,
+    OpportunitySearchRecord,
+)
+
+# coordinates are compared at ~1cm precision so float noise doesn't defeat the cache
+COORDINATE_DECIMALS = 7
+
+
+def _round_coordinates(coordinates: Any) -> Any:
+    if isinstance(coordinates, float | int):
+        return round(float(coordinates), COORDINATE_DECIMALS)
+    return [_round_coordinates(x) for x in coordinates]
+
+
+def _signed_area(ring: list[list[float]]) -> float:
+    return sum(x0 * y1 - x1 * y0 for (x0, y0, *_), (x1, y1, *_) in zip(ring, ring[1:]))
+
+
+def _normalize_ring(ring: list[list[float]], counterclockwise: bool) -> list[Any]:
+    # drop the closing vertex, start at the smallest vertex and re-close the ring
+    vertices = ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring
+    if not vertices:
+        return ring
+    if (_signed_area([*vertices, vertices[0]]) > 0) != counterclockwise:
+        vertices = vertices[::-1]
+    start = vertices.index(min(vertices))
+    vertices = vertices[start:] + vertices[:start]
+    return [*vertices, vertices[0]]
+
+
+def _normalize_polygon(rings: list[list[list[float]]]) -> list[Any]:
+    # RFC 7946: exterior rings are counterclockwise, holes clockwise
+    return [_normalize_ring(ring, index == 0) for index, ring in enumerate(rings)]
+
+
+def normalize_geometry(geometry: dict[str, Any]) -> dict[str, Any]:
+    """
+    Canonical form of a GeoJSON geometry: rounded coordinates, no `bbox`, and
+    polygon rings with a fixed orientation and starting vertex.
+    """
+    match geometry:
+        case {"type": "GeometryCollection", "geometries": geometries}:
+            return {
+                "type": "GeometryCollection",
+                "geometries": [normalize_geometry(g) for g in geometries],
+            }
+        case {"type": "Polygon", "coordinates": coordinates}:
+            coordinates = _normalize_polygon(_round_coordinates(coordinates))
+        case {"type": "MultiPolygon", "coordinates": coordinates}:
+            coordinates = [
+                _normalize_polygon(polygon)
+                for polygon in _round_coordinates(coordinates)
+            ]
+        case {"coordinates": coordinates}:
+            coordinates = _round_coordinates(coordinates)
+        case _:
+            return geometry
+    return {"type": geometry["type"], "coordinates": coordinates}
+
+
+def canonical_search(search: OpportunityPayload) -> dict[str, Any]:
+    """
+    The parts of an opportunity search that determine its results, in a canonical
+    form: normalized geometry and the interval in UTC. The filter's keys are sorted
+    when it is hashed.
+    """
+    start, end = search.datetime
+    return {
+        "geometry": normalize_geometry(search.geometry.model_dump(mode="json")),
+        "datetime": [
+            start.astimezone(UTC).isoformat(),
+            end.astimezone(UTC).isoformat(),
+        ],
+        "filter": search.filter or None,
+    }
+
+
+def search_key(*parts: Any, search: OpportunityPayload) -> str:
+    """
+    Cache key of `search`, scoped by `parts` such as the product and the caller.
+    """
+    return fingerprint(*parts, canonical_search(search))
+
+
+class SearchCache:
+    """
+    Process-local cache of opportunity search results with a TTL per entry, evicting
+    the least recently used entries beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        match self._entries.get(key):
+            case (expires_at, value) if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return value
+            case (_, _):
+                del self._entries[key]
+        return None
+
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+def opportunities_within(
+    opportunities: list[Opportunity], search: OpportunityPayload
+) -> list[Opportunity]:
+    """
+    The opportunities of a completed search that answer `search`, a search within
+    its area and interval: those intersecting the area of `search`, with their
+    windows clipped to its interval.
+    """
+    start, end = search.datetime
+    geometry = search.geometry.model_dump(mode="json")
+    result = []
+    for opportunity in opportunities:
+        if opportunity.properties is None:
+            continue
+        window_start, window_end = opportunity.properties.datetime
+        if window_end < start or end < window_start:
+            continue
+        if opportunity.geometry is not None and not intersects(
+            opportunity.geometry.model_dump(mode="json"), geometry
+        ):
+            continue
+        properties = opportunity.properties.model_copy(
+            update={"datetime": (max(window_start, start), min(window_end, end))}
+        )
+        result.append(opportunity.model_copy(update={"properties": properties}))
+    return result
+
+
+class CompletedSearch:
+    """
+    A completed opportunity search and its result: either all its opportunities, or
+    the search record of an asynchronous search whose opportunities have yet to be
+    fetched.
+    """
+
+    def __init__(
+        self,
+        search: OpportunityPayload,
+        result: list[Opportunity] | OpportunitySearchRecord,
+        expires_at: float,
+    ) -> None:
+        self.search = search
+        self.result = result
+        self.expires_at = expires_at
+        self.geometry = search.geometry.model_dump(mode="json")
+        self.bbox = bbox(self.geometry)
+        self.start, self.end = search.datetime
+
+    def covers(self, geometry: dict[str, Any], start: datetime, end: datetime) -> bool:
+        return (
+            self.start <= start
+            and end <= self.end
+            and contains(self.geometry, geometry)
+        )
+
+
+class CompletedSearchIndex:
+    """
+    Completed opportunity searches by scope (e.g. product, caller and filter),
+    indexed by the bounding box and interval of their search, so that a search
+    within the area and interval of a completed one can be answered from its
+    opportunities. Entries expire after their TTL and the least recently used
+    entries beyond `max_entries`, or beyond `max_entries_per_scope` in a scope,
+    are evicted.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, max_entries_per_scope: int = 64
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_entries_per_scope = max_entries_per_scope
+        self._entries: OrderedDict[str, tuple[str, CompletedSearch]] = OrderedDict()
+        self._scopes: defaultdict[str, dict[str, BBox | None]] = defaultdict(dict)
+
+    def add(
+        self,
+        scope: str,
+        search: OpportunityPayload,
+        result: list[Opportunity] | OpportunitySearchRecord,
+        ttl: float,
+    ) -> None:
+        completed = CompletedSearch(search, result, time.monotonic() + ttl)
+        key = search_key(scope, search=search)
+        self._entries[key] = (scope, completed)
+        self._entries.move_to_end(key)
+        scope_entries = self._scopes[scope]
+        scope_entries.pop(key, None)
+        scope_entries[key] = completed.bbox
+        if len(scope_entries) > self.max_entries_per_scope:
+            oldest = next(iter(scope_entries))
+            self._delete(oldest, self._entries.pop(oldest))
+        while len(self._entries) > self.max_entries:
+            self._delete(*self._entries.popitem(last=False))
+
+    def find(self, scope: str, search: OpportunityPayload) -> CompletedSearch | None:
+        """
+        A completed search in `scope` whose area and interval contain those of
+        `search`. The bounding boxes of the scope are scanned in turn, which the
+        `max_entries_per_scope` limit keeps cheap.
+        """
+        geometry = search.geometry.model_dump(mode="json")
+        if (window := bbox(geometry)) is None:
+            return None
+        start, end = search.datetime
+        now = time.monotonic()
+        for key, completed_bbox in list(self._scopes.get(scope, {}).items()):
+            if completed_bbox is None or not bbox_contains(completed_bbox, window):
+                continue
+            entry = self._entries[key]
+            _, completed = entry
+            if completed.expires_at <= now:
+                del self._entries[key]
+                self._delete(key, entry)
+            elif completed.covers(geometry, start, end):
+                self._entries.move_to_end(key)
+                scope_entries = self._scopes[scope]
+                scope_entries[key] = scope_entries.pop(key)
+                return completed
+        return None
+
+    def _delete(self, key: str, entry: tuple[str, CompletedSearch]) -> None:
+        scope, _ = entry
+        self._scopes[scope].pop(key, None)
+        if not self._scopes[scope]:
+            del self._scopes[scope]
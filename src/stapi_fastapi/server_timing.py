@@ -0,0 +1,99 @@
+import time
+from collections import defaultdict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from stapi_fastapi.timing import RequestTiming, request_timing
+from stapi_fastapi.tracing import Span, Tracer, current_span, listen
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+def _discard(span: Span) -> None:
+    pass
+
+
+class ServerTimings:
+    """
+    Durations of the phases of a request by Server-Timing metric name, summed
+    over the spans of the same name. Backend calls are named after their
+    callable, e.g. `backend-get_orders`; concurrent calls of a callable may sum
+    to more than the time of the request.
+    """
+
+    def __init__(self) -> None:
+        self.durations: defaultdict[str, float] = defaultdict(float)
+
+    def __call__(self, span: Span) -> None:
+        name = span.name
+        if name == "backend":
+            name = f"backend-{span.attributes['backend']}"
+        self.durations[name] += span.duration
+
+    def add_phases(self, timing: RequestTiming) -> None:
+        if timing.handler_started is not None and timing.endpoint_started is not None:
+            self.durations["validation"] += (
+                timing.endpoint_started - timing.handler_started
+            )
+        if timing.endpoint_returned is not None and timing.handler_returned is not None:
+            self.durations["serialization"] += (
+                timing.handler_returned - timing.endpoint_returned
+            )
+
+    def header(self) -> str:
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}"
+            for name, seconds in self.durations.items()
+        )
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding a `Server-Timing` header to responses, with the time
+    of backend calls by callable, upstream HTTP calls, link generation, request
+    validation and response serialization, and the `total` time until the
+    response started, in milliseconds.
+
+    The durations are those of the spans recorded while handling the request,
+    so they are reported whether or not requests are traced by a
+    `TracingMiddleware`. The validation and serialization times are measured by
+    the routers' `TimedRoute`s.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        # a trace of the request in which spans are recorded when it isn't
+        # already traced
+        self.tracer = Tracer(_discard)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timing = request_timing(scope)
+        timings = ServerTimings()
+
+        async def send_timed(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                timings.add_phases(timing)
+                timings.durations["total"] = time.perf_counter() - started
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (
+                            SERVER_TIMING_HEADER.lower().encode(),
+                            timings.header().encode(),
+                        ),
+                    ],
+                }
+            await send(message)
+
+        with listen(timings):
+            if current_span() is not None:
+                await self.app(scope, receive, send_timed)
+                return
+            with self.tracer.trace("request"):
+                await self.app(scope, receive, send_timed)
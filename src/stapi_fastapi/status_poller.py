@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+type StatusCheck = Callable[[], Awaitable[bool]]
+"""
+Fetches the status of a topic, e.g. an order, from the backend and publishes it.
+
+Returns:
+    Whether the status is final, i.e. the topic doesn't need to be polled again.
+    Exceptions are counted as failed checks.
+"""
+
+
+class _Watched:
+    __slots__ = ("check", "since", "failures")
+
+    def __init__(self, check: StatusCheck) -> None:
+        self.check = check
+        self.since = time.monotonic()
+        self.failures = 0
+
+
+class StatusPoller:
+    """
+    Polls the statuses of watched topics every `interval` seconds, so their
+    changes are published to the `NotificationBus` — waking long-polls and event
+    streams and triggering webhooks — whether or not clients poll them.
+
+    The `RootRouter` watches the orders and opportunity searches created through
+    it until their status is final, checking them with the request that created
+    them, so backends are called with its credentials and state. Topics are
+    dropped after `max_age` seconds or `max_failures` failed checks in a row, and
+    the oldest once more than `max_watched` are watched. At most `concurrency`
+    checks run at once. Topics are watched by the process that created them, so
+    they are no longer polled when it exits.
+
+    Pass the poller to `RootRouter(status_poller=...)`, which polls for the
+    lifespan of the application.
+    """
+
+    def __init__(
+        self,
+        interval: float = 30,
+        concurrency: int = 4,
+        max_watched: int = 10_000,
+        max_age: float = 7 * 24 * 60 * 60,
+        max_failures: int = 10,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("The interval must be positive")
+        self.interval = interval
+        self.concurrency = concurrency
+        self.max_watched = max_watched
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self._watched: OrderedDict[str, _Watched] = OrderedDict()
+
+    @property
+    def watched(self) -> list[str]:
+        return list(self._watched)
+
+    def watch(self, topic: str, check: StatusCheck) -> None:
+        """
+        Poll `topic` with `check` until it returns True. Watching a topic again
+        replaces its check, keeping when it was first watched.
+        """
+        watched = self._watched.get(topic)
+        if watched is not None:
+            watched.check = check
+            return
+        self._watched[topic] = _Watched(check)
+        if len(self._watched) > self.max_watched:
+            self._watched.popitem(last=False)
+
+    def unwatch(self, topic: str) -> None:
+        self._watched.pop(topic, None)
+
+    async def poll(self) -> None:
+        """
+        Check every watched topic once.
+        """
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+        now = time.monotonic()
+
+        async def check(topic: str, watched: _Watched) -> None:
+            if now - watched.since > self.max_age:
+                self._drop(topic, watched)
+                return
+            async with semaphore:
+                try:
+                    final = await watched.check()
+                except Exception:
+                    logger.exception("Error polling the status of %s", topic)
+                    watched.failures += 1
+                    if watched.failures >= self.max_failures:
+                        self._drop(topic, watched)
+                    return
+            watched.failures = 0
+            if final:
+                self._drop(topic, watched)
+
+        await asyncio.gather(*(check(*item) for item in list(self._watched.items())))
+
+    def _drop(self, topic: str, watched: _Watched) -> None:
+        # unless watched again meanwhile
+        if self._watched.get(topic) is watched:
+            del self._watched[topic]
+
+    @asynccontextmanager
+    async def running(self) -> AsyncIterator[None]:
+        async def run() -> None:
+            while True:
+                await asyncio.sleep(self.interval)
+                await self.poll()
+
+        task = asyncio.create_task(run())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from collections.abc import Callable, Coroutine
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.types import Scope
+
+TIMING_SCOPE_KEY = "stapi.timing"
+
+
+class RequestTiming:
+    """
+    `time.perf_counter` readings of the phases of a request handled by a
+    `TimedRoute`: the route handler starting, the endpoint starting once the
+    request is parsed and validated, the endpoint returning, and the route
+    handler returning once the result is serialized. Readings are `None` when
+    the phase wasn't reached.
+    """
+
+    __slots__ = (
+        "handler_started",
+        "endpoint_started",
+        "endpoint_returned",
+        "handler_returned",
+    )
+
+    def __init__(self) -> None:
+        self.handler_started: float | None = None
+        self.endpoint_started: float | None = None
+        self.endpoint_returned: float | None = None
+        self.handler_returned: float | None = None
+
+
+def request_timing(scope: Scope) -> RequestTiming:
+    """
+    The timing of the request of `scope`, shared by the middlewares measuring it
+    and the route handling it. It is kept in the scope, which the routes
+    handling the request receive, or a copy of.
+    """
+    timing = scope.get(TIMING_SCOPE_KEY)
+    if timing is None:
+        timing = scope[TIMING_SCOPE_KEY] = RequestTiming()
+    return timing
+
+
+_request_timing: ContextVar[RequestTiming | None] = ContextVar(
+    "request_timing", default=None
+)
+
+
+def _timed(call: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap the endpoint `call` to note when it starts and returns.
+    """
+    if asyncio.iscoroutinefunction(call):
+
+        @wraps(call)
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            timing = _request_timing.get()
+            if timing is not None:
+                timing.endpoint_started = time.perf_counter()
+            result = await call(*args, **kwargs)
+            if timing is not None:
+                timing.endpoint_returned = time.perf_counter()
+            return result
+
+        return timed
+
+    @wraps(call)
+    def timed_sync(*args: Any, **kwargs: Any) -> Any:
+        timing = _request_timing.get()
+        if timing is not None:
+            timing.endpoint_started = time.perf_counter()
+        result = call(*args, **kwargs)
+        if timing is not None:
+            timing.endpoint_returned = time.perf_counter()
+        return result
+
+    return timed_sync
+
+
+class TimedRoute(APIRoute):
+    """
+    Route noting when its endpoint starts and returns into the `RequestTiming`
+    of requests, so the time validating requests and serializing results is
+    told apart from the time producing them.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        if self.dependant.call is not None:
+            self.dependant.call = _timed(self.dependant.call)
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            timing = request.scope.get(TIMING_SCOPE_KEY)
+            if timing is None:
+                return await handler(request)
+            timing.handler_started = time.perf_counter()
+            token = _request_timing.set(timing)
+            try:
+                return await handler(request)
+            finally:
+                timing.handler_returned = time.perf_counter()
+                _request_timing.reset(token)
+
+        return timed_handler
@@ -0,0 +1,300 @@
+import json
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from stapi_fastapi.metrics import route_label
+from stapi_fastapi.timing import RequestTiming, request_timing
+
+
+class Span:
+    """
+    A timed operation of a trace. `start` is the time it started, in seconds since
+    the epoch, and `duration` how long it took, in seconds. `status` is "ok", or
+    "error" if it ended with an exception.
+    """
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "duration",
+        "status",
+        "attributes",
+        "_started",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer | None",
+        name: str,
+        trace_id: str,
+        parent_id: str | None,
+        started: float,
+        attributes: dict[str, Any],
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = time.time() - (time.perf_counter() - started)
+        self.duration = 0.0
+        self.status = "ok"
+        self.attributes = attributes
+        self._started = started
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoSpan(Span):
+    """
+    Stands in for spans outside of traces, discarding attributes.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(None, "", "", None, time.perf_counter(), {})
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+type SpanExporter = Callable[[Span], None]
+"""
+Type alias for a callable receiving each span as it ends, children before their
+parents. It is called on the event loop, or in the threads of blocking code
+running in spans, so it shouldn't block for long.
+
+Args:
+    span (Span): The span that ended.
+"""
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_span_listeners: ContextVar[tuple[SpanExporter, ...]] = ContextVar(
+    "span_listeners", default=()
+)
+
+
+class Tracer:
+    """
+    Records the spans of traces and passes them to `exporter` as they end.
+    """
+
+    def __init__(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        A span in the current trace, or the root span of a new trace if there is
+        none.
+        """
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else None
+        with _span(self, name, trace_id, parent, attributes) as span:
+            yield span
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        The root span of a new trace, e.g. of a request, even within another
+        trace.
+        """
+        with _span(self, name, None, None, attributes) as span:
+            yield span
+
+    def record(
+        self,
+        name: str,
+        parent: Span,
+        started: float,
+        ended: float,
+        **attributes: Any,
+    ) -> Span:
+        """
+        Export a span of `parent` measured after the fact, between the
+        `time.perf_counter` readings `started` and `ended`.
+        """
+        span = Span(self, name, parent.trace_id, parent.span_id, started, attributes)
+        span.duration = ended - started
+        self.exporter(span)
+        return span
+
+
+@contextmanager
+def _span(
+    tracer: Tracer,
+    name: str,
+    trace_id: str | None,
+    parent: Span | None,
+    attributes: dict[str, Any],
+) -> Iterator[Span]:
+    span = Span(
+        tracer,
+        name,
+        trace_id or f"{random.getrandbits(128):032x}",
+        parent.span_id if parent is not None else None,
+        time.perf_counter(),
+        attributes,
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attributes["exception"] = type(e).__name__
+        raise
+    finally:
+        span.duration = time.perf_counter() - span._started
+        _current_span.reset(token)
+        tracer.exporter(span)
+        for listener in _span_listeners.get():
+            listener(span)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    A span in the current trace, recorded by the tracer of the trace. Outside of
+    traces nothing is recorded, so code can be instrumented regardless of
+    whether tracing is enabled.
+    """
+    parent = _current_span.get()
+    if parent is None or parent.tracer is None:
+        yield NO_SPAN
+        return
+    with _span(parent.tracer, name, parent.trace_id, parent, attributes) as child:
+        yield child
+
+
+@contextmanager
+def listen(listener: SpanExporter) -> Iterator[None]:
+    """
+    Pass the spans ending in the current context to `listener` as well as to the
+    exporters of their tracers, e.g. to summarize the spans of a request.
+    """
+    token = _span_listeners.set((*_span_listeners.get(), listener))
+    try:
+        yield
+    finally:
+        _span_listeners.reset(token)
+
+
+class InMemoryExporter:
+    """
+    Keeps the spans exported, e.g. for tests. At most `max_spans` are kept,
+    dropping the oldest.
+    """
+
+    def __init__(self, max_spans: int | None = None) -> None:
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+
+    def __call__(self, span: Span) -> None:
+        self.spans.append(span)
+        if self.max_spans is not None and len(self.spans) > self.max_spans:
+            del self.spans[: len(self.spans) - self.max_spans]
+
+    def trace(self, trace_id: str) -> list[Span]:
+        return [x for x in self.spans if x.trace_id == trace_id]
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class JSONLinesExporter:
+    """
+    Appends the spans exported to the file at `path`, one JSON object per line.
+    Lines are written whole, so processes can share the file.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def __call__(self, span: Span) -> None:
+        line = json.dumps(span.as_dict(), separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware recording a root span for every request, with children for
+    the validation of the request and the serialization of the response by a
+    `TimedRoute`. The spans recorded while the endpoint runs, such as those of
+    backend calls, are children of the root span too.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = request_timing(scope)
+        method = scope["method"]
+        with self.tracer.trace(method, method=method, path=scope["path"]) as root:
+
+            async def send_traced(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set("status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                route = route_label(scope)
+                root.name = f"{method} {route}"
+                root.set("route", route)
+                self.record_phases(root, timing)
+
+    def record_phases(self, root: Span, timing: RequestTiming) -> None:
+        if timing.handler_started is None:
+            return
+        # requests failing validation never reach the endpoint
+        validated = timing.endpoint_started or timing.handler_returned
+        if validated is not None:
+            self.tracer.record("validation", root, timing.handler_started, validated)
+        if timing.endpoint_returned is not None and timing.handler_returned is not None:
+            self.tracer.record(
+                "serialization", root, timing.endpoint_returned, timing.handler_returned
+            )
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from collections.abc import Callable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from stapi_fastapi.metrics import LATENCY_BUCKETS, Histogram, Metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Blocked:
+    """
+    A callback of the event loop, e.g. a step of a task, running for longer than
+    the threshold of a watchdog, with the stack of the loop's thread while it
+    was running. The stack is None when the callback returned before the
+    watchdog could capture it.
+    """
+
+    __slots__ = ("started", "duration", "stack")
+
+    def __init__(
+        self, started: float, duration: float, stack: traceback.StackSummary | None
+    ) -> None:
+        self.started = started
+        self.duration = duration
+        self.stack = stack
+
+    def format(self) -> str:
+        stack = "".join(self.stack.format()) if self.stack else "  (not captured)\n"
+        return f"Event loop blocked for {self.duration:.3f}s:\n{stack}"
+
+
+type BlockedListener = Callable[[Blocked], None]
+"""
+Called in the thread of the event loop when the loop was blocked.
+"""
+
+
+class LoopWatchdog:
+    """
+    Measures the lag of an event loop, i.e. how late a task sleeping for
+    `interval` seconds is woken up, into the `lag` histogram, and captures the
+    stack of the loop's thread when a callback blocks it for more than
+    `threshold` seconds, e.g. a blocking HTTP call in an async backend.
+
+    A thread checks every `interval` seconds whether the sleeping task is
+    overdue, so a stack is captured while the blocking code still runs. The
+    last `max_blocked` blockings are kept in `blocked`, logged as warnings and
+    passed to `on_blocked`. Many short callbacks run back to back delay the
+    task as much as one long callback, so the threshold should be well above
+    the time of a request's longest step.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.01,
+        metrics: Metrics | None = None,
+        on_blocked: BlockedListener | None = None,
+        max_blocked: int = 100,
+    ) -> None:
+        if threshold <= 0 or interval <= 0:
+            raise ValueError("The threshold and interval must be positive")
+        self.threshold = threshold
+        self.interval = interval
+        self.on_blocked = on_blocked
+        self.blocked: deque[Blocked] = deque(maxlen=max_blocked)
+        self.lag = Histogram(
+            "stapi_event_loop_lag_seconds",
+            "Time tasks of the event loop are woken up late",
+            (),
+            LATENCY_BUCKETS,
+        )
+        if metrics is not None:
+            metrics.add(self.lag)
+
+        self._lock = threading.Lock()
+        self._beat = 0.0
+        # the beat after which the loop was found blocked, and its stack
+        self._captured: tuple[float, traceback.StackSummary] | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """
+        Watch the running event loop.
+        """
+        if self._task is not None:
+            return
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch,
+            args=(threading.get_ident(),),
+            name="stapi-loop-watchdog",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._task is None or self._thread is None:
+            return
+        self._task.cancel()
+        self._stop.set()
+        self._thread.join()
+        self._task = self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            beat = self._beat
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(now - beat - self.interval, 0.0)
+            self.lag.observe(lag)
+            with self._lock:
+                self._beat = now
+                captured, self._captured = self._captured, None
+            if lag > self.threshold:
+                stack = captured[1] if captured and captured[0] == beat else None
+                self._blocked(Blocked(time.time() - lag, lag, stack))
+
+    def _blocked(self, blocked: Blocked) -> None:
+        self.blocked.append(blocked)
+        logger.warning(blocked.format().rstrip())
+        if self.on_blocked is not None:
+            self.on_blocked(blocked)
+
+    def _watch(self, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                beat = self._beat
+                if self._captured is not None and self._captured[0] == beat:
+                    continue
+                if time.perf_counter() - beat - self.interval <= self.threshold:
+                    continue
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    continue
+                stack = traceback.StackSummary.extract(traceback.walk_stack(frame))
+                stack.reverse()
+                self._captured = (beat, stack)
+
+
+class LoopWatchdogMiddleware:
+    """
+    ASGI middleware running `watchdog` on the event loop of the application
+    from its startup to its shutdown. Without lifespan events, e.g. a
+    `TestClient` not used as a context manager, the loop isn't watched.
+    """
+
+    def __init__(self, app: ASGIApp, watchdog: LoopWatchdog) -> None:
+        self.app = app
+        self.watchdog = watchdog
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "lifespan":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_watched(message: Message) -> None:
+            match message["type"]:
+                case "lifespan.startup.complete":
+                    self.watchdog.start()
+                case "lifespan.shutdown.complete" | "lifespan.shutdown.failed":
+                    self.watchdog.stop()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_watched)
+        finally:
+            self.watchdog.stop()
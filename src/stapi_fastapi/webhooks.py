@@ -0,0 +1,538 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import json
+import logging
+import random
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Sequence,
+)
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+
+from stapi_fastapi.constants import TYPE_JSON
+from stapi_fastapi.models.opportunity import FINAL_OPPORTUNITY_SEARCH_STATUS_CODES
+from stapi_fastapi.models.order import FINAL_ORDER_STATUS_CODES
+from stapi_fastapi.notifications import (
+    OPPORTUNITY_SEARCH_STATUS_EVENT,
+    ORDER_STATUS_EVENT,
+    StatusEvent,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+CALLBACK_URL_HEADER = "Callback-URL"
+WEBHOOK_ID_HEADER = "Webhook-Id"
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookDelivery(BaseModel):
+    id: int
+    topic: str
+    url: str
+    payload: bytes
+    attempts: int
+
+
+WebhookSender = Callable[[str, bytes, dict[str, str]], Awaitable[int]]
+"""
+Type alias for an async function that POSTs a webhook payload.
+
+Args:
+    url (str): The callback URL registered by the client.
+    payload (bytes): The JSON encoded event.
+    headers (dict[str, str]): Headers to send with the payload.
+
+Returns:
+    The HTTP status code of the response. Any 2xx status counts as delivered;
+    other statuses and raised exceptions are retried.
+"""
+
+
+CallbackURLValidator = Callable[[str], Awaitable[bool]]
+"""
+Type alias for an async function checking a callback URL before webhooks are
+registered for or POSTed to it.
+
+Args:
+    url (str): The callback URL given by the client.
+
+Returns:
+    Whether the server may POST webhooks to the URL.
+"""
+
+
+async def is_public_callback_url(url: str) -> bool:
+    """
+    Whether `url` is an HTTP(S) URL whose host is, or only resolves to, global
+    addresses, the default `CallbackURLValidator`. This keeps clients from having
+    webhooks POSTed to the loopback, private, link-local, e.g. cloud metadata, and
+    other reserved addresses around the server. To allow others, e.g. internal
+    hosts, pass a validator with an allowlist to `WebhookDispatcher`.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, None, type=socket.SOCK_STREAM
+        )
+    except (OSError, UnicodeError):
+        return False
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            return False
+    return bool(addresses)
+
+
+def is_final_status_event(event: StatusEvent) -> bool:
+    status_code = event.data.get("status", {}).get("status_code")
+    if event.event == ORDER_STATUS_EVENT:
+        return status_code in FINAL_ORDER_STATUS_CODES
+    if event.event == OPPORTUNITY_SEARCH_STATUS_EVENT:
+        return status_code in FINAL_OPPORTUNITY_SEARCH_STATUS_CODES
+    return False
+
+
+class WebhookOutbox:
+    """
+    Durable outbox of webhook deliveries, stored in a SQLite database file.
+
+    Callback URLs are registered per topic. Status events of a topic are written to
+    the outbox for each of its callback URLs before they are delivered, so pending
+    deliveries survive restarts and are shared by every worker process on a host.
+    The registrations of a topic are dropped once its final status is enqueued.
+
+    Only the oldest undelivered entry of each topic and URL can be claimed, which
+    keeps deliveries ordered per order or search; a claim is a lease that expires
+    after `lease` seconds in case the claiming worker dies. Writes wait up to
+    `timeout` seconds for other processes' transactions before failing.
+    """
+
+    def __init__(self, path: str, lease: float = 60, timeout: float = 5) -> None:
+        self.lease = lease
+        self._connection = sqlite3.connect(
+            path, timeout=timeout, check_same_thread=False, isolation_level=None
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_callbacks ("
+                " topic TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " PRIMARY KEY (topic, url))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_deliveries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " topic TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " payload BLOB NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " leased_until REAL NOT NULL DEFAULT 0,"
+                " last_error TEXT)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS webhook_deliveries_queue"
+                " ON webhook_deliveries (topic, url, id)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_dead_letters ("
+                " id INTEGER PRIMARY KEY,"
+                " topic TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " payload BLOB NOT NULL,"
+                " attempts INTEGER NOT NULL,"
+                " last_error TEXT)"
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    async def register(self, topic: str, url: str) -> None:
+        await asyncio.to_thread(self._register, topic, url)
+
+    def _register(self, topic: str, url: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO webhook_callbacks (topic, url) VALUES (?, ?)",
+                (topic, url),
+            )
+
+    def enqueue(self, event: StatusEvent) -> int:
+        """
+        Write `event` to the outbox for every callback URL registered for its topic,
+        returning the number of deliveries created.
+        """
+        return self.enqueue_many([event])
+
+    def registered(self, topics: Iterable[str]) -> set[str]:
+        """
+        Those of `topics` with callback URLs, read without waiting for the write lock.
+        """
+        topics = list(topics)
+        if not topics:
+            return set()
+        with self._lock:
+            return {
+                row[0]
+                for row in self._connection.execute(
+                    "SELECT DISTINCT topic FROM webhook_callbacks"
+                    f" WHERE topic IN ({', '.join('?' * len(topics))})",
+                    topics,
+                )
+            }
+
+    def enqueue_many(self, events: Sequence[StatusEvent]) -> int:
+        """
+        Write `events` in one transaction, in order. Events of topics without
+        callback URLs, most of them, create no deliveries; leave them out with
+        `registered` beforehand so they don't wait for the write lock.
+        """
+        if not events:
+            return 0
+
+        created = 0
+        with self._transaction():
+            for event in events:
+                payload = json.dumps(
+                    {"event": event.event, "topic": event.topic, "data": event.data},
+                    separators=(",", ":"),
+                ).encode()
+                cursor = self._connection.execute(
+                    "INSERT INTO webhook_deliveries"
+                    " (topic, url, payload, next_attempt_at)"
+                    " SELECT topic, url, ?, ? FROM webhook_callbacks WHERE topic = ?",
+                    (payload, time.time(), event.topic),
+                )
+                created += cursor.rowcount
+                if is_final_status_event(event):
+                    self._connection.execute(
+                        "DELETE FROM webhook_callbacks WHERE topic = ?", (event.topic,)
+                    )
+        return created
+
+    def claim(self) -> WebhookDelivery | None:
+        """
+        Lease the due delivery that has waited longest among those at the head of
+        their topic's queue.
+        """
+        now = time.time()
+        with self._transaction():
+            row = self._connection.execute(
+                "SELECT id, topic, url, payload, attempts FROM webhook_deliveries d"
+                " WHERE next_attempt_at <= ? AND leased_until <= ? AND id = ("
+                "  SELECT MIN(id) FROM webhook_deliveries"
+                "  WHERE topic = d.topic AND url = d.url)"
+                " ORDER BY next_attempt_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                self._connection.execute(
+                    "UPDATE webhook_deliveries SET leased_until = ? WHERE id = ?",
+                    (now + self.lease, row[0]),
+                )
+        if row is None:
+            return None
+        return WebhookDelivery(
+            id=row[0], topic=row[1], url=row[2], payload=row[3], attempts=row[4]
+        )
+
+    def next_attempt_at(self) -> float | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MIN(MAX(next_attempt_at, leased_until)) FROM webhook_deliveries"
+            ).fetchone()
+        return row[0]
+
+    def complete(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM webhook_deliveries WHERE id = ?", (delivery.id,)
+            )
+
+    def retry(self, delivery: WebhookDelivery, delay: float, error: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE webhook_deliveries SET attempts = attempts + 1,"
+                " next_attempt_at = ?, leased_until = 0, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, delivery.id),
+            )
+
+    def dead_letter(self, delivery: WebhookDelivery, error: str) -> None:
+        """
+        Give up on `delivery`, moving it aside so later events of its topic proceed.
+        """
+        with self._transaction():
+            self._connection.execute(
+                "INSERT INTO webhook_dead_letters"
+                " (id, topic, url, payload, attempts, last_error)"
+                " SELECT id, topic, url, payload, attempts + 1, ?"
+                " FROM webhook_deliveries WHERE id = ?",
+                (error, delivery.id),
+            )
+            self._connection.execute(
+                "DELETE FROM webhook_deliveries WHERE id = ?", (delivery.id,)
+            )
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM webhook_deliveries"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class HttpxWebhookSender:
+    """
+    `WebhookSender` posting with an `httpx.AsyncClient`, created on first use unless
+    one is given. Requires the `httpx` package.
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient | None = None, timeout: float = 10
+    ) -> None:
+        self._client = client
+        self.timeout = timeout
+
+    async def __call__(self, url: str, payload: bytes, headers: dict[str, str]) -> int:
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self._client.post(url, content=payload, headers=headers)
+        return response.status_code
+
+
+class WebhookDispatcher:
+    """
+    Delivers the status events of topics with registered callback URLs from a
+    `WebhookOutbox` with a pool of `concurrency` workers.
+
+    Failed deliveries are retried with exponential backoff and full jitter, starting
+    at `backoff` seconds and capped at `max_backoff`, and are moved to the dead
+    letter table after `max_attempts` attempts. Workers are woken when an event is
+    enqueued and otherwise poll the outbox every `poll_interval` seconds, which picks
+    up deliveries enqueued by other processes.
+
+    Status events are queued in memory and written to the outbox in batches by a
+    task in a worker thread, so publishers never wait for the database. Writes
+    failing, e.g. while another process holds the database lock for longer than
+    the outbox's timeout, are retried with the same backoff, capped at
+    `poll_interval`, keeping the events queued in order.
+
+    Callback URLs are checked with `callback_url_validator` when they are
+    registered, rejecting those of non-public addresses by default, and again
+    before each delivery, in case the addresses of their hosts changed; deliveries
+    to URLs no longer allowed are moved to the dead letter table.
+
+    Pass the dispatcher to `RootRouter(webhooks=...)`, which runs the workers for
+    the lifespan of the application.
+    """
+
+    def __init__(
+        self,
+        outbox: WebhookOutbox,
+        send: WebhookSender | None = None,
+        concurrency: int = 4,
+        max_attempts: int = 10,
+        backoff: float = 1,
+        max_backoff: float = 10 * 60,
+        poll_interval: float = 5,
+        callback_url_validator: CallbackURLValidator = is_public_callback_url,
+    ) -> None:
+        self.outbox = outbox
+        self.send = send or HttpxWebhookSender()
+        self.callback_url_validator = callback_url_validator
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._events: deque[StatusEvent] = deque()
+        self._writing = threading.Lock()
+        self._batch: list[StatusEvent] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._enqueued: asyncio.Event | None = None
+
+    @property
+    def unwritten(self) -> int:
+        """
+        Number of status events not written to the outbox yet.
+        """
+        return len(self._events) + len(self._batch)
+
+    def handle(self, event: StatusEvent) -> None:
+        """
+        `NotificationBus` handler queueing `event` to be written to the outbox.
+        Safe to call from any thread.
+        """
+        self._events.append(event)
+        loop, enqueued = self._loop, self._enqueued
+        if loop is not None and enqueued is not None:
+            try:
+                loop.call_soon_threadsafe(enqueued.set)
+            except RuntimeError:
+                # the loop closed, the event is written when the dispatcher runs again
+                pass
+
+    @asynccontextmanager
+    async def running(self) -> AsyncIterator[None]:
+        self._wakeup = asyncio.Event()
+        self._enqueued = asyncio.Event()
+        self._enqueued.set()
+        self._loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self._write()))
+        try:
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._loop = self._wakeup = self._enqueued = None
+            try:
+                while self._events:
+                    await asyncio.to_thread(self._write_batch)
+            except sqlite3.Error:
+                logger.exception(
+                    "Error writing %s status events to the webhook outbox",
+                    len(self._events),
+                )
+
+    def _write_batch(self) -> int:
+        # a batch being written when the writer task was cancelled is written
+        # before the remaining events are at shutdown
+        with self._writing:
+            # at most 500 events, within SQLite's limit of query parameters
+            batch = [self._events.popleft() for _ in range(min(len(self._events), 500))]
+            self._batch = batch
+            try:
+                # skipping most events without waiting for the write lock
+                registered = self.outbox.registered({event.topic for event in batch})
+                self._batch = batch = [x for x in batch if x.topic in registered]
+                created = self.outbox.enqueue_many(batch)
+            except BaseException:
+                # put back in order, new events are only appended
+                self._batch = []
+                self._events.extendleft(reversed(batch))
+                raise
+            self._batch = []
+            return created
+
+    async def _write(self) -> None:
+        assert self._enqueued is not None and self._wakeup is not None
+        failures = 0
+        while True:
+            await self._enqueued.wait()
+            self._enqueued.clear()
+            while self._events:
+                try:
+                    created = await asyncio.to_thread(self._write_batch)
+                except sqlite3.Error:
+                    logger.exception(
+                        "Error writing status events to the webhook outbox"
+                    )
+                    await asyncio.sleep(
+                        random.uniform(
+                            0, min(self.poll_interval, self.backoff * 2**failures)
+                        )
+                    )
+                    failures = min(failures + 1, 32)
+                    continue
+                failures = 0
+                if created:
+                    self._wakeup.set()
+
+    async def _work(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            # cleared before claiming so a delivery enqueued from here on wakes us
+            self._wakeup.clear()
+            try:
+                delivery = await asyncio.to_thread(self.outbox.claim)
+            except sqlite3.Error:
+                logger.exception("Error claiming a webhook delivery")
+                delivery = None
+            if delivery is not None:
+                await self.deliver(delivery)
+                continue
+
+            timeout = self.poll_interval
+            next_attempt_at = await asyncio.to_thread(self.outbox.next_attempt_at)
+            if next_attempt_at is not None:
+                timeout = min(timeout, max(next_attempt_at - time.time(), 0))
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    async def deliver(self, delivery: WebhookDelivery) -> None:
+        headers = {"Content-Type": TYPE_JSON, WEBHOOK_ID_HEADER: str(delivery.id)}
+        if not await self.callback_url_validator(delivery.url):
+            logger.warning(
+                "Not delivering webhook %s to %s: the URL is not allowed",
+                delivery.id,
+                delivery.url,
+            )
+            await asyncio.to_thread(
+                self.outbox.dead_letter, delivery, "callback URL not allowed"
+            )
+            return
+
+        try:
+            status_code = await self.send(delivery.url, delivery.payload, headers)
+            error = None if 200 <= status_code < 300 else f"HTTP {status_code}"
+        except Exception as e:
+            error = repr(e)
+
+        if error is None:
+            await asyncio.to_thread(self.outbox.complete, delivery)
+        elif delivery.attempts + 1 >= self.max_attempts:
+            logger.warning(
+                "Giving up delivering webhook %s to %s: %s",
+                delivery.id,
+                delivery.url,
+                error,
+            )
+            await asyncio.to_thread(self.outbox.dead_letter, delivery, error)
+        else:
+            delay = random.uniform(
+                0, min(self.max_backoff, self.backoff * 2**delivery.attempts)
+            )
+            await asyncio.to_thread(self.outbox.retry, delivery, delay, error)
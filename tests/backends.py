@@ -5,6 +5,7 @@ from fastapi import Request
 from returns.maybe import Maybe, Nothing, Some
 from returns.result import Failure, ResultE, Success
 
+from stapi_fastapi.cursor import keyset_page
 from stapi_fastapi.models.opportunity import (
     Opportunity,
     OpportunityCollection,
@@ -30,22 +31,14 @@ async def mock_get_orders(
     """
     Return orders from backend.  Handle pagination/limit if applicable
     """
-    try:
-        start = 0
-        limit = min(limit, 100)
-        order_ids = [*request.state._orders_db._orders.keys()]
 
-        if next:
-            start = order_ids.index(next)
-        end = start + limit
-        ids = order_ids[start:end]
-        orders = [request.state._orders_db.get_order(order_id) for order_id in ids]
+    def key(order: Order) -> tuple[datetime, str]:
+        return order.properties.created, order.id
 
-        if end > 0 and end < len(order_ids):
-            return Success(
-                (orders, Some(request.state._orders_db._orders[order_ids[end]].id))
-            )
-        return Success((orders, Nothing))
+    try:
+        # sorted by the key of the pages, ids break ties of creation times
+        orders = sorted(request.state._orders_db._orders.values(), key=key)
+        return Success(keyset_page(orders, key, next, min(limit, 100)))
     except Exception as e:
         return Failure(e)
 
@@ -62,6 +55,22 @@ async def mock_get_order(order_id: str, request: Request) -> ResultE[Maybe[Order
         return Failure(e)
 
 
+async def mock_get_orders_by_ids(
+    order_ids: list[str], request: Request
+) -> ResultE[dict[str, ResultE[Maybe[Order]]]]:
+    try:
+        return Success(
+            {
+                order_id: Success(
+                    Maybe.from_optional(request.state._orders_db.get_order(order_id))
+                )
+                for order_id in order_ids
+            }
+        )
+    except Exception as e:
+        return Failure(e)
+
+
 async def mock_get_order_statuses(
     order_id: str, next: str | None, limit: int, request: Request
 ) -> ResultE[Maybe[tuple[list[OrderStatus], Maybe[str]]]]:
@@ -16,6 +16,7 @@ from stapi_fastapi.models.product import (
     Product,
 )
 from stapi_fastapi.routers.root_router import RootRouter
+from stapi_fastapi.watchdog import LoopWatchdog, LoopWatchdogMiddleware
 
 from .backends import (
     mock_get_opportunity_search_record,
@@ -50,16 +51,37 @@ def mock_products(request) -> list[Product]:
     ]
 
 
+@pytest.fixture
+def root_router_kwargs(request) -> dict[str, Any]:
+    if request.node.get_closest_marker("root_router_kwargs") is not None:
+        return request.node.get_closest_marker("root_router_kwargs").kwargs
+    return {}
+
+
 @pytest.fixture
 def mock_opportunities() -> list[Opportunity]:
     return [create_mock_opportunity()]
 
 
+@pytest.fixture
+def loop_watchdog() -> Iterator[LoopWatchdog]:
+    """
+    Watchdog of the event loop of the test applications, failing tests in which
+    the loop is blocked, e.g. by a backend making a synchronous HTTP call.
+    """
+    watchdog = LoopWatchdog(threshold=0.25)
+    yield watchdog
+    if watchdog.blocked:
+        pytest.fail("\n".join(x.format() for x in watchdog.blocked))
+
+
 @pytest.fixture
 def stapi_client(
     mock_products: list[Product],
     base_url: str,
     mock_opportunities: list[Opportunity],
+    root_router_kwargs: dict[str, Any],
+    loop_watchdog: LoopWatchdog,
 ) -> Generator[TestClient, None, None]:
     @asynccontextmanager
     async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
@@ -76,6 +98,7 @@ def stapi_client(
         get_order=mock_get_order,
         get_order_statuses=mock_get_order_statuses,
         conformances=[CORE],
+        **root_router_kwargs,
     )
 
     for mock_product in mock_products:
@@ -83,6 +106,7 @@ def stapi_client(
 
     app = FastAPI(lifespan=lifespan)
     app.include_router(root_router, prefix="")
+    app.add_middleware(LoopWatchdogMiddleware, watchdog=loop_watchdog)
 
     with TestClient(app, base_url=f"{base_url}") as client:
         yield client
@@ -93,6 +117,8 @@ def stapi_client_async_opportunity(
     mock_products: list[Product],
     base_url: str,
     mock_opportunities: list[Opportunity],
+    root_router_kwargs: dict[str, Any],
+    loop_watchdog: LoopWatchdog,
 ) -> Generator[TestClient, None, None]:
     @asynccontextmanager
     async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
@@ -112,6 +138,7 @@ def stapi_client_async_opportunity(
         get_opportunity_search_records=mock_get_opportunity_search_records,
         get_opportunity_search_record=mock_get_opportunity_search_record,
         conformances=[CORE, OPPORTUNITIES, ASYNC_OPPORTUNITIES],
+        **root_router_kwargs,
     )
 
     for mock_product in mock_products:
@@ -119,6 +146,7 @@ def stapi_client_async_opportunity(
 
     app = FastAPI(lifespan=lifespan)
     app.include_router(root_router, prefix="")
+    app.add_middleware(LoopWatchdogMiddleware, watchdog=loop_watchdog)
 
     with TestClient(app, base_url=f"{base_url}") as client:
         yield client
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Any
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.admission import (
+    AdmissionControl,
+    Limiter,
+    OverloadedException,
+    RouteClass,
+)
+
+
+@pytest.fixture
+def admission() -> AdmissionControl:
+    # nothing is admitted and nothing may queue, so every limited call is shed
+    return AdmissionControl(
+        {
+            RouteClass.create: Limiter(0, retry_after=7),
+            "get_order": Limiter(0),
+        }
+    )
+
+
+@pytest.fixture
+def root_router_kwargs(admission: AdmissionControl) -> dict[str, Any]:
+    return {"admission": admission}
+
+
+def test_overloaded_routes_shed(
+    stapi_client: TestClient, admission: AdmissionControl
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json={
+            "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+            "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+            "filter": None,
+            "order_parameters": {"s3_path": "s3://my-bucket"},
+        },
+    )
+    assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert res.headers["Retry-After"] == "7"
+
+    assert stapi_client.get("/orders/any").status_code == 503
+    # other read backends are not limited
+    assert stapi_client.get("/orders").status_code == status.HTTP_200_OK
+
+    # per-order failures of a batch are reported individually
+    res = stapi_client.post("/orders:batchGet", json={"ids": ["a"]})
+    assert res.json()["errors"]["a"]["status"] == 503
+
+    stats = admission.stats()
+    assert stats[RouteClass.create].shed == 1
+    assert stats["get_order"].shed == 2
+
+
+def test_limiter_queue() -> None:
+    limiter = Limiter(1, queue_size=1, max_wait=0.1)
+
+    async def main() -> None:
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert limiter.in_flight == 1
+
+        # one call may queue and is admitted once the slot frees up
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+
+        # the queue is full
+        with pytest.raises(OverloadedException):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(holder, queued)
+        assert limiter.admitted == 2
+
+        # waiting longer than `max_wait` sheds the call too
+        release.clear()
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedException):
+            async with limiter.slot():
+                pass
+        release.set()
+        await holder
+
+    asyncio.run(main())
+    stats = limiter.stats()
+    assert stats.shed == 2
+    assert stats.queued == 0
+    assert stats.in_flight == 0
+    assert stats.wait_seconds_total >= 0.1
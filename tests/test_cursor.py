@@ -0,0 +1,151 @@
+import sqlite3
+from datetime import UTC, datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from returns.maybe import Nothing
+
+from stapi_fastapi.cursor import (
+    CursorSigner,
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    keyset_clause,
+    keyset_page,
+    keyset_rows,
+)
+from stapi_fastapi.models.order import OrderStatus, OrderStatusCode
+
+from .shared import find_link
+
+T0 = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def test_signed_tokens() -> None:
+    signer = CursorSigner("secret")
+    token = signer.sign("position")
+    assert "position" not in token
+    assert signer.unsign(token) == "position"
+
+    for forged in (
+        CursorSigner("other").sign("position"),
+        token[:-2],
+        "position",
+        "",
+    ):
+        with pytest.raises(InvalidCursorError):
+            signer.unsign(forged)
+
+
+def test_cursor_round_trip() -> None:
+    assert decode_cursor(encode_cursor(T0, "a")) == (T0, "a")
+    assert decode_cursor(encode_cursor((1, T0), "a")) == ((1, T0), "a")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not json")
+
+
+def test_keyset_page_stable_under_inserts() -> None:
+    items = [(T0 + timedelta(hours=i), f"id{i}") for i in range(5)]
+
+    def key(item: tuple[datetime, str]) -> tuple[datetime, str]:
+        return item
+
+    page, next = keyset_page(items, key, None, 2)
+    assert page == items[:2]
+
+    # an item inserted before the position doesn't shift the following pages
+    items.insert(0, (T0 - timedelta(hours=1), "early"))
+    page, next = keyset_page(items, key, next.unwrap(), 2)
+    assert page == items[3:5]
+    page, next = keyset_page(items, key, next.unwrap(), 2)
+    assert page == items[5:]
+    assert next == Nothing
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_sql(descending: bool) -> None:
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE orders (id TEXT, created TEXT)")
+    # rows with equal sort keys are told apart by the tie-breaker
+    rows = [(f"id{i}", (T0 + timedelta(hours=i // 2)).isoformat()) for i in range(5)]
+    db.executemany("INSERT INTO orders VALUES (?, ?)", rows)
+    expected = sorted(rows, key=lambda row: (row[1], row[0]), reverse=descending)
+
+    retrieved: list[tuple[str, str]] = []
+    next = None
+    while True:
+        condition, order_by, params = keyset_clause(
+            "created", "id", next, 2, descending
+        )
+        selected = db.execute(
+            f"SELECT id, created FROM orders WHERE {condition} {order_by}", params
+        ).fetchall()
+        page, maybe_next = keyset_rows(selected, lambda row: (row[1], row[0]), 2)
+        retrieved.extend(page)
+        if maybe_next == Nothing:
+            break
+        next = maybe_next.unwrap()
+    assert retrieved == expected
+
+
+def test_keyset_sql_rejects_identifiers() -> None:
+    with pytest.raises(ValueError):
+        keyset_clause("created; DROP TABLE orders", "id", None, 10)
+
+
+def test_orders_pages_sorted(stapi_client: TestClient) -> None:
+    payload = {
+        "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+        "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+        "filter": None,
+        "order_parameters": {"s3_path": "s3://my-bucket"},
+    }
+    for _ in range(5):
+        res = stapi_client.post("/products/test-spotlight/orders", json=payload)
+        assert res.status_code == status.HTTP_201_CREATED
+    # stored out of the order of their keys, some with the same creation time
+    orders = stapi_client.app_state["_orders_db"]._orders
+    for i, order in enumerate(orders.values()):
+        order.properties.created = T0 - timedelta(hours=i // 2)
+    expected = [
+        order.id
+        for order in sorted(
+            orders.values(), key=lambda order: (order.properties.created, order.id)
+        )
+    ]
+
+    retrieved: list[str] = []
+    url: str | None = "/orders?limit=2"
+    while url:
+        res = stapi_client.get(url)
+        retrieved.extend(order["id"] for order in res.json()["features"])
+        next_link = find_link(res.json()["links"], "next")
+        url = next_link["href"] if next_link else None
+    assert retrieved == expected
+
+
+@pytest.mark.root_router_kwargs(pagination_secret="secret")
+def test_router_signs_tokens(stapi_client: TestClient) -> None:
+    for i, code in enumerate((OrderStatusCode.received, OrderStatusCode.accepted)):
+        stapi_client.app_state["_orders_db"].put_order_status(
+            "order", OrderStatus(timestamp=T0 + timedelta(hours=i), status_code=code)
+        )
+
+    res = stapi_client.get("/orders/order/statuses", params={"limit": 1})
+    next_link = find_link(res.json()["links"], "next")
+    assert next_link
+    token = parse_qs(urlparse(next_link["href"]).query)["next"][0]
+    # the backend's position ("1") is not exposed and can't be forged
+    assert token != "1"
+    res = stapi_client.get(next_link["href"])
+    assert res.json()["statuses"][0]["status_code"] == "accepted"
+
+    res = stapi_client.get("/orders/order/statuses", params={"next": "1"})
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    res = stapi_client.get("/products", params={"limit": 1})
+    next_link = find_link(res.json()["links"], "next")
+    assert next_link
+    assert stapi_client.get(next_link["href"]).status_code == status.HTTP_200_OK
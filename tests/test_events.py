@@ -0,0 +1,211 @@
+import json
+import threading
+from datetime import UTC, datetime
+from typing import Any
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.models.order import OrderStatus, OrderStatusCode
+from stapi_fastapi.notifications import NotificationBus, order_topic
+from stapi_fastapi.responses import server_sent_event
+from stapi_fastapi.status_poller import StatusPoller
+
+
+@pytest.fixture
+def notification_bus() -> NotificationBus:
+    return NotificationBus()
+
+
+@pytest.fixture
+def status_poller() -> StatusPoller | None:
+    return None
+
+
+@pytest.fixture
+def root_router_kwargs(
+    notification_bus: NotificationBus, status_poller: StatusPoller | None
+) -> dict[str, Any]:
+    return {
+        "notification_bus": notification_bus,
+        "status_poller": status_poller,
+        "event_tenant": lambda request: request.headers.get("Authorization"),
+        "event_stream_heartbeat": 0.1,
+        "event_stream_max_duration": 0.5,
+    }
+
+
+@pytest.fixture
+def order_payload() -> dict[str, Any]:
+    return {
+        "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+        "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+        "filter": None,
+        "order_parameters": {"s3_path": "s3://my-bucket"},
+    }
+
+
+def order_status(status_code: OrderStatusCode) -> OrderStatus:
+    return OrderStatus(timestamp=datetime.now(UTC), status_code=status_code)
+
+
+def parse_events(body: str) -> list[dict[str, Any]]:
+    events = []
+    for message in body.split("\n\n"):
+        fields = dict(
+            line.split(": ", 1)
+            for line in message.splitlines()
+            if line and not line.startswith(":")
+        )
+        if fields:
+            events.append(
+                {
+                    "id": int(fields["id"]),
+                    "event": fields["event"],
+                    "data": json.loads(fields["data"]),
+                }
+            )
+    return events
+
+
+def test_server_sent_event() -> None:
+    assert server_sent_event(3, "order-status", {"a": 1}) == (
+        'id: 3\nevent: order-status\ndata: {"a":1}\n\n'
+    )
+
+
+def test_order_events_replay_and_live(
+    stapi_client: TestClient,
+    notification_bus: NotificationBus,
+    order_payload: dict[str, Any],
+) -> None:
+    res = stapi_client.post("/products/test-spotlight/orders", json=order_payload)
+    order_id = res.json()["id"]
+
+    threading.Timer(
+        0.2,
+        notification_bus.publish_order_status,
+        (order_id, order_status(OrderStatusCode.accepted)),
+    ).start()
+
+    res = stapi_client.get(f"/orders/{order_id}/events")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["Content-Type"].startswith("text/event-stream")
+    assert res.headers["Cache-Control"] == "no-cache"
+    assert ": keep-alive" in res.text
+
+    events = parse_events(res.text)
+    assert [e["event"] for e in events] == ["order-status", "order-status"]
+    assert [e["data"]["status"]["status_code"] for e in events] == [
+        "received",
+        "accepted",
+    ]
+    assert all(e["data"]["order_id"] == order_id for e in events)
+
+    # resuming after the first event only sends the later ones
+    res = stapi_client.get(
+        f"/orders/{order_id}/events",
+        headers={"Last-Event-ID": str(events[0]["id"])},
+    )
+    assert [e["id"] for e in parse_events(res.text)] == [events[1]["id"]]
+
+
+@pytest.mark.parametrize("status_poller", [StatusPoller(interval=0.05)])
+def test_order_events_polled(
+    stapi_client: TestClient,
+    status_poller: StatusPoller,
+    order_payload: dict[str, Any],
+) -> None:
+    res = stapi_client.post("/products/test-spotlight/orders", json=order_payload)
+    order_id = res.json()["id"]
+    # e.g. an order created by another process
+    status_poller.unwatch(order_topic(order_id))
+
+    def accept() -> None:
+        orders_db = stapi_client.app_state["_orders_db"]
+        order = orders_db.get_order(order_id)
+        order.properties.status = order_status(OrderStatusCode.accepted)
+        orders_db.put_order(order)
+
+    # the backend's status changes while the stream is its only client
+    threading.Timer(0.2, accept).start()
+    res = stapi_client.get(f"/orders/{order_id}/events")
+    assert [e["data"]["status"]["status_code"] for e in parse_events(res.text)] == [
+        "received",
+        "accepted",
+    ]
+
+
+def test_order_events_not_found(stapi_client: TestClient) -> None:
+    res = stapi_client.get("/orders/missing/events")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_events_filtered_by_tenant(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    url = "/products/test-spotlight/orders"
+    mine = stapi_client.post(
+        url, json=order_payload, headers={"Authorization": "Bearer me"}
+    ).json()["id"]
+    stapi_client.post(
+        url, json=order_payload, headers={"Authorization": "Bearer other"}
+    )
+
+    res = stapi_client.get(
+        "/events", headers={"Authorization": "Bearer me", "Last-Event-ID": "0"}
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert [e["data"]["order_id"] for e in parse_events(res.text)] == [mine]
+
+    # without Last-Event-ID only new events are sent
+    res = stapi_client.get("/events", headers={"Authorization": "Bearer me"})
+    assert parse_events(res.text) == []
+
+
+def test_events_of_other_tenants(
+    stapi_client: TestClient,
+    notification_bus: NotificationBus,
+    order_payload: dict[str, Any],
+) -> None:
+    url = "/products/test-spotlight/orders"
+    tenant_a = {"Authorization": "Bearer a"}
+    order_id = stapi_client.post(url, json=order_payload, headers=tenant_a).json()["id"]
+    threading.Timer(
+        0.2,
+        notification_bus.publish_order_status,
+        (order_id, order_status(OrderStatusCode.accepted), "Bearer a"),
+    ).start()
+
+    # neither replayed nor live events of tenant A are sent to tenant B
+    res = stapi_client.get(
+        "/events", headers={"Authorization": "Bearer b", "Last-Event-ID": "0"}
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert parse_events(res.text) == []
+    res = stapi_client.get("/events", headers={**tenant_a, "Last-Event-ID": "0"})
+    assert [e["data"]["status"]["status_code"] for e in parse_events(res.text)] == [
+        "received",
+        "accepted",
+    ]
+
+    # nor to callers without a tenant
+    res = stapi_client.get("/events", headers={"Last-Event-ID": "0"})
+    assert res.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.parametrize("root_router_kwargs", [{}])
+def test_events_without_tenants(stapi_client: TestClient) -> None:
+    res = stapi_client.get("/events")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_publish_deduplicates_unchanged_status() -> None:
+    bus = NotificationBus()
+    received = order_status(OrderStatusCode.received)
+
+    assert bus.publish_order_status("order", received) is not None
+    assert bus.publish_order_status("order", received) is None
+    assert bus.publish_order_status("order", order_status(OrderStatusCode.accepted))
+    assert [e.id for e in bus.events_since("orders/order", 0)] == [1, 2]
@@ -0,0 +1,130 @@
+from typing import Any
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.fields import Fieldset
+from stapi_fastapi.models.product import Product
+
+from .backends import mock_create_order, mock_search_opportunities
+from .shared import MyOpportunityProperties, MyOrderParameters, MyProductConstraints
+
+
+@pytest.fixture
+def order(stapi_client: TestClient) -> dict[str, Any]:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json={
+            "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+            "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+            "filter": None,
+            "order_parameters": {"s3_path": "s3://my-bucket"},
+        },
+    )
+    assert res.status_code == status.HTTP_201_CREATED
+    return res.json()
+
+
+def test_fieldset() -> None:
+    fieldset = Fieldset(["properties.status.status_code", "properties", "geometry"])
+    assert fieldset.feature() == {
+        "properties": True,
+        "geometry": True,
+        "type": True,
+        "id": True,
+        "links": True,
+    }
+    assert Fieldset(["properties.status"]).includes("properties")
+    assert Fieldset(["properties"]).includes("properties.status")
+    assert not Fieldset(["properties"]).includes("geometry")
+
+
+def test_orders_projected(stapi_client: TestClient, order: dict[str, Any]) -> None:
+    res = stapi_client.get(
+        "/orders", params={"fields": "properties.status,properties.created"}
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["Content-Type"] == "application/geo+json"
+    [feature] = res.json()["features"]
+    assert set(feature) == {"type", "id", "links", "properties"}
+    assert set(feature["properties"]) == {"status", "created"}
+    assert feature["properties"]["status"] == order["properties"]["status"]
+
+    res = stapi_client.get(f"/orders/{order['id']}", params={"fields": "geometry"})
+    body = res.json()
+    assert set(body) == {"type", "id", "links", "geometry"}
+    assert body["geometry"] == order["geometry"]
+
+    # without fields the full orders are returned
+    body = stapi_client.get(f"/orders/{order['id']}").json()
+    assert set(body) == set(order)
+
+
+def test_invalid_fields(stapi_client: TestClient) -> None:
+    res = stapi_client.get("/orders", params={"fields": "properties..status"})
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_opportunities_projected(
+    stapi_client: TestClient, opportunity_search: dict[str, Any]
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/opportunities",
+        json=opportunity_search,
+        params={"fields": "properties.datetime"},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    body = res.json()
+    assert any(x["rel"] == "create-order" for x in body["links"])
+    [feature] = body["features"]
+    assert "geometry" not in feature
+    assert set(feature["properties"]) == {"datetime"}
+
+
+def test_orders_geometry_reduced(stapi_client: TestClient) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json={
+            "geometry": {"type": "Point", "coordinates": [14.4123456, 56.5987654]},
+            "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+            "filter": None,
+            "order_parameters": {"s3_path": "s3://my-bucket"},
+        },
+    )
+    order_id = res.json()["id"]
+
+    res = stapi_client.get(f"/orders/{order_id}", params={"precision": 2})
+    assert res.json()["geometry"]["coordinates"] == [14.41, 56.6]
+    res = stapi_client.get("/orders", params={"precision": 3, "fields": "geometry"})
+    assert res.json()["features"][0]["geometry"]["coordinates"] == [14.412, 56.599]
+
+
+@pytest.mark.mock_products(
+    [
+        Product(
+            id="test-spotlight",
+            license="CC-BY-4.0",
+            create_order=mock_create_order,
+            search_opportunities=mock_search_opportunities,
+            constraints=MyProductConstraints,
+            opportunity_properties=MyOpportunityProperties,
+            order_parameters=MyOrderParameters,
+            geometry_precision=1,
+        )
+    ]
+)
+def test_product_geometry_defaults(
+    stapi_client: TestClient, opportunity_search: dict[str, Any]
+) -> None:
+    url = "/products/test-spotlight/opportunities"
+    search = {
+        **opportunity_search,
+        "geometry": {"type": "Point", "coordinates": [1.23456, 2.34567]},
+    }
+    res = stapi_client.post(url, json=search)
+    assert res.json()["features"][0]["geometry"]["coordinates"] == [1.2, 2.3]
+
+    # the request's precision overrides the product's
+    res = stapi_client.post(url, json=search, params={"precision": 3})
+    assert res.json()["features"][0]["geometry"]["coordinates"] == [1.235, 2.346]
@@ -0,0 +1,90 @@
+from typing import Any
+
+import pytest
+
+from stapi_fastapi.geometry import bbox, contains, intersects, reduce_geometry
+
+
+def polygon(*rings: list[tuple[float, float]]) -> dict[str, Any]:
+    return {"type": "Polygon", "coordinates": [[*ring, ring[0]] for ring in rings]}
+
+
+def square(x0: float, y0: float, x1: float, y1: float) -> list[tuple[float, float]]:
+    return [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+
+
+# a U shape open to the north
+U = polygon([(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (1, 1), (1, 3), (0, 3)])
+DONUT = polygon(square(0, 0, 4, 4), square(1, 1, 3, 3))
+
+
+@pytest.mark.parametrize(
+    "outer, inner, expected",
+    [
+        (polygon(square(0, 0, 2, 2)), polygon(square(0, 0, 2, 2)), True),
+        (polygon(square(0, 0, 2, 2)), polygon(square(0.5, 0.5, 1, 1)), True),
+        (polygon(square(0, 0, 2, 2)), polygon(square(1, 1, 3, 3)), False),
+        (U, {"type": "Point", "coordinates": [0.5, 2]}, True),
+        (U, {"type": "Point", "coordinates": [1.5, 2]}, False),
+        # bridges the gap of the U without any vertex in the gap
+        (U, {"type": "LineString", "coordinates": [[0.5, 2], [2.5, 2]]}, False),
+        (DONUT, polygon(square(0, 0, 1, 4)), True),
+        (DONUT, polygon(square(2, 2, 2.5, 2.5)), False),
+        # covers the hole entirely
+        (DONUT, polygon(square(0.5, 0.5, 3.5, 3.5)), False),
+        ({"type": "Point", "coordinates": [0, 0]}, polygon(square(0, 0, 1, 1)), False),
+    ],
+)
+def test_contains(outer: dict[str, Any], inner: dict[str, Any], expected: bool) -> None:
+    assert contains(outer, inner) is expected
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [
+        (polygon(square(0, 0, 2, 2)), {"type": "Point", "coordinates": [1, 1]}, True),
+        (polygon(square(0, 0, 2, 2)), {"type": "Point", "coordinates": [2, 1]}, True),
+        (DONUT, {"type": "Point", "coordinates": [2, 2]}, False),
+        (U, polygon(square(1.2, 1.5, 1.8, 2.5)), False),
+        (
+            {"type": "LineString", "coordinates": [[0, 0], [2, 2]]},
+            {"type": "LineString", "coordinates": [[0, 2], [2, 0]]},
+            True,
+        ),
+        (
+            {"type": "MultiPoint", "coordinates": [[5, 5], [1, 1]]},
+            polygon(square(0, 0, 2, 2)),
+            True,
+        ),
+    ],
+)
+def test_intersects(a: dict[str, Any], b: dict[str, Any], expected: bool) -> None:
+    assert intersects(a, b) is expected
+    assert intersects(b, a) is expected
+
+
+def test_bbox() -> None:
+    assert bbox(U) == (0, 0, 3, 3)
+    assert bbox({"type": "GeometryCollection", "geometries": []}) is None
+
+
+def test_reduce_geometry() -> None:
+    line = {
+        "type": "LineString",
+        "coordinates": [[0, 0], [1, 0.001], [2, -0.001], [3, 0], [3, 1.123456]],
+    }
+    reduced = reduce_geometry(line, 0.01, 2)
+    assert reduced == {"type": "LineString", "coordinates": ((0, 0), (3, 0), (3, 1.12))}
+    # results are cached per geometry
+    assert reduce_geometry(line, 0.01, 2)["coordinates"] is reduced["coordinates"]
+    assert reduce_geometry(line, None, None) is line
+
+    # rings are not reduced below 4 positions
+    triangle = polygon([(0, 0), (1, 0), (0, 0.001)])
+    assert reduce_geometry(triangle, 0.1, None)["coordinates"] == (
+        tuple(tuple(x) for x in triangle["coordinates"][0]),
+    )
+    assert reduce_geometry({"type": "Point", "coordinates": [1.23456, 2]}, None, 1) == {
+        "type": "Point",
+        "coordinates": (1.2, 2),
+    }
@@ -0,0 +1,161 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.idempotency import (
+    Idempotency,
+    IdempotencyKeyReusedException,
+    IdempotentResponse,
+    InMemoryIdempotencyStore,
+    SQLiteIdempotencyStore,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def root_router_kwargs(request, tmp_path: Path) -> dict[str, Any]:
+    if request.param == "sqlite":
+        return {"idempotency_store": SQLiteIdempotencyStore(str(tmp_path / "keys.db"))}
+    return {"idempotency_store": InMemoryIdempotencyStore()}
+
+
+@pytest.fixture
+def order_payload() -> dict[str, Any]:
+    return {
+        "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+        "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+        "filter": None,
+        "order_parameters": {"s3_path": "s3://my-bucket"},
+    }
+
+
+def test_create_order_replayed(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    url = "/products/test-spotlight/orders"
+    headers = {"Idempotency-Key": "key-1"}
+
+    first = stapi_client.post(url, json=order_payload, headers=headers)
+    assert first.status_code == status.HTTP_201_CREATED
+    assert "Idempotent-Replayed" not in first.headers
+
+    retry = stapi_client.post(url, json=order_payload, headers=headers)
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.headers["Location"] == first.headers["Location"]
+    assert retry.headers["Content-Type"] == "application/geo+json"
+    assert retry.json() == first.json()
+
+    # only one order reached the backend
+    assert len(stapi_client.get("/orders").json()["features"]) == 1
+
+    # a different key or another caller creates a new order
+    stapi_client.post(url, json=order_payload, headers={"Idempotency-Key": "key-2"})
+    stapi_client.post(
+        url, json=order_payload, headers={**headers, "Authorization": "Bearer other"}
+    )
+    assert len(stapi_client.get("/orders").json()["features"]) == 3
+
+
+def test_create_order_key_reused_with_other_payload(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    url = "/products/test-spotlight/orders"
+    headers = {"Idempotency-Key": "key-1"}
+
+    stapi_client.post(url, json=order_payload, headers=headers)
+    order_payload["order_parameters"]["s3_path"] = "s3://other-bucket"
+    res = stapi_client.post(url, json=order_payload, headers=headers)
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_concurrent_duplicates_share_one_execution() -> None:
+    idempotency = Idempotency(InMemoryIdempotencyStore())
+    calls = 0
+
+    async def operation() -> IdempotentResponse:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return IdempotentResponse(
+            fingerprint="a", status_code=201, headers={}, body=b"{}"
+        )
+
+    async def main() -> list[tuple[IdempotentResponse, bool]]:
+        return await asyncio.gather(
+            *(idempotency.execute("key", "a", operation) for _ in range(5))
+        )
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+
+    with pytest.raises(IdempotencyKeyReusedException):
+        asyncio.run(idempotency.execute("key", "b", operation))
+
+
+def test_duplicate_during_store_lookup() -> None:
+    class SlowStore(InMemoryIdempotencyStore):
+        # like a database read finishing after the first response was stored
+        async def get(self, key: str) -> IdempotentResponse | None:
+            response = await super().get(key)
+            await asyncio.sleep(0.05)
+            return response
+
+    idempotency = Idempotency(SlowStore())
+    calls = 0
+    started = asyncio.Event()
+
+    async def operation() -> IdempotentResponse:
+        nonlocal calls
+        calls += 1
+        started.set()
+        await asyncio.sleep(0.01)
+        return IdempotentResponse(
+            fingerprint="a", status_code=201, headers={}, body=b"{}"
+        )
+
+    async def duplicate() -> tuple[IdempotentResponse, bool]:
+        await started.wait()
+        return await idempotency.execute("key", "a", operation)
+
+    async def main() -> tuple[tuple[IdempotentResponse, bool], ...]:
+        return await asyncio.gather(
+            idempotency.execute("key", "a", operation), duplicate()
+        )
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [replayed for _, replayed in results] == [False, True]
+
+
+def test_failed_execution_is_not_stored() -> None:
+    idempotency = Idempotency(InMemoryIdempotencyStore())
+
+    async def failing() -> IdempotentResponse:
+        raise RuntimeError("upstream unavailable")
+
+    async def succeeding() -> IdempotentResponse:
+        return IdempotentResponse(
+            fingerprint="a", status_code=201, headers={}, body=b"{}"
+        )
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(idempotency.execute("key", "a", failing))
+    _, replayed = asyncio.run(idempotency.execute("key", "a", succeeding))
+    assert not replayed
+
+
+def test_in_memory_store_expiry() -> None:
+    store = InMemoryIdempotencyStore()
+    response = IdempotentResponse(
+        fingerprint="a", status_code=201, headers={}, body=b"{}"
+    )
+
+    asyncio.run(store.put("fresh", response, ttl=60))
+    asyncio.run(store.put("stale", response, ttl=-1))
+    assert asyncio.run(store.get("fresh")) == response
+    assert asyncio.run(store.get("stale")) is None
@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.models.opportunity import (
+    OpportunitySearchRecord,
+    OpportunitySearchStatus,
+    OpportunitySearchStatusCode,
+)
+from stapi_fastapi.models.order import OrderStatus, OrderStatusCode
+from stapi_fastapi.notifications import (
+    NotificationBus,
+    opportunity_search_record_topic,
+    order_topic,
+)
+from stapi_fastapi.routers.root_router import Wait, get_wait
+
+from .shared import product_test_spotlight_async_opportunity
+
+
+@pytest.fixture
+def notification_bus() -> NotificationBus:
+    return NotificationBus()
+
+
+@pytest.fixture
+def root_router_kwargs(notification_bus: NotificationBus) -> dict[str, Any]:
+    return {"notification_bus": notification_bus, "long_poll_recheck_interval": None}
+
+
+def order_status(status_code: OrderStatusCode) -> OrderStatus:
+    return OrderStatus(timestamp=datetime.now(UTC), status_code=status_code)
+
+
+def publish_later(delay: float, update, bus: NotificationBus, topic: str) -> None:
+    def run() -> None:
+        update()
+        bus.publish(topic)
+
+    threading.Timer(delay, run).start()
+
+
+@pytest.mark.parametrize(
+    "wait, prefer, expected",
+    [
+        (None, None, None),
+        (3.0, "wait=10", Wait(3.0, preferred=False)),
+        (None, "wait=10", Wait(10.0, preferred=True)),
+        (None, "respond-async, wait=2.5", Wait(2.5, preferred=True)),
+        (None, 'Wait="4"; foo=bar', Wait(4.0, preferred=True)),
+        (None, "respond-async", None),
+        (None, "wait=soon", None),
+    ],
+)
+def test_get_wait(wait: float | None, prefer: str | None, expected: Wait | None):
+    assert get_wait(wait, prefer) == expected
+
+
+def test_order_statuses_long_poll_wakes_on_publish(
+    stapi_client: TestClient, notification_bus: NotificationBus
+) -> None:
+    db = stapi_client.app_state["_orders_db"]
+    db.put_order_status("order", order_status(OrderStatusCode.received))
+    publish_later(
+        0.2,
+        lambda: db.put_order_status("order", order_status(OrderStatusCode.accepted)),
+        notification_bus,
+        order_topic("order"),
+    )
+
+    start = time.monotonic()
+    res = stapi_client.get("/orders/order/statuses", params={"wait": 10})
+    assert time.monotonic() - start < 5
+
+    assert res.status_code == status.HTTP_200_OK
+    assert [x["status_code"] for x in res.json()["statuses"]] == [
+        "received",
+        "accepted",
+    ]
+    assert "Preference-Applied" not in res.headers
+
+
+def test_order_statuses_long_poll_times_out(stapi_client: TestClient) -> None:
+    db = stapi_client.app_state["_orders_db"]
+    db.put_order_status("order", order_status(OrderStatusCode.received))
+
+    start = time.monotonic()
+    res = stapi_client.get("/orders/order/statuses", headers={"Prefer": "wait=0.3"})
+    assert time.monotonic() - start >= 0.3
+
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["Preference-Applied"] == "wait=0.3"
+    assert len(res.json()["statuses"]) == 1
+
+
+def test_order_statuses_long_poll_final_status(stapi_client: TestClient) -> None:
+    db = stapi_client.app_state["_orders_db"]
+    db.put_order_status("order", order_status(OrderStatusCode.completed))
+
+    start = time.monotonic()
+    res = stapi_client.get("/orders/order/statuses", params={"wait": 10})
+    assert time.monotonic() - start < 5
+    assert res.status_code == status.HTTP_200_OK
+
+    res = stapi_client.get("/orders/missing/statuses", params={"wait": 10})
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.mock_products([product_test_spotlight_async_opportunity])
+def test_search_record_long_poll(
+    stapi_client_async_opportunity: TestClient,
+    notification_bus: NotificationBus,
+    opportunity_search: dict[str, Any],
+) -> None:
+    client = stapi_client_async_opportunity
+    search_response = client.post(
+        "/products/test-spotlight/opportunities", json=opportunity_search
+    )
+    search_record = OpportunitySearchRecord(**search_response.json())
+
+    def complete() -> None:
+        search_record.status = OpportunitySearchStatus(
+            timestamp=datetime.now(UTC),
+            status_code=OpportunitySearchStatusCode.completed,
+        )
+        client.app_state["_opportunities_db"].put_search_record(search_record)
+
+    publish_later(
+        0.2,
+        complete,
+        notification_bus,
+        opportunity_search_record_topic(search_record.id),
+    )
+
+    start = time.monotonic()
+    res = client.get(
+        f"/searches/opportunities/{search_record.id}", headers={"Prefer": "wait=10"}
+    )
+    assert time.monotonic() - start < 5
+
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["Preference-Applied"] == "wait=10"
+    assert res.json()["status"]["status_code"] == "completed"
@@ -0,0 +1,197 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.metrics import Histogram, Metrics, MetricsMiddleware
+from stapi_fastapi.routers.root_router import RootRouter
+
+from .backends import mock_get_order, mock_get_order_statuses, mock_get_orders
+from .shared import InMemoryOrderDB, product_test_spotlight_sync_opportunity
+
+
+def samples(exposition: str) -> dict[str, float]:
+    return {
+        sample: float(value)
+        for line in exposition.splitlines()
+        if not line.startswith("#")
+        for sample, _, value in [line.rpartition(" ")]
+    }
+
+
+def test_histogram_exposition() -> None:
+    metrics = Metrics()
+    histogram = metrics.add(
+        Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1))
+    )
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value, 'a "route"')
+
+    assert "# TYPE test_seconds histogram" in metrics.exposition()
+    assert {k: v for k, v in samples(metrics.exposition()).items() if "test_" in k} == {
+        'test_seconds_bucket{route="a \\"route\\"",le="0.1"}': 2,
+        'test_seconds_bucket{route="a \\"route\\"",le="1"}': 3,
+        'test_seconds_bucket{route="a \\"route\\"",le="+Inf"}': 4,
+        'test_seconds_sum{route="a \\"route\\""}': 5.65,
+        'test_seconds_count{route="a \\"route\\""}': 4,
+    }
+
+
+def test_unlabeled_histogram_exposition() -> None:
+    metrics = Metrics()
+    histogram = metrics.add(Histogram("test_seconds", "Test", (), buckets=(1,)))
+    histogram.observe(0.5)
+
+    assert {k: v for k, v in samples(metrics.exposition()).items() if "test_" in k} == {
+        'test_seconds_bucket{le="1"}': 1,
+        'test_seconds_bucket{le="+Inf"}': 1,
+        "test_seconds_sum": 0.5,
+        "test_seconds_count": 1,
+    }
+
+
+def test_metrics_aggregated(tmp_path: Path) -> None:
+    worker = Metrics(tmp_path)
+    worker.request_duration.observe(0.5, "get-order")
+    # another worker's snapshot
+    (tmp_path / "metrics-1.json").write_text(json.dumps(worker.snapshot()))
+
+    metrics = Metrics(tmp_path)
+    metrics.request_duration.observe(2, "get-order")
+    metrics.flush()
+    assert (tmp_path / "metrics-1.json").exists()
+
+    exposed = samples(metrics.exposition())
+    assert exposed['stapi_request_duration_seconds_count{route="get-order"}'] == 2
+    assert exposed['stapi_request_duration_seconds_sum{route="get-order"}'] == 2.5
+
+
+def test_metrics_of_exited_workers(tmp_path: Path) -> None:
+    worker = Metrics(tmp_path)
+    worker.request_duration.observe(0.5, "get-order")
+    worker.admission_in_flight.set(3, "read")
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    (tmp_path / f"metrics-{process.pid}.json").write_text(json.dumps(worker.snapshot()))
+
+    metrics = Metrics(tmp_path)
+    metrics.admission_in_flight.set(1, "read")
+    exposed = samples(metrics.exposition())
+    # the requests of the exited worker are still counted, but not its requests
+    # in flight
+    assert exposed['stapi_request_duration_seconds_count{route="get-order"}'] == 1
+    assert exposed['stapi_admission_in_flight{limiter="read"}'] == 1
+
+
+def application(metrics: Metrics) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
+        yield {"_orders_db": InMemoryOrderDB()}
+
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        metrics=metrics,
+        dispatch_products=True,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(root_router)
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    return app
+
+
+def test_metrics_flushed_periodically(tmp_path: Path) -> None:
+    metrics = Metrics(tmp_path, flush_interval=0.05)
+    path = tmp_path / f"metrics-{os.getpid()}.json"
+
+    with TestClient(application(metrics)) as client:
+        assert client.get("/orders/unknown").status_code == 404
+        deadline = time.monotonic() + 5
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.exists()
+
+
+def test_metrics_flushed_at_shutdown(tmp_path: Path) -> None:
+    metrics = Metrics(tmp_path, flush_interval=3600)
+    path = tmp_path / f"metrics-{os.getpid()}.json"
+
+    with TestClient(application(metrics)) as client:
+        assert client.get("/orders/unknown").status_code == 404
+        # requests don't write the snapshot
+        assert not path.exists()
+
+    snapshot = json.loads(path.read_text())
+    assert [["get-order"], mock.ANY] in snapshot["stapi_request_duration_seconds"]
+
+
+def test_metrics_endpoint() -> None:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
+        yield {"_orders_db": InMemoryOrderDB()}
+
+    metrics = Metrics()
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        metrics=metrics,
+        dispatch_products=True,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(root_router)
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    with TestClient(app) as client:
+        res = client.post(
+            "/products/test-spotlight/orders",
+            json={
+                "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+                "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+                "filter": None,
+                "order_parameters": {"s3_path": "s3://my-bucket"},
+            },
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        client.get(f"/orders/{res.json()['id']}")
+        assert client.get("/orders/unknown").status_code == 404
+
+        res = client.get("/metrics")
+        assert res.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        exposed = samples(res.text)
+
+    # product routes are labelled by route name, not by product
+    for route in ("create-order", "get-order"):
+        assert exposed[f'stapi_request_duration_seconds_count{{route="{route}"}}'] >= 1
+    assert exposed['stapi_serialization_duration_seconds_count{route="get-order"}'] == 1
+    assert exposed['stapi_response_size_bytes_count{route="get-order"}'] == 2
+    assert (
+        exposed[
+            'stapi_backend_duration_seconds_count{backend="get_order",outcome="success"}'
+        ]
+        == 1
+    )
+    assert (
+        exposed[
+            'stapi_backend_duration_seconds_count{backend="get_order",outcome="empty"}'
+        ]
+        == 1
+    )
+    assert (
+        exposed[
+            'stapi_backend_duration_seconds_count{backend="create_order",outcome="success"}'
+        ]
+        == 1
+    )
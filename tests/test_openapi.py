@@ -0,0 +1,191 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from pydantic import create_model
+
+from stapi_fastapi.models.order import OrderParameters
+from stapi_fastapi.models.product import Product
+from stapi_fastapi.openapi import OpenAPICache
+from stapi_fastapi.routers.root_router import RootRouter
+
+from .backends import (
+    mock_create_order,
+    mock_get_order,
+    mock_get_order_statuses,
+    mock_get_orders,
+    mock_search_opportunities,
+)
+from .shared import (
+    MyOpportunityProperties,
+    MyProductConstraints,
+    product_test_satellite_provider_sync_opportunity,
+    product_test_spotlight_sync_opportunity,
+)
+
+
+def create_app(lazy_products: bool) -> tuple[FastAPI, RootRouter]:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        lazy_products=lazy_products,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI()
+    app.include_router(root_router)
+    return app, root_router
+
+
+def without_operation_ids(paths: dict[str, Any]) -> dict[str, Any]:
+    return {
+        path: {
+            method: {k: v for k, v in operation.items() if k != "operationId"}
+            for method, operation in item.items()
+        }
+        for path, item in paths.items()
+    }
+
+
+def test_openapi_matches_generated() -> None:
+    app, root_router = create_app(lazy_products=False)
+    generated = app.openapi()
+    app.openapi_schema = None
+
+    OpenAPICache(app, root_router).install()
+    res = TestClient(app).get("/openapi.json")
+    assert res.status_code == status.HTTP_200_OK
+    body = res.json()
+    # operation ids of product routes differ, being generated for their own routes
+    assert without_operation_ids(body["paths"]) == without_operation_ids(
+        generated["paths"]
+    )
+    assert body["components"] == generated["components"]
+
+
+@pytest.mark.parametrize("lazy_products", [False, True])
+def test_openapi_served_cached(lazy_products: bool) -> None:
+    app, root_router = create_app(lazy_products)
+    OpenAPICache(app, root_router).install()
+    client = TestClient(app)
+
+    res = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    etag = res.headers["ETag"]
+    paths = res.json()["paths"]
+    assert "/products/test-spotlight/orders" in paths
+    assert "/products/{product_id}{path}" not in paths
+
+    res = client.get("/openapi.json", headers={"If-None-Match": etag})
+    assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # adding a product adds its paths to the document
+    root_router.add_product(product_test_satellite_provider_sync_opportunity)
+    res = client.get("/openapi.json", headers={"If-None-Match": etag})
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["ETag"] != etag
+    assert "/products/test-satellite-provider/orders" in res.json()["paths"]
+
+    if lazy_products:
+        # routes added for the document still serve requests
+        res = client.get("/products/test-satellite-provider/constraints")
+        assert res.status_code == status.HTTP_200_OK
+
+
+def test_openapi_generated_at_startup() -> None:
+    app, root_router = create_app(lazy_products=True)
+    cache = OpenAPICache(app, root_router)
+    cache.install()
+    assert not root_router.product_routers["test-spotlight"].has_routes
+
+    with TestClient(app) as client:
+        # generated before the first request, including lazily registered products
+        assert cache._document is not None
+        assert root_router.product_routers["test-spotlight"].has_routes
+        document = cache._document
+        res = client.get("/openapi.json")
+        assert res.content == document.body
+        assert cache._document is document
+
+
+def test_openapi_product_removed() -> None:
+    app, root_router = create_app(lazy_products=True)
+    root_router.add_product(product_test_satellite_provider_sync_opportunity)
+    cache = OpenAPICache(app, root_router)
+    cache.install()
+    schema = cache.schema()
+    assert "/products/test-spotlight/orders" in schema["paths"]
+
+    root_router.remove_product("test-spotlight")
+    removed = cache.schema()
+    assert "/products/test-spotlight/orders" not in removed["paths"]
+    assert "/products/test-satellite-provider/orders" in removed["paths"]
+    # the schemas shared with the other product remain
+    assert removed["components"] == schema["components"]
+    # the document served before is left untouched
+    assert "/products/test-spotlight/orders" in schema["paths"]
+
+    root_router.remove_product("test-satellite-provider")
+    removed = cache.schema()
+    assert not any(x.startswith("/products/test-") for x in removed["paths"])
+    assert "OrderPayload_MyOrderParameters_" not in removed["components"]["schemas"]
+    assert "Order" in removed["components"]["schemas"]
+
+
+def product_with_parameters(product_id: str, module: str, field: str) -> Product:
+    # order parameters named the same in both products
+    fields: dict[str, Any] = {field: (str, ...)}
+    parameters = create_model(
+        "Params", __base__=OrderParameters, __module__=module, **fields
+    )
+    return Product(
+        id=product_id,
+        license="CC-BY-4.0",
+        create_order=mock_create_order,
+        search_opportunities=mock_search_opportunities,
+        constraints=MyProductConstraints,
+        opportunity_properties=MyOpportunityProperties,
+        order_parameters=parameters,
+    )
+
+
+@pytest.mark.parametrize("lazy_products", [False, True])
+def test_openapi_conflicting_schemas(lazy_products: bool) -> None:
+    app, root_router = create_app(lazy_products)
+    root_router.add_product(product_with_parameters("a", "mod_a", "alpha"))
+    cache = OpenAPICache(app, root_router)
+    cache.install()
+    root_router.add_product(product_with_parameters("b", "mod_b", "beta"))
+    schema = cache.schema()
+
+    def order_parameters(product_id: str) -> dict[str, Any]:
+        operation = schema["paths"][f"/products/{product_id}/orders"]["post"]
+        ref = operation["requestBody"]["content"]["application/json"]["schema"]
+        payload = schema["components"]["schemas"][ref["$ref"].rpartition("/")[2]]
+        ref = payload["properties"]["order_parameters"]["$ref"]
+        return schema["components"]["schemas"][ref.rpartition("/")[2]]
+
+    assert list(order_parameters("a")["properties"]) == ["alpha"]
+    assert list(order_parameters("b")["properties"]) == ["beta"]
+    if not lazy_products:
+        # the app copied the routes before the products were added
+        generated = FastAPI()
+        generated.include_router(root_router)
+        assert schema["components"] == generated.openapi()["components"]
+
+
+def test_openapi_written(tmp_path: Path) -> None:
+    app, root_router = create_app(lazy_products=False)
+    path = tmp_path / "openapi.json"
+    OpenAPICache(app, root_router).write(path)
+
+    app, root_router = create_app(lazy_products=True)
+    cache = OpenAPICache(app, root_router)
+    cache.load(path)
+    cache.install()
+    res = TestClient(app).get("/openapi.json")
+    assert res.content == path.read_bytes()
+    # the document is loaded rather than generated
+    assert not root_router.product_routers["test-spotlight"].has_routes
@@ -1,20 +1,35 @@
+import asyncio
+import time
 from datetime import UTC, datetime, timedelta, timezone
 from typing import Any, Callable
 from uuid import uuid4
 
 import pytest
-from fastapi import status
+from fastapi import Request, status
 from fastapi.testclient import TestClient
+from returns.result import ResultE, Success
 
 from stapi_fastapi.models.opportunity import (
     OpportunityCollection,
+    OpportunityPayload,
     OpportunitySearchRecord,
     OpportunitySearchStatus,
     OpportunitySearchStatusCode,
 )
+from stapi_fastapi.models.product import Product
 from stapi_fastapi.models.shared import Link
+from stapi_fastapi.notifications import opportunity_search_record_topic
+from stapi_fastapi.routers.product_router import ProductRouter
 
+from .backends import (
+    mock_create_order,
+    mock_get_opportunity_collection,
+    mock_search_opportunities_async,
+)
 from .shared import (
+    MyOpportunityProperties,
+    MyOrderParameters,
+    MyProductConstraints,
     create_mock_opportunity,
     find_link,
     pagination_tester,
@@ -353,3 +368,131 @@ def test_get_search_records_pagination(
         target="search_records",
         expected_returns=expected_returns,
     )
+
+
+async def mock_search_opportunities_async_completing(
+    product_router: ProductRouter,
+    search: OpportunityPayload,
+    request: Request,
+    publish: bool = True,
+) -> ResultE[OpportunitySearchRecord]:
+    result = await mock_search_opportunities_async(product_router, search, request)
+    search_record = result.unwrap()
+    db = request.state._opportunities_db
+    bus = product_router.root_router.notifications
+
+    def complete() -> None:
+        collection = OpportunityCollection(
+            id=str(uuid4()), features=[create_mock_opportunity()]
+        )
+        db.put_opportunity_collection(collection)
+        search_record.links.append(
+            Link(
+                rel="opportunities",
+                href=f"http://stapiserver/products/test-spotlight/opportunities/{collection.id}",
+            )
+        )
+        search_record.status = OpportunitySearchStatus(
+            timestamp=datetime.now(UTC),
+            status_code=OpportunitySearchStatusCode.completed,
+        )
+        db.put_search_record(search_record)
+        if publish:
+            bus.publish(opportunity_search_record_topic(search_record.id))
+
+    asyncio.get_running_loop().call_later(0.1, complete)
+    return Success(search_record.model_copy(deep=True))
+
+
+async def mock_search_opportunities_async_completing_silently(
+    product_router: ProductRouter,
+    search: OpportunityPayload,
+    request: Request,
+) -> ResultE[OpportunitySearchRecord]:
+    return await mock_search_opportunities_async_completing(
+        product_router, search, request, publish=False
+    )
+
+
+product_test_spotlight_async_opportunity_completing = Product(
+    id="test-spotlight",
+    license="CC-BY-4.0",
+    create_order=mock_create_order,
+    search_opportunities_async=mock_search_opportunities_async_completing,
+    get_opportunity_collection=mock_get_opportunity_collection,
+    constraints=MyProductConstraints,
+    opportunity_properties=MyOpportunityProperties,
+    order_parameters=MyOrderParameters,
+)
+
+
+product_test_spotlight_async_opportunity_completing_silently = Product(
+    id="test-spotlight",
+    license="CC-BY-4.0",
+    create_order=mock_create_order,
+    search_opportunities_async=mock_search_opportunities_async_completing_silently,
+    get_opportunity_collection=mock_get_opportunity_collection,
+    constraints=MyProductConstraints,
+    opportunity_properties=MyOpportunityProperties,
+    order_parameters=MyOrderParameters,
+)
+
+
+@pytest.mark.root_router_kwargs(search_wait_budget=5)
+@pytest.mark.mock_products([product_test_spotlight_async_opportunity_completing])
+def test_prefer_wait_emulated(
+    stapi_client_async_opportunity: TestClient,
+    opportunity_search: dict[str, Any],
+) -> None:
+    url = "/products/test-spotlight/opportunities"
+    response = stapi_client_async_opportunity.post(
+        url, json=opportunity_search, headers={"Prefer": "wait"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Preference-Applied"] == "wait"
+    collection = OpportunityCollection(**response.json())
+    assert len(collection.features) == 1
+    assert find_link(response.json()["links"], "self")
+
+    # without a preference the search record is returned at once
+    response = stapi_client_async_opportunity.post(url, json=opportunity_search)
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.mark.root_router_kwargs(search_wait_budget=5)
+@pytest.mark.mock_products(
+    [product_test_spotlight_async_opportunity_completing_silently]
+)
+def test_prefer_wait_emulated_rechecks(
+    stapi_client_async_opportunity: TestClient,
+    opportunity_search: dict[str, Any],
+) -> None:
+    # the backend doesn't publish the completion, which is found by re-checking
+    # sooner than long-polling requests do
+    started = time.perf_counter()
+    response = stapi_client_async_opportunity.post(
+        "/products/test-spotlight/opportunities",
+        json=opportunity_search,
+        headers={"Prefer": "wait"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert time.perf_counter() - started < 1
+
+
+@pytest.mark.root_router_kwargs(search_wait_budget=0.2)
+@pytest.mark.mock_products([product_test_spotlight_async_opportunity])
+def test_prefer_wait_emulated_falls_back_to_async(
+    stapi_client_async_opportunity: TestClient,
+    opportunity_search: dict[str, Any],
+) -> None:
+    response = stapi_client_async_opportunity.post(
+        "/products/test-spotlight/opportunities",
+        json=opportunity_search,
+        headers={"Prefer": "wait"},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.headers["Preference-Applied"] == "respond-async"
+    search_record = OpportunitySearchRecord(**response.json())
+    assert response.headers["Location"].endswith(
+        f"/searches/opportunities/{search_record.id}"
+    )
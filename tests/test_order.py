@@ -1,15 +1,27 @@
+import json
 from datetime import UTC, datetime, timedelta, timezone
 
 import pytest
-from fastapi import status
+from fastapi import Request, status
 from fastapi.testclient import TestClient
 from geojson_pydantic import Point
 from geojson_pydantic.types import Position2D
 from httpx import Response
+from returns.result import Failure, ResultE
 
+from stapi_fastapi.exceptions import ConstraintsException
 from stapi_fastapi.models.order import Order, OrderPayload, OrderStatus, OrderStatusCode
-
-from .shared import MyOrderParameters, find_link, pagination_tester
+from stapi_fastapi.models.product import Product
+from stapi_fastapi.routers.product_router import ProductRouter
+
+from .backends import mock_create_order, mock_get_orders_by_ids
+from .shared import (
+    MyOpportunityProperties,
+    MyOrderParameters,
+    MyProductConstraints,
+    find_link,
+    pagination_tester,
+)
 
 NOW = datetime.now(UTC)
 START = NOW
@@ -248,3 +260,143 @@ def test_get_order_statuses_bad_token(
     order_id = "non_existing_order_id"
     res = stapi_client.get(f"/orders/{order_id}/statuses")
     assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize(
+    "root_router_kwargs",
+    [
+        pytest.param({}, id="fan-out"),
+        pytest.param({"get_orders_by_ids": mock_get_orders_by_ids}, id="by-ids"),
+    ],
+)
+def test_get_orders_batch(
+    setup_orders_pagination, stapi_client: TestClient, assert_link
+) -> None:
+    order_ids = [order["id"] for order in setup_orders_pagination[:2]]
+
+    res = stapi_client.post(
+        "/orders:batchGet", json={"ids": [*order_ids, "missing", order_ids[0]]}
+    )
+    assert res.status_code == status.HTTP_200_OK
+    body = res.json()
+
+    assert list(body["orders"]) == order_ids
+    for order_id in order_ids:
+        assert_link(
+            f"POST /orders:batchGet {order_id}",
+            body["orders"][order_id],
+            "self",
+            f"/orders/{order_id}",
+            media_type="application/geo+json",
+        )
+    assert body["errors"] == {"missing": {"status": 404, "detail": "Order not found"}}
+
+
+@pytest.mark.root_router_kwargs(batch_max_ids=2)
+def test_get_orders_batch_too_many_ids(stapi_client: TestClient) -> None:
+    res = stapi_client.post("/orders:batchGet", json={"ids": ["a", "b", "c"]})
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+    res = stapi_client.post("/orders:batchGet", json={"ids": []})
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_get_order_statuses_batch(
+    stapi_client: TestClient,
+    order_statuses: dict[str, list[OrderStatus]],
+    assert_link,
+) -> None:
+    for id, statuses in order_statuses.items():
+        for s in statuses:
+            stapi_client.app_state["_orders_db"].put_order_status(id, s)
+
+    res = stapi_client.post(
+        "/orders:batchStatuses",
+        params={"limit": 2},
+        json={"ids": ["test_order_id", "missing"]},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    body = res.json()
+
+    page = body["statuses"]["test_order_id"]
+    assert page["statuses"] == [
+        x.model_dump(mode="json") for x in order_statuses["test_order_id"][:2]
+    ]
+    assert_link(
+        "POST /orders:batchStatuses",
+        page,
+        "self",
+        "/orders/test_order_id/statuses",
+    )
+    next_link = find_link(page["links"], "next")
+    assert next_link
+    res = stapi_client.get(next_link["href"])
+    assert res.json()["statuses"] == [
+        order_statuses["test_order_id"][2].model_dump(mode="json")
+    ]
+
+    assert body["errors"] == {"missing": {"status": 404, "detail": "Order not found"}}
+
+
+async def mock_create_order_rejecting_bad_path(
+    product_router: ProductRouter, payload: OrderPayload, request: Request
+) -> ResultE[Order]:
+    if payload.order_parameters.s3_path == "s3://bad":
+        return Failure(ConstraintsException("bad s3_path"))
+    return await mock_create_order(product_router, payload, request)
+
+
+product_test_spotlight_rejecting_bad_path = Product(
+    id="test-spotlight",
+    license="CC-BY-4.0",
+    create_order=mock_create_order_rejecting_bad_path,
+    constraints=MyProductConstraints,
+    opportunity_properties=MyOpportunityProperties,
+    order_parameters=MyOrderParameters,
+)
+
+
+@pytest.mark.mock_products([product_test_spotlight_rejecting_bad_path])
+def test_create_orders_bulk(
+    stapi_client: TestClient, create_order_payloads: list[OrderPayload]
+) -> None:
+    payloads = [payload.model_dump() for payload in create_order_payloads]
+    payloads[1]["order_parameters"]["s3_path"] = "s3://bad"
+
+    res = stapi_client.post("/products/test-spotlight/orders:bulk", json=payloads)
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["Content-Type"] == "application/x-ndjson"
+
+    results = sorted(
+        (json.loads(line) for line in res.text.splitlines()), key=lambda x: x["index"]
+    )
+    assert [x["status"] for x in results] == [201, 422, 201]
+    assert results[1]["error"] == {"status": 422, "detail": "bad s3_path"}
+
+    created = {results[0]["order"]["id"], results[2]["order"]["id"]}
+    listed = stapi_client.get("/orders").json()["features"]
+    assert {order["id"] for order in listed} == created
+    assert find_link(results[0]["order"]["links"], "self")
+
+
+@pytest.mark.root_router_kwargs(bulk_max_orders=2)
+def test_create_orders_bulk_validation(
+    stapi_client: TestClient, create_order_payloads: list[OrderPayload]
+) -> None:
+    url = "/products/test-spotlight/orders:bulk"
+    payloads = [payload.model_dump() for payload in create_order_payloads]
+
+    res = stapi_client.post(url, json=payloads)
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert [x["type"] for x in res.json()["detail"]] == ["too_long"]
+
+    # payloads beyond the limit aren't validated
+    res = stapi_client.post(url, json=payloads[:2] + [{}] * 100)
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    errors = res.json()["detail"]
+    assert "too_long" in [x["type"] for x in errors]
+    assert all(x["loc"][:2] in (["body"], ["body", 2]) for x in errors)
+
+    payloads[0]["order_parameters"]["unknown"] = "value"
+    res = stapi_client.post(url, json=payloads[:2])
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,274 @@
+from typing import Any, Literal
+
+import pytest
+from fastapi import Depends, FastAPI, status
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.models.order import OrderParameters
+from stapi_fastapi.models.product import Product
+from stapi_fastapi.routers.root_router import RootRouter
+
+from .backends import (
+    mock_create_order,
+    mock_get_order,
+    mock_get_order_statuses,
+    mock_get_orders,
+    mock_search_opportunities,
+)
+from .shared import (
+    MyOpportunityProperties,
+    MyProductConstraints,
+    find_link,
+    product_test_satellite_provider_sync_opportunity,
+    product_test_spotlight_sync_opportunity,
+)
+
+
+@pytest.mark.root_router_kwargs(lazy_products=True)
+def test_lazy_products(
+    stapi_client: TestClient, opportunity_search: dict[str, Any]
+) -> None:
+    app_router = stapi_client.app.router  # type: ignore[attr-defined]
+    root_router = next(
+        route.endpoint.root_router
+        for route in app_router.routes
+        if route.name == "root:product-routes"
+    )
+    product_router = root_router.product_routers["test-spotlight"]
+
+    # products are listed with links to their routes before these are added
+    res = stapi_client.get("/products")
+    assert res.status_code == status.HTTP_200_OK
+    product = next(x for x in res.json()["products"] if x["id"] == "test-spotlight")
+    assert not product_router.has_routes
+    constraints = find_link(product["links"], "constraints")
+    assert constraints
+    assert constraints["href"].endswith("/products/test-spotlight/constraints")
+
+    res = stapi_client.get(constraints["href"])
+    assert res.status_code == status.HTTP_200_OK
+    assert product_router.has_routes
+
+    res = stapi_client.post(
+        "/products/test-spotlight/opportunities", json=opportunity_search
+    )
+    assert res.status_code == status.HTTP_200_OK
+    create_order = find_link(res.json()["links"], "create-order")
+    assert create_order
+    res = stapi_client.post(
+        create_order["href"],
+        json={
+            **create_order["body"],
+            "order_parameters": {"s3_path": "s3://my-bucket"},
+        },
+    )
+    assert res.status_code == status.HTTP_201_CREATED
+
+    # validated against the product's order parameters
+    res = stapi_client.post(create_order["href"], json={"geometry": None})
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    res = stapi_client.get("/products/test-spotlight/orders")
+    assert res.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+    res = stapi_client.get("/products/test-spotlight/unknown")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    res = stapi_client.get("/products/unknown/constraints")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+class PriorityOrderParameters(OrderParameters):
+    priority: Literal["low", "high"]
+
+
+@pytest.mark.root_router_kwargs(dispatch_products=True)
+@pytest.mark.mock_products(
+    [
+        product_test_spotlight_sync_opportunity,
+        Product(
+            id="test-priority",
+            license="CC-BY-4.0",
+            create_order=mock_create_order,
+            search_opportunities=mock_search_opportunities,
+            constraints=MyProductConstraints,
+            opportunity_properties=MyOpportunityProperties,
+            order_parameters=PriorityOrderParameters,
+        ),
+    ]
+)
+def test_dispatch_products(stapi_client: TestClient) -> None:
+    payload = {
+        "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+        "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+        "filter": None,
+        "order_parameters": {},
+    }
+
+    # payloads are validated against the order parameters of each product
+    res = stapi_client.post("/products/test-spotlight/orders", json=payload)
+    assert res.status_code == status.HTTP_201_CREATED
+    res = stapi_client.post("/products/test-priority/orders", json=payload)
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    payload["order_parameters"] = {"priority": "high"}
+    res = stapi_client.post("/products/test-priority/orders", json=payload)
+    assert res.status_code == status.HTTP_201_CREATED
+
+    res = stapi_client.get("/products/test-priority")
+    assert res.status_code == status.HTTP_200_OK
+    link = find_link(res.json()["links"], "order-parameters")
+    assert link
+    res = stapi_client.get(link["href"])
+    assert res.json()["required"] == ["priority"]
+
+
+def test_dispatch_products_root_path(base_url: str) -> None:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        dispatch_products=True,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI()
+    app.include_router(root_router, prefix="/stapi")
+
+    client = TestClient(app, base_url=base_url, root_path="/api")
+    res = client.get("/api/stapi/products/test-spotlight")
+    assert res.status_code == status.HTTP_200_OK
+    link = find_link(res.json()["links"], "constraints")
+    assert link
+    assert link["href"] == f"{base_url}/api/stapi/products/test-spotlight/constraints"
+    assert client.get(link["href"]).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.parametrize("lazy_products", [False, True])
+def test_add_remove_products_live(base_url: str, lazy_products: bool) -> None:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        dispatch_products=True,
+        lazy_products=lazy_products,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI()
+    app.include_router(root_router)
+    client = TestClient(app, base_url=base_url)
+    routes = len(app.routes)
+
+    root_router.add_product(product_test_satellite_provider_sync_opportunity)
+    res = client.get("/products")
+    assert [x["id"] for x in res.json()["products"]] == [
+        "test-spotlight",
+        "test-satellite-provider",
+    ]
+    res = client.get("/products/test-satellite-provider/order-parameters")
+    assert res.status_code == status.HTTP_200_OK
+    # the application's routes are untouched
+    assert len(app.routes) == routes
+
+    root_router.remove_product("test-spotlight")
+    res = client.get("/products")
+    assert [x["id"] for x in res.json()["products"]] == ["test-satellite-provider"]
+    res = client.get("/products/test-spotlight")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    with pytest.raises(ValueError):
+        root_router.remove_product("test-spotlight")
+
+
+def test_remove_product_routes() -> None:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    root_router.add_product(product_test_satellite_provider_sync_opportunity)
+    root_router.remove_product("test-spotlight")
+    app = FastAPI()
+    app.include_router(root_router)
+    client = TestClient(app)
+
+    res = client.get("/products/test-spotlight/constraints")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    res = client.get("/products/test-satellite-provider/constraints")
+    assert res.status_code == status.HTTP_200_OK
+
+
+def test_eager_product_routes_settings() -> None:
+    calls: list[str] = []
+
+    def root_dependency() -> None:
+        calls.append("root")
+
+    def product_dependency() -> None:
+        calls.append("product")
+
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        tags=["STAPI"],
+        dependencies=[Depends(root_dependency)],
+    )
+    root_router.add_product(
+        product_test_spotlight_sync_opportunity,
+        dependencies=[Depends(product_dependency)],
+    )
+    app = FastAPI()
+    app.include_router(root_router)
+    client = TestClient(app)
+
+    # the routes of the product are built with their full path and the settings
+    # of both routers, as including the product router would copy them
+    [route] = [
+        x
+        for x in root_router.routes
+        if isinstance(x, APIRoute) and x.name == "root:test-spotlight:get-constraints"
+    ]
+    assert route.path == "/products/test-spotlight/constraints"
+    assert route.tags == ["STAPI", "Products"]
+
+    res = client.get("/products/test-spotlight/constraints")
+    assert res.status_code == status.HTTP_200_OK
+    assert calls[:2] == ["root", "product"]
+    paths = client.get("/openapi.json").json()["paths"]
+    assert paths["/products/test-spotlight/constraints"]["get"]["tags"] == [
+        "STAPI",
+        "Products",
+    ]
+
+
+def test_replace_product_routes() -> None:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    root_router.add_product(
+        product_test_spotlight_sync_opportunity.model_copy(
+            update={"title": "New Title"}
+        )
+    )
+    app = FastAPI()
+    app.include_router(root_router)
+    client = TestClient(app)
+
+    # the routes of the replaced product aren't matched anymore
+    res = client.get("/products/test-spotlight")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["title"] == "New Title"
+    [product] = [
+        x
+        for x in client.get("/products").json()["products"]
+        if x["id"] == "test-spotlight"
+    ]
+    assert product["title"] == "New Title"
+    names = [
+        x.name
+        for x in root_router.routes
+        if isinstance(x, APIRoute) and x.name.startswith("root:test-spotlight:")
+    ]
+    assert names and len(names) == len(set(names))
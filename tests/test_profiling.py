@@ -0,0 +1,92 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.profiling import ProfilingMiddleware
+
+TOKEN = "secret"
+
+
+def busy() -> int:
+    total = 0
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/busy")
+    async def get_busy() -> int:
+        return busy()
+
+    app.add_middleware(ProfilingMiddleware, token=TOKEN, directory=tmp_path)
+    return TestClient(app)
+
+
+def test_not_profiled(client: TestClient, tmp_path: Path) -> None:
+    res = client.get("/busy")
+    assert res.status_code == status.HTTP_200_OK
+    assert "X-Profile-File" not in res.headers
+    assert list(tmp_path.iterdir()) == []
+
+    res = client.get("/busy", headers={"X-Profile-Token": "wrong"})
+    assert res.status_code == status.HTTP_403_FORBIDDEN
+    res = client.get(
+        "/busy", headers={"X-Profile-Token": TOKEN, "X-Profile-Mode": "unknown"}
+    )
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sampling_profile(client: TestClient, tmp_path: Path) -> None:
+    res = client.get("/busy", headers={"X-Profile-Token": TOKEN})
+    assert res.status_code == status.HTTP_200_OK
+
+    profile = json.loads((tmp_path / res.headers["X-Profile-File"]).read_text())
+    assert res.headers["X-Profile-File"].endswith(".speedscope.json")
+    frames = [x["name"] for x in profile["shared"]["frames"]]
+    [sampled] = profile["profiles"]
+    assert sampled["type"] == "sampled"
+    assert len(sampled["samples"]) == len(sampled["weights"])
+    assert any(x.startswith("busy ") for x in frames)
+    busy_time = sum(
+        weight
+        for stack, weight in zip(sampled["samples"], sampled["weights"])
+        if frames[stack[-1]].startswith("busy ")
+    )
+    assert 0.01 < busy_time < 0.5
+
+
+def test_deterministic_profile_collapsed(client: TestClient, tmp_path: Path) -> None:
+    res = client.get(
+        "/busy",
+        headers={
+            "X-Profile-Token": TOKEN,
+            "X-Profile-Mode": "deterministic",
+            "X-Profile-Format": "collapsed",
+        },
+    )
+    assert res.status_code == status.HTTP_200_OK
+
+    lines = (tmp_path / res.headers["X-Profile-File"]).read_text().splitlines()
+    stacks = [
+        (stack.split(";"), int(us))
+        for stack, _, us in (x.rpartition(" ") for x in lines)
+    ]
+    # the time of the function and what it calls, in microseconds and without the
+    # time of the profiler itself
+    busy_stacks = [
+        (stack, us) for stack, us in stacks if any(x.startswith("busy ") for x in stack)
+    ]
+    assert 5_000 < sum(us for _, us in busy_stacks) < 500_000
+    # called by the endpoint
+    for stack, _ in busy_stacks:
+        assert any(".get_busy " in x for x in stack)
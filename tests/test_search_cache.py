@@ -0,0 +1,303 @@
+import json
+from collections import Counter
+from datetime import UTC, datetime
+from typing import Any
+from uuid import uuid4
+
+import pytest
+from fastapi import Request, status
+from fastapi.testclient import TestClient
+from geojson_pydantic import Point
+from geojson_pydantic.types import Position2D
+from returns.maybe import Maybe, Nothing
+from returns.result import ResultE, Success
+
+from stapi_fastapi.models.opportunity import (
+    Opportunity,
+    OpportunityCollection,
+    OpportunityPayload,
+    OpportunitySearchRecord,
+    OpportunitySearchStatus,
+    OpportunitySearchStatusCode,
+)
+from stapi_fastapi.models.product import Product
+from stapi_fastapi.models.shared import Link
+from stapi_fastapi.routers.product_router import ProductRouter
+from stapi_fastapi.search_cache import CompletedSearchIndex, search_key
+
+from .backends import (
+    mock_create_order,
+    mock_get_opportunity_collection,
+    mock_search_opportunities_async,
+)
+from .shared import (
+    MyOpportunityProperties,
+    MyOrderParameters,
+    MyProductConstraints,
+    OffNadirRange,
+)
+
+calls: Counter[str] = Counter()
+
+
+async def mock_search_opportunities_counted(
+    product_router: ProductRouter,
+    search: OpportunityPayload,
+    next: str | None,
+    limit: int,
+    request: Request,
+) -> ResultE[tuple[list[Opportunity], Maybe[str]]]:
+    calls["search_opportunities"] += 1
+    return Success((request.state._opportunities[:limit], Nothing))
+
+
+async def mock_search_opportunities_async_counted(
+    product_router: ProductRouter,
+    search: OpportunityPayload,
+    request: Request,
+) -> ResultE[OpportunitySearchRecord]:
+    calls["search_opportunities_async"] += 1
+    return await mock_search_opportunities_async(product_router, search, request)
+
+
+product_test_spotlight_cached = Product(
+    id="test-spotlight",
+    license="CC-BY-4.0",
+    create_order=mock_create_order,
+    search_opportunities=mock_search_opportunities_counted,
+    search_opportunities_async=mock_search_opportunities_async_counted,
+    get_opportunity_collection=mock_get_opportunity_collection,
+    constraints=MyProductConstraints,
+    opportunity_properties=MyOpportunityProperties,
+    order_parameters=MyOrderParameters,
+    search_cache_ttl=60,
+)
+
+product_test_spotlight_async_cached = Product(
+    id="test-spotlight",
+    license="CC-BY-4.0",
+    create_order=mock_create_order,
+    search_opportunities=None,
+    search_opportunities_async=mock_search_opportunities_async_counted,
+    get_opportunity_collection=mock_get_opportunity_collection,
+    constraints=MyProductConstraints,
+    opportunity_properties=MyOpportunityProperties,
+    order_parameters=MyOrderParameters,
+    search_cache_ttl=60,
+)
+
+
+def opportunity(longitude: float, latitude: float, start: str, end: str) -> Opportunity:
+    return Opportunity(
+        id=str(uuid4()),
+        geometry=Point(
+            type="Point",
+            coordinates=Position2D(longitude=longitude, latitude=latitude),
+        ),
+        properties=MyOpportunityProperties(
+            product_id="test-spotlight",
+            datetime=(datetime.fromisoformat(start), datetime.fromisoformat(end)),
+            off_nadir=OffNadirRange(minimum=20, maximum=22),
+            vehicle_id=[1],
+            platform="platform_id",
+        ),
+    )
+
+
+@pytest.fixture
+def mock_opportunities() -> list[Opportunity]:
+    return [
+        opportunity(0.5, 0.5, "2025-01-01T00:00:00Z", "2025-01-01T06:00:00Z"),
+        opportunity(0.9, 0.9, "2025-01-01T12:00:00Z", "2025-01-02T00:00:00Z"),
+    ]
+
+
+def contained(
+    search: dict[str, Any], ring: list[list[float]], interval: str
+) -> dict[str, Any]:
+    return {
+        **search,
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "datetime": interval,
+    }
+
+
+@pytest.fixture(autouse=True)
+def reset_calls() -> None:
+    calls.clear()
+
+
+@pytest.fixture
+def search() -> dict[str, Any]:
+    return {
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]],
+        },
+        "datetime": "2025-01-01T00:00:00Z/2025-01-02T00:00:00Z",
+        "filter": {
+            "op": "<",
+            "args": [{"property": "off_nadir"}, 45],
+        },
+    }
+
+
+def test_search_key_is_canonical(search: dict[str, Any]) -> None:
+    same = {
+        # same ring, other starting vertex, opposite orientation and float noise
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[1, 1], [1, 0], [0, 0], [0, 1.00000000001], [1, 1]]],
+        },
+        # same interval in another time zone
+        "datetime": "2025-01-01T02:00:00+02:00/2025-01-02T02:00:00+02:00",
+        "filter": {
+            "args": [{"property": "off_nadir"}, 45],
+            "op": "<",
+        },
+    }
+    key = search_key("p", search=payload(search))
+    assert key == search_key("p", search=payload(same))
+
+    other = {**search, "datetime": "2025-01-01T00:00:00Z/2025-01-03T00:00:00Z"}
+    assert key != search_key("p", search=payload(other))
+    assert key != search_key("q", search=payload(search))
+
+
+def payload(search: dict[str, Any]) -> OpportunityPayload:
+    return OpportunityPayload.model_validate_json(json.dumps(search))
+
+
+def test_completed_search_index_bounded_per_scope(search: dict[str, Any]) -> None:
+    index = CompletedSearchIndex(max_entries=10, max_entries_per_scope=2)
+
+    def square(x: float) -> OpportunityPayload:
+        ring = [[x, 0], [x + 1, 0], [x + 1, 1], [x, 1], [x, 0]]
+        return payload(contained(search, ring, search["datetime"]))
+
+    for x in range(3):
+        index.add("p", square(x), [], ttl=60)
+    index.add("q", square(0), [], ttl=60)
+    # the least recently used search of the scope was evicted
+    assert index.find("p", square(0)) is None
+    assert index.find("p", square(1)) is not None
+    assert index.find("q", square(0)) is not None
+
+    # found searches are used most recently
+    index.add("p", square(3), [], ttl=60)
+    assert index.find("p", square(1)) is not None
+    assert index.find("p", square(2)) is None
+
+
+@pytest.mark.mock_products([product_test_spotlight_cached])
+def test_sync_search_cached(stapi_client: TestClient, search: dict[str, Any]) -> None:
+    url = "/products/test-spotlight/opportunities"
+    first = stapi_client.post(url, json=search)
+    second = stapi_client.post(url, json=search)
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert first.json() == second.json()
+    assert calls["search_opportunities"] == 1
+
+    # other pages and other callers are cached separately
+    stapi_client.post(url, json={**search, "next": "0"})
+    stapi_client.post(url, json=search, headers={"Authorization": "Bearer other"})
+    assert calls["search_opportunities"] == 3
+
+
+@pytest.mark.mock_products([product_test_spotlight_cached])
+def test_async_search_reuses_record(
+    stapi_client_async_opportunity: TestClient, search: dict[str, Any]
+) -> None:
+    client = stapi_client_async_opportunity
+    url = "/products/test-spotlight/opportunities"
+    first = client.post(url, json=search)
+    second = client.post(url, json=search)
+    assert first.status_code == second.status_code == status.HTTP_201_CREATED
+    assert first.json()["id"] == second.json()["id"]
+    assert second.headers["Location"] == first.headers["Location"]
+    assert calls["search_opportunities_async"] == 1
+
+    # a failed search is not reused
+    search_record = OpportunitySearchRecord(**first.json())
+    search_record.status = OpportunitySearchStatus(
+        timestamp=datetime.now(UTC),
+        status_code=OpportunitySearchStatusCode.failed,
+    )
+    client.app_state["_opportunities_db"].put_search_record(search_record)
+    third = client.post(url, json=search)
+    assert third.json()["id"] != first.json()["id"]
+    assert calls["search_opportunities_async"] == 2
+
+
+@pytest.mark.mock_products([product_test_spotlight_cached])
+def test_contained_search_answered_locally(
+    stapi_client: TestClient, search: dict[str, Any]
+) -> None:
+    url = "/products/test-spotlight/opportunities"
+    assert stapi_client.post(url, json=search).status_code == status.HTTP_200_OK
+    assert calls["search_opportunities"] == 1
+
+    inner = [[0.4, 0.4], [0.6, 0.4], [0.6, 0.6], [0.4, 0.6], [0.4, 0.4]]
+    res = stapi_client.post(
+        url,
+        json=contained(search, inner, "2025-01-01T03:00:00Z/2025-01-01T12:00:00Z"),
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert calls["search_opportunities"] == 1
+    # only the window within the area, clipped to the interval
+    [feature] = res.json()["features"]
+    assert feature["geometry"]["coordinates"] == [0.5, 0.5]
+    assert feature["properties"]["datetime"] == (
+        "2025-01-01T03:00:00+00:00/2025-01-01T06:00:00+00:00"
+    )
+
+    # searches reaching outside the area, the interval or with another filter
+    # are not contained
+    outside = [[0.5, 0.5], [1.5, 0.5], [1.5, 1.5], [0.5, 1.5], [0.5, 0.5]]
+    stapi_client.post(url, json=contained(search, outside, search["datetime"]))
+    later = "2025-01-01T12:00:00Z/2025-01-03T00:00:00Z"
+    stapi_client.post(url, json=contained(search, inner, later))
+    stapi_client.post(url, json={**search, "filter": None})
+    assert calls["search_opportunities"] == 4
+
+
+@pytest.mark.root_router_kwargs(search_wait_budget=1)
+@pytest.mark.mock_products([product_test_spotlight_async_cached])
+def test_contained_search_answered_from_completed_record(
+    stapi_client_async_opportunity: TestClient,
+    search: dict[str, Any],
+    mock_opportunities: list[Opportunity],
+) -> None:
+    client = stapi_client_async_opportunity
+    db = client.app_state["_opportunities_db"]
+    url = "/products/test-spotlight/opportunities"
+    search_record = OpportunitySearchRecord(**client.post(url, json=search).json())
+
+    # the search completes and is seen by a client
+    collection = OpportunityCollection(id=str(uuid4()), features=mock_opportunities)
+    db.put_opportunity_collection(collection)
+    search_record.links.append(
+        Link(
+            rel="opportunities",
+            href=f"http://stapiserver/products/test-spotlight/opportunities/{collection.id}",
+        )
+    )
+    search_record.status = OpportunitySearchStatus(
+        timestamp=datetime.now(UTC),
+        status_code=OpportunitySearchStatusCode.completed,
+    )
+    db.put_search_record(search_record)
+    client.get(f"/searches/opportunities/{search_record.id}")
+
+    inner: list[list[float]] = [[0.8, 0.8], [1, 0.8], [1, 1], [0.8, 1], [0.8, 0.8]]
+    res = client.post(
+        url,
+        json=contained(search, inner, search["datetime"]),
+        headers={"Prefer": "wait"},
+    )
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["Preference-Applied"] == "wait"
+    assert [x["geometry"]["coordinates"] for x in res.json()["features"]] == [
+        [0.9, 0.9]
+    ]
+    assert calls["search_opportunities_async"] == 1
@@ -0,0 +1,110 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, Request, status
+from fastapi.testclient import TestClient
+from returns.maybe import Maybe
+from returns.result import ResultE
+from starlette.middleware import Middleware
+
+from stapi_fastapi.models.order import Order
+from stapi_fastapi.routers.root_router import RootRouter
+from stapi_fastapi.server_timing import ServerTimingMiddleware
+from stapi_fastapi.tracing import InMemoryExporter, Tracer, TracingMiddleware, span
+
+from .backends import mock_get_order, mock_get_order_statuses, mock_get_orders
+from .shared import InMemoryOrderDB, product_test_spotlight_sync_opportunity
+
+ORDER = {
+    "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+    "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+    "filter": None,
+    "order_parameters": {"s3_path": "s3://my-bucket"},
+}
+
+
+async def upstream_get_order(order_id: str, request: Request) -> ResultE[Maybe[Order]]:
+    # a backend calling an upstream service through an instrumented client
+    with span("upstream", service="orders"):
+        return await mock_get_order(order_id, request)
+
+
+def application(*middleware: Middleware) -> FastAPI:
+    """
+    The test application with `middleware`, the first outermost.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
+        yield {"_orders_db": InMemoryOrderDB()}
+
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=upstream_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        dispatch_products=True,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI(lifespan=lifespan, middleware=middleware)
+    app.include_router(root_router)
+    return app
+
+
+def server_timing(header: str) -> dict[str, float]:
+    return {
+        name: float(duration.removeprefix("dur="))
+        for name, _, duration in (x.partition(";") for x in header.split(", "))
+    }
+
+
+def test_server_timing() -> None:
+    with TestClient(application(Middleware(ServerTimingMiddleware))) as client:
+        res = client.post("/products/test-spotlight/orders", json=ORDER)
+        assert res.status_code == status.HTTP_201_CREATED
+        timings = server_timing(res.headers["Server-Timing"])
+        assert set(timings) == {
+            "backend-create_order",
+            "links",
+            "validation",
+            "serialization",
+            "total",
+        }
+        assert all(0 <= x <= timings["total"] for x in timings.values())
+
+        res = client.get(f"/orders/{res.json()['id']}")
+        timings = server_timing(res.headers["Server-Timing"])
+        assert timings["upstream"] <= timings["backend-get_order"]
+
+        # requests failing validation
+        res = client.post("/products/test-spotlight/orders", json={})
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert set(server_timing(res.headers["Server-Timing"])) == {"total"}
+
+
+@pytest.mark.parametrize("server_timing_outermost", [True, False])
+def test_server_timing_traced(server_timing_outermost: bool) -> None:
+    exporter = InMemoryExporter()
+    middleware = [
+        Middleware(ServerTimingMiddleware),
+        Middleware(TracingMiddleware, tracer=Tracer(exporter)),
+    ]
+    if not server_timing_outermost:
+        middleware.reverse()
+
+    with TestClient(application(*middleware)) as client:
+        res = client.get("/orders/unknown")
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+        assert "backend-get_order" in server_timing(res.headers["Server-Timing"])
+
+    # the request is traced the same either way; the endpoint raised the 404, so
+    # there's nothing serialized
+    [root] = [x for x in exporter.spans if x.parent_id is None]
+    assert root.name == "GET get-order"
+    assert {x.name for x in exporter.trace(root.trace_id)} == {
+        "GET get-order",
+        "validation",
+        "backend",
+        "upstream",
+    }
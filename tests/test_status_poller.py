@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from stapi_fastapi.status_poller import StatusPoller
+
+
+def test_status_poller() -> None:
+    poller = StatusPoller(interval=1, max_watched=3, max_failures=2)
+    checks: list[str] = []
+
+    def check(topic: str, final: bool = False, fails: bool = False):
+        async def check() -> bool:
+            checks.append(topic)
+            if fails:
+                raise RuntimeError("backend unavailable")
+            return final
+
+        return check
+
+    poller.watch("orders/a", check("orders/a"))
+    poller.watch("orders/b", check("orders/b", final=True))
+    poller.watch("orders/c", check("orders/c", fails=True))
+    poller.watch("orders/d", check("orders/d"))
+    # the oldest is dropped
+    assert poller.watched == ["orders/b", "orders/c", "orders/d"]
+
+    asyncio.run(poller.poll())
+    assert sorted(checks) == ["orders/b", "orders/c", "orders/d"]
+    # final statuses aren't polled again, failing checks are a few times
+    assert poller.watched == ["orders/c", "orders/d"]
+    asyncio.run(poller.poll())
+    assert poller.watched == ["orders/d"]
+
+    # watching again replaces the check
+    poller.watch("orders/d", check("orders/d", final=True))
+    asyncio.run(poller.poll())
+    assert poller.watched == []
+
+
+def test_status_poller_max_age() -> None:
+    poller = StatusPoller(max_age=0)
+
+    async def check() -> bool:
+        raise AssertionError("not checked")
+
+    poller.watch("orders/a", check)
+    asyncio.run(poller.poll())
+    assert poller.watched == []
+
+
+def test_invalid_status_poller() -> None:
+    with pytest.raises(ValueError):
+        StatusPoller(interval=0)
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any
+
+import pytest
+from fastapi import Request, status
+from fastapi.testclient import TestClient
+from returns.result import ResultE
+
+from stapi_fastapi.exceptions import BackendTimeoutException
+from stapi_fastapi.models.order import Order, OrderPayload
+from stapi_fastapi.models.product import Product
+from stapi_fastapi.routers.product_router import ProductRouter
+from stapi_fastapi.routers.root_router import RootRouter
+
+from .backends import (
+    mock_create_order,
+    mock_get_order,
+    mock_get_order_statuses,
+    mock_get_orders,
+)
+from .shared import MyOpportunityProperties, MyOrderParameters, MyProductConstraints
+
+cancelled: list[str] = []
+
+
+async def mock_create_order_slow(
+    product_router: ProductRouter, payload: OrderPayload, request: Request
+) -> ResultE[Order]:
+    try:
+        await asyncio.sleep(0.2)
+    except asyncio.CancelledError:
+        cancelled.append("create_order")
+        raise
+    return await mock_create_order(product_router, payload, request)
+
+
+def slow_product(**kwargs) -> Product:
+    return Product(
+        id="test-spotlight",
+        license="CC-BY-4.0",
+        create_order=mock_create_order_slow,
+        constraints=MyProductConstraints,
+        opportunity_properties=MyOpportunityProperties,
+        order_parameters=MyOrderParameters,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def order_payload() -> dict[str, Any]:
+    return {
+        "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+        "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+        "filter": None,
+        "order_parameters": {"s3_path": "s3://my-bucket"},
+    }
+
+
+@pytest.mark.parametrize(
+    "mock_products, root_router_kwargs",
+    [
+        ([slow_product(timeouts={"create_order": 0.05})], {}),
+        ([slow_product()], {"backend_timeouts": {"create_order": 0.05}}),
+    ],
+)
+def test_backend_timeout(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    cancelled.clear()
+    res = stapi_client.post("/products/test-spotlight/orders", json=order_payload)
+    assert res.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert res.json()["detail"]["code"] == "backend_timeout"
+    assert cancelled == ["create_order"]
+
+    res = stapi_client.post(
+        "/products/test-spotlight/orders:bulk", json=[order_payload]
+    )
+    assert res.json()["status"] == 504
+
+
+@pytest.mark.root_router_kwargs(backend_timeouts={"create_order": 0.05})
+@pytest.mark.mock_products([slow_product(timeouts={"create_order": 5})])
+def test_product_timeout_overrides_root(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    res = stapi_client.post("/products/test-spotlight/orders", json=order_payload)
+    assert res.status_code == status.HTTP_201_CREATED
+
+
+def test_timeouts_counted() -> None:
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+    )
+
+    async def slow() -> None:
+        await asyncio.sleep(1)
+
+    async def fails() -> None:
+        raise TimeoutError("upstream socket timeout")
+
+    with pytest.raises(BackendTimeoutException):
+        asyncio.run(root_router.invoke_backend("get_order", 0.01, slow))
+    # timeouts raised by the backend itself are not mistaken for the deadline
+    with pytest.raises(TimeoutError):
+        asyncio.run(root_router.invoke_backend("get_order", 5, fails))
+    assert root_router.backend_timeout_counts == {"get_order": 1}
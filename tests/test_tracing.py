@@ -0,0 +1,142 @@
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.routers.root_router import RootRouter
+from stapi_fastapi.tracing import (
+    NO_SPAN,
+    InMemoryExporter,
+    JSONLinesExporter,
+    Span,
+    Tracer,
+    TracingMiddleware,
+    span,
+)
+
+from .backends import mock_get_order, mock_get_order_statuses, mock_get_orders
+from .shared import InMemoryOrderDB, product_test_spotlight_sync_opportunity
+
+ORDER = {
+    "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+    "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+    "filter": None,
+    "order_parameters": {"s3_path": "s3://my-bucket"},
+}
+
+
+@pytest.fixture
+def exporter() -> InMemoryExporter:
+    return InMemoryExporter()
+
+
+@pytest.fixture
+def client(exporter: InMemoryExporter) -> TestClient:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
+        yield {"_orders_db": InMemoryOrderDB()}
+
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=mock_get_order,
+        get_order_statuses=mock_get_order_statuses,
+        dispatch_products=True,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(root_router)
+    app.add_middleware(TracingMiddleware, tracer=Tracer(exporter))
+    return TestClient(app)
+
+
+def by_name(spans: list[Span]) -> dict[str, Span]:
+    return {x.name: x for x in spans}
+
+
+def test_request_spans(client: TestClient, exporter: InMemoryExporter) -> None:
+    with client:
+        res = client.post("/products/test-spotlight/orders", json=ORDER)
+        assert res.status_code == status.HTTP_201_CREATED
+
+    spans = by_name(exporter.spans)
+    root = spans["POST create-order"]
+    assert root.parent_id is None
+    assert root.attributes["status_code"] == 201
+    assert root.attributes["path"] == "/products/test-spotlight/orders"
+    for name in ("validation", "backend", "links", "serialization"):
+        assert spans[name].trace_id == root.trace_id
+        assert spans[name].parent_id == root.span_id
+        assert 0 <= spans[name].duration <= root.duration
+    assert spans["backend"].attributes == {
+        "backend": "create_order",
+        "outcome": "success",
+    }
+    # phases follow each other
+    assert spans["validation"].start <= spans["backend"].start
+    assert spans["backend"].start <= spans["serialization"].start
+    # the root span ends last
+    assert exporter.spans[-1] is root
+
+
+def test_request_spans_per_trace(
+    client: TestClient, exporter: InMemoryExporter
+) -> None:
+    with client:
+        client.get("/orders/unknown")
+        client.get("/orders/unknown")
+
+    roots = [x for x in exporter.spans if x.parent_id is None]
+    assert len(roots) == 2
+    assert roots[0].trace_id != roots[1].trace_id
+    [backend] = [x for x in exporter.trace(roots[0].trace_id) if x.name == "backend"]
+    assert backend.attributes["outcome"] == "empty"
+    assert roots[0].attributes["status_code"] == 404
+
+
+def test_invalid_request_spans(client: TestClient, exporter: InMemoryExporter) -> None:
+    with client:
+        res = client.post("/products/test-spotlight/orders", json={})
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    assert set(by_name(exporter.spans)) == {"POST create-order", "validation"}
+
+
+def test_span() -> None:
+    # nothing is recorded outside of traces
+    with span("outside") as outside:
+        outside.set("key", "value")
+    assert outside is NO_SPAN
+    assert outside.attributes == {}
+
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+    with pytest.raises(ValueError):
+        with tracer.span("root"):
+            with span("child", key="value"):
+                raise ValueError
+
+    child, root = exporter.spans
+    assert child.parent_id == root.span_id
+    assert child.attributes == {"key": "value", "exception": "ValueError"}
+    assert child.status == root.status == "error"
+
+
+def test_json_lines_exporter(tmp_path: Path) -> None:
+    path = tmp_path / "traces.jsonl"
+    exporter = JSONLinesExporter(path)
+    tracer = Tracer(exporter)
+    with tracer.span("root", path="/orders"):
+        with span("backend", backend="get_orders"):
+            pass
+    exporter.close()
+
+    child, root = [json.loads(x) for x in path.read_text().splitlines()]
+    assert root["name"] == "root"
+    assert root["attributes"] == {"path": "/orders"}
+    assert child["parent_id"] == root["span_id"]
+    assert child["trace_id"] == root["trace_id"]
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, Request, status
+from fastapi.testclient import TestClient
+from returns.maybe import Maybe
+from returns.result import ResultE
+
+from stapi_fastapi.metrics import Metrics
+from stapi_fastapi.models.order import Order
+from stapi_fastapi.routers.root_router import RootRouter
+from stapi_fastapi.watchdog import Blocked, LoopWatchdog, LoopWatchdogMiddleware
+
+from .backends import mock_get_order, mock_get_order_statuses, mock_get_orders
+from .shared import InMemoryOrderDB, product_test_spotlight_sync_opportunity
+
+
+def blocking_call() -> None:
+    # like a synchronous HTTP client waiting for a response
+    time.sleep(0.3)
+
+
+async def blocking_get_order(order_id: str, request: Request) -> ResultE[Maybe[Order]]:
+    blocking_call()
+    return await mock_get_order(order_id, request)
+
+
+async def sleeping_get_order(order_id: str, request: Request) -> ResultE[Maybe[Order]]:
+    await asyncio.sleep(0.3)
+    return await mock_get_order(order_id, request)
+
+
+def application(get_order: Any, watchdog: LoopWatchdog) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, Any]]:
+        yield {"_orders_db": InMemoryOrderDB()}
+
+    root_router = RootRouter(
+        get_orders=mock_get_orders,
+        get_order=get_order,
+        get_order_statuses=mock_get_order_statuses,
+    )
+    root_router.add_product(product_test_spotlight_sync_opportunity)
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(root_router)
+    app.add_middleware(LoopWatchdogMiddleware, watchdog=watchdog)
+    return app
+
+
+def test_blocking_backend() -> None:
+    blockings: list[Blocked] = []
+    watchdog = LoopWatchdog(threshold=0.1, on_blocked=blockings.append)
+
+    with TestClient(application(blocking_get_order, watchdog)) as client:
+        res = client.get("/orders/unknown")
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+        assert watchdog._task is not None
+    assert watchdog._task is None
+
+    [blocked] = watchdog.blocked
+    assert blockings == [blocked]
+    assert 0.2 < blocked.duration < 1
+    # the stack of the blocking call, from the backend calling it
+    assert blocked.stack is not None
+    assert blocked.stack[-1].name == "blocking_call"
+    assert blocked.stack[-2].name == "blocking_get_order"
+    assert "blocking_get_order" in blocked.format()
+
+
+def test_awaiting_backend() -> None:
+    metrics = Metrics()
+    watchdog = LoopWatchdog(threshold=0.1, metrics=metrics)
+
+    with TestClient(application(sleeping_get_order, watchdog)) as client:
+        res = client.get("/orders/unknown")
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    assert list(watchdog.blocked) == []
+    # the lag is exported with the application's metrics
+    exposition = metrics.exposition()
+    [count] = [
+        x
+        for x in exposition.splitlines()
+        if x.startswith("stapi_event_loop_lag_seconds_count")
+    ]
+    assert float(count.split()[-1]) > 10
+
+
+def test_invalid_watchdog() -> None:
+    with pytest.raises(ValueError):
+        LoopWatchdog(threshold=0)
@@ -0,0 +1,343 @@
+import asyncio
+import sqlite3
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response, status
+from fastapi.testclient import TestClient
+
+from stapi_fastapi.models.order import OrderStatus, OrderStatusCode
+from stapi_fastapi.notifications import NotificationBus, StatusEvent, order_topic
+from stapi_fastapi.status_poller import StatusPoller
+from stapi_fastapi.webhooks import (
+    HttpxWebhookSender,
+    WebhookDispatcher,
+    WebhookOutbox,
+    is_public_callback_url,
+)
+
+
+class Receiver:
+    """
+    Stands in for a client's webhook endpoint, failing the first `failures` calls.
+    """
+
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+        self.app = FastAPI()
+        self.app.add_api_route("/hooks", self.receive, methods=["POST"])
+
+    async def receive(self, request: Request) -> Response:
+        self.calls.append((request.headers["Webhook-Id"], await request.json()))
+        if self.failures:
+            self.failures -= 1
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def allow_receiver(url: str) -> bool:
+    return url.startswith("http://receiver/")
+
+
+async def denied(url: str) -> bool:
+    return False
+
+
+@pytest.fixture
+def notification_bus() -> NotificationBus:
+    return NotificationBus()
+
+
+@pytest.fixture
+def receiver() -> Receiver:
+    return Receiver(failures=1)
+
+
+@pytest.fixture
+def outbox(tmp_path: Path) -> WebhookOutbox:
+    return WebhookOutbox(str(tmp_path / "outbox.db"))
+
+
+@pytest.fixture
+def status_poller() -> StatusPoller | None:
+    return None
+
+
+@pytest.fixture
+def root_router_kwargs(
+    notification_bus: NotificationBus,
+    receiver: Receiver,
+    outbox: WebhookOutbox,
+    status_poller: StatusPoller | None,
+) -> dict[str, Any]:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=receiver.app))
+    return {
+        "notification_bus": notification_bus,
+        "webhooks": WebhookDispatcher(
+            outbox,
+            send=HttpxWebhookSender(client),
+            backoff=0.01,
+            poll_interval=0.05,
+            callback_url_validator=allow_receiver,
+        ),
+        "status_poller": status_poller,
+    }
+
+
+@pytest.fixture
+def order_payload() -> dict[str, Any]:
+    return {
+        "geometry": {"type": "Point", "coordinates": [14.4, 56.5]},
+        "datetime": "2024-10-09T18:55:33Z/2024-10-12T18:55:33Z",
+        "filter": None,
+        "order_parameters": {"s3_path": "s3://my-bucket"},
+    }
+
+
+def order_status(status_code: OrderStatusCode) -> OrderStatus:
+    return OrderStatus(timestamp=datetime.now(UTC), status_code=status_code)
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_status_changes_delivered_in_order(
+    stapi_client: TestClient,
+    notification_bus: NotificationBus,
+    receiver: Receiver,
+    outbox: WebhookOutbox,
+    order_payload: dict[str, Any],
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json=order_payload,
+        headers={"Callback-URL": "http://receiver/hooks"},
+    )
+    assert res.status_code == status.HTTP_201_CREATED
+    order_id = res.json()["id"]
+
+    notification_bus.publish_order_status(
+        order_id, order_status(OrderStatusCode.accepted)
+    )
+    notification_bus.publish_order_status(
+        order_id, order_status(OrderStatusCode.completed)
+    )
+    wait_for(lambda: outbox.pending() == 0 and len(receiver.calls) == 4)
+
+    # the first attempt failed and was retried with the same id before later events
+    ids = [webhook_id for webhook_id, _ in receiver.calls]
+    assert ids[0] == ids[1]
+    assert len(set(ids)) == 3
+    assert [body["data"]["status"]["status_code"] for _, body in receiver.calls] == [
+        "received",
+        "received",
+        "accepted",
+        "completed",
+    ]
+    assert all(body["data"]["order_id"] == order_id for _, body in receiver.calls)
+
+    # callbacks are dropped once the order reached a final status
+    notification_bus.publish_order_status(
+        order_id, order_status(OrderStatusCode.canceled)
+    )
+    assert outbox.pending() == 0
+
+
+@pytest.mark.parametrize("status_poller", [StatusPoller(interval=0.05)])
+def test_status_changes_polled(
+    stapi_client: TestClient,
+    receiver: Receiver,
+    status_poller: StatusPoller,
+    order_payload: dict[str, Any],
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json=order_payload,
+        headers={"Callback-URL": "http://receiver/hooks"},
+    )
+    assert res.status_code == status.HTTP_201_CREATED
+    order_id = res.json()["id"]
+    assert status_poller.watched == [order_topic(order_id)]
+
+    # the backend's status changes, and no client asks for it
+    orders_db = stapi_client.app_state["_orders_db"]
+    for status_code in (OrderStatusCode.accepted, OrderStatusCode.completed):
+        order = orders_db.get_order(order_id)
+        order.properties.status = order_status(status_code)
+        orders_db.put_order(order)
+        wait_for(
+            lambda: (
+                status_code
+                in [body["data"]["status"]["status_code"] for _, body in receiver.calls]
+            )
+        )
+
+    # orders aren't polled anymore once their status is final
+    wait_for(lambda: status_poller.watched == [])
+    assert [body["data"]["status"]["status_code"] for _, body in receiver.calls] == [
+        "received",
+        "received",
+        "accepted",
+        "completed",
+    ]
+
+
+def test_callback_url_validated(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json=order_payload,
+        headers={"Callback-URL": "not a url"},
+    )
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_callback_url_not_allowed(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json=order_payload,
+        headers={"Callback-URL": "http://169.254.169.254/latest/meta-data"},
+    )
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    assert stapi_client.get("/orders").json()["features"] == []
+
+
+@pytest.mark.parametrize(
+    "url, allowed",
+    [
+        ("http://93.184.215.14/hooks", True),
+        ("https://[2606:2800:21f:cb07:6820:80da:af6b:8b2c]/hooks", True),
+        ("http://127.0.0.1:8000/hooks", False),
+        ("http://localhost/hooks", False),
+        ("http://10.0.0.1/hooks", False),
+        ("http://169.254.169.254/latest/meta-data", False),
+        ("http://[::1]/hooks", False),
+        ("http://[::ffff:127.0.0.1]/hooks", False),
+        ("ftp://93.184.215.14/hooks", False),
+        ("http://receiver.invalid/hooks", False),
+    ],
+)
+def test_public_callback_url(url: str, allowed: bool) -> None:
+    assert asyncio.run(is_public_callback_url(url)) is allowed
+
+
+def test_callback_url_checked_before_delivery(outbox: WebhookOutbox) -> None:
+    outbox._register(order_topic("a"), "http://receiver/hooks")
+    sent: list[str] = []
+
+    async def send(url: str, payload: bytes, headers: dict[str, str]) -> int:
+        sent.append(url)
+        return status.HTTP_204_NO_CONTENT
+
+    # e.g. the host resolving to a private address since the URL was registered
+    dispatcher = WebhookDispatcher(outbox, send, callback_url_validator=denied)
+    outbox.enqueue(
+        StatusEvent(id=1, topic=order_topic("a"), event="order-status", data={})
+    )
+    delivery = outbox.claim()
+    assert delivery is not None
+    asyncio.run(dispatcher.deliver(delivery))
+    assert sent == []
+    assert outbox.pending() == 0
+
+
+@pytest.mark.parametrize("root_router_kwargs", [{}])
+def test_callback_url_unsupported(
+    stapi_client: TestClient, order_payload: dict[str, Any]
+) -> None:
+    res = stapi_client.post(
+        "/products/test-spotlight/orders",
+        json=order_payload,
+        headers={"Callback-URL": "http://receiver/hooks"},
+    )
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    assert stapi_client.get("/orders").json()["features"] == []
+
+
+def test_outbox_claims_head_of_each_topic(outbox: WebhookOutbox) -> None:
+    def event(id: int, topic: str) -> StatusEvent:
+        return StatusEvent(id=id, topic=topic, event="order-status", data={"n": id})
+
+    for topic in (order_topic("a"), order_topic("b")):
+        outbox._register(topic, "http://receiver/hooks")
+    assert outbox.enqueue(event(1, order_topic("a"))) == 1
+    assert outbox.enqueue(event(2, order_topic("a"))) == 1
+    assert outbox.enqueue(event(3, order_topic("b"))) == 1
+    assert outbox.enqueue(event(4, order_topic("c"))) == 0
+
+    first = outbox.claim()
+    second = outbox.claim()
+    assert first is not None and first.topic == order_topic("a")
+    assert second is not None and second.topic == order_topic("b")
+    # the next event of "a" waits until the leased one is done
+    assert outbox.claim() is None
+
+    outbox.dead_letter(first, "HTTP 500")
+    third = outbox.claim()
+    assert third is not None and b'"n":2' in third.payload
+
+
+def test_locked_outbox(tmp_path: Path) -> None:
+    path = str(tmp_path / "outbox.db")
+    outbox = WebhookOutbox(path, timeout=0.05)
+    outbox._register(order_topic("a"), "http://receiver/hooks")
+    sent: list[bytes] = []
+
+    async def send(url: str, payload: bytes, headers: dict[str, str]) -> int:
+        sent.append(payload)
+        return status.HTTP_204_NO_CONTENT
+
+    dispatcher = WebhookDispatcher(
+        outbox,
+        send,
+        backoff=0.01,
+        poll_interval=0.05,
+        callback_url_validator=allow_receiver,
+    )
+    bus = NotificationBus()
+    bus.add_handler(dispatcher.handle)
+    # another process writing to the outbox
+    other = sqlite3.connect(path, isolation_level=None)
+
+    async def scenario() -> None:
+        async with dispatcher.running():
+            other.execute("BEGIN IMMEDIATE")
+            started = time.perf_counter()
+            bus.publish_order_status("a", order_status(OrderStatusCode.accepted))
+            bus.publish_order_status("b", order_status(OrderStatusCode.accepted))
+            # publishing doesn't wait for the lock
+            assert time.perf_counter() - started < 0.05
+
+            # events without callback URLs are dropped without waiting
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if dispatcher.unwritten == 1:
+                    break
+            # and the others are kept while writing fails
+            await asyncio.sleep(0.3)
+            assert dispatcher.unwritten == 1
+            assert sent == []
+
+            other.execute("COMMIT")
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if sent:
+                    break
+            assert dispatcher.unwritten == 0
+            assert len(sent) == 1 and b'"order_id":"a"' in sent[0]
+
+    asyncio.run(scenario())
+    other.close()
+    outbox.close()